@@ -0,0 +1,74 @@
+"""Python wrapper of the ffmpeg multimedia framework.
+
+The public classes are found here, e.g. ffmpeg.VideoFFMpeg
+or from ffmpeg import BasicFFProbe; the module which has a
+class is imported the first time the class is asked for,
+so import ffmpeg alone imports none of them."""
+import importlib
+
+# the modules import each other relative to the package,
+# ffmpeg.video imports ffmpeg.base; they are imported as
+# ffmpeg.<module> only, the directory of the package is
+# not put in sys.path, else a module imported by both names
+# would have two copies of its classes
+
+# public name -> module which has it
+_exports = {
+    'BaseFFMpeg': 'ffmpeg',
+    'BasicFFMpegParser': 'ffmpeg',
+    'VideoFFMpeg': 'video',
+    'BasicVideoFFMpegEdit': 'video',
+    'VideoEdit': 'video',
+    'Rendition': 'video',
+    'VideoCutFailed': 'video',
+    'ConversionCheckFailed': 'video',
+    'InvalidDurationSpecification': 'video',
+    'AudioFFMpeg': 'audio',
+    'BasicFFProbe': 'ffprobe',
+    'ProbeFailedError': 'ffprobe',
+    'FFPlay': 'ffplay',
+    'AsyncFFProbe': 'aio',
+    'AsyncVideoFFMpeg': 'aio',
+    'JobScheduler': 'scheduler',
+    'SegmentCoordinator': 'cluster',
+    'SegmentWorker': 'cluster',
+    'SegmentFailedError': 'cluster',
+    'ProbeCache': 'cache',
+    'CapabilityRegistry': 'registry',
+    'ExecutableResolver': 'resolver',
+    'Progress': 'progress',
+    'ProgressStopped': 'progress',
+    'MediaInfo': 'base',
+    'StreamInfo': 'base',
+    'FormatInfo': 'base',
+    'ChapterInfo': 'base',
+    'Codec': 'base',
+    'CodecCatalog': 'base',
+    'FFMpegError': 'base',
+    'ExecutableDoesNotExistError': 'base',
+    'FFMpegAlreadyExistsError': 'base',
+    'FFMpegFatalError': 'errors',
+}
+
+__all__ = sorted(_exports)
+
+
+def _import(module_name):
+    # ffmpeg.py, which has the name of the package, is
+    # the submodule ffmpeg.ffmpeg like the others
+    return importlib.import_module('.' + module_name, __name__)
+
+
+def __getattr__(name):
+    module_name = _exports.get(name)
+    if module_name is None:
+        raise AttributeError('module %r has no attribute %r' %
+                             (__name__, name))
+    value = getattr(_import(module_name), name)
+    globals()[name] = value  # the next lookups do not come here
+
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_exports))
@@ -0,0 +1,376 @@
+"""asyncio counterparts of the wrappers; the child
+processes are spawned with asyncio.create_subprocess_exec
+so one event loop can supervise many of them"""
+import asyncio
+import inspect
+import json
+import os
+from asyncio.subprocess import PIPE, DEVNULL
+from collections import deque
+from .base import MediaInfo
+from .ffprobe import BasicFFProbe, ProbeFailedError
+from .progress import ProgressParser
+from .utils import LineSplitter, READ_CHUNK_SIZE
+from .video import VideoFFMpeg
+
+# seconds to wait for a terminated child before killing it
+TERMINATE_TIMEOUT = 5.0
+
+
+# reads lines from an asyncio.StreamReader with the same
+# splitting as utils.iter_lines; nothing is read before
+# the caller asks for the next line, so a slow caller
+# holds back the child process once its pipe is full
+async def aiter_lines(stream, chunk_size=READ_CHUNK_SIZE, encoding='utf-8'):
+    splitter = LineSplitter(encoding)
+    while True:
+        chunk = await stream.read(chunk_size)
+        if not chunk:  # end of file
+            break
+        for line in splitter.feed(chunk):
+            yield line
+    for line in splitter.flush():
+        yield line
+
+
+async def terminate(process, timeout=TERMINATE_TIMEOUT):
+    """Terminates a running child process, kills it
+    when it is still running after timeout seconds."""
+    if process.returncode is not None:
+        return
+    try:
+        process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), timeout)
+        except asyncio.TimeoutError:
+            process.kill()
+            await process.wait()
+    except ProcessLookupError:  # finished in the meantime
+        pass
+
+
+class AsyncParser(object):
+    """Parses the live output of a child process
+    spawned with asyncio; checks the lines with the
+    errors of parser_class, e.g. VideoFFMpegParser,
+    and collects the -progress records."""
+
+    def __init__(self, process, parser_class):
+        self.process = process  # asyncio.subprocess.Process
+        self.error_matcher = parser_class.error_matcher()
+        self.status_finished = None  # child process status
+        self.returncode = None  # exit code of child process
+        self.verbose = True  # print the output on console
+        self.progress_interval = 0.0  # seconds between progress records
+
+    async def iter_lines(self):
+        """Yields the lines the child writes to stderr."""
+        async for line in aiter_lines(self.process.stderr):
+            yield line
+        self.returncode = await self.process.wait()
+        self.status_finished = True
+
+    async def iter_progress(self):
+        """Checks the lines for errors and yields the
+        ffmpeg.progress.Progress records. When the task
+        reading them is cancelled, the child process
+        is terminated."""
+        progress_parser = ProgressParser(self.progress_interval)
+        try:
+            async for line in self.iter_lines():
+                if progress_parser.feed(line):
+                    record = progress_parser.take()
+                    if record is not None:
+                        yield record
+                    continue
+                if self.verbose:
+                    print(line)
+                error = self.error_matcher.search(line)
+                if error is not None:
+                    raise error
+        finally:
+            await terminate(self.process)
+
+    async def parse_output(self, progress=None):
+        # progress is a callable which gets every record,
+        # when it returns an awaitable it is awaited before
+        # the next line is read, e.g. asyncio.Queue.put
+        records = self.iter_progress()
+        try:
+            async for record in records:
+                if progress is not None:
+                    result = progress(record)
+                    if inspect.isawaitable(result):
+                        await result
+        finally:
+            await records.aclose()
+
+
+class AsyncFFProbe(BasicFFProbe):
+    """BasicFFProbe with coroutines for probing, probe_many
+    is an async generator and build_index a coroutine as
+    well; shares the cache of BasicFFProbe."""
+
+    async def _aspawn(self, cmds=[]):
+        cmds = self._base_cmds(cmds)
+        # ffprobe writes what it found on stdout
+        return await asyncio.create_subprocess_exec(
+            *cmds, stdin=DEVNULL, stdout=PIPE, stderr=PIPE)
+
+    async def probe(self, video_input):
+        """Coroutine which probes media with ffprobe,
+        returns a MediaInfo or None if ffprobe fails"""
+        try:
+            return await self._probe(video_input)
+        except ProbeFailedError:
+            return None
+
+    async def probe_many(self, paths, max_workers=4, ordered=False,
+                         chunk_size=None):
+        """Async generator of BasicFFProbe.probe_many, yields
+        (path, result) with at most max_workers ffprobe running:
+
+            async for path, info in probe.probe_many(paths):
+                ...
+
+        closing it early cancels the probes not yielded yet."""
+        if chunk_size is None:
+            chunk_size = max_workers * 4
+        chunk_size = max(chunk_size, max_workers)
+        paths = iter(paths)
+        running = asyncio.Semaphore(max_workers)
+        pending = deque()  # (path, future) in the order of paths
+
+        async def probe(path):
+            async with running:
+                return await self._probe(path)
+
+        def submit():
+            # submit the next path, False when there are no more
+            for path in paths:
+                pending.append((path, asyncio.ensure_future(probe(path))))
+                return True
+            return False
+
+        def result(path, future):
+            try:
+                return path, future.result()
+            except Exception as e:  # the error stays with its file
+                return path, e
+
+        try:
+            while len(pending) < chunk_size and submit():
+                pass
+            while pending:
+                if ordered:
+                    # the window moves when its first probe is done
+                    path, future = pending.popleft()
+                    await asyncio.wait([future])
+                    yield result(path, future)
+                else:
+                    done, _ = await asyncio.wait(
+                        [future for _, future in pending],
+                        return_when=asyncio.FIRST_COMPLETED)
+                    for item in [item for item in pending
+                                 if item[1] in done]:
+                        pending.remove(item)
+                        yield result(*item)
+                while len(pending) < chunk_size and submit():
+                    pass
+        finally:
+            for _, future in pending:
+                future.cancel()
+            await asyncio.gather(*[future for _, future in pending],
+                                 return_exceptions=True)
+
+    async def build_index(self, video_input, index_path=None, rebuild=False):
+        """Coroutine of BasicFFProbe.build_index, returns the
+        index.PacketIndex of video_input; the same sidecar file
+        is read and written."""
+        index_path, identity, index = self._load_index(
+            video_input, index_path, rebuild)
+        if index is not None:
+            return index
+
+        builder = self._index_builder(await self._probe(video_input))
+        process = await self._aspawn(self._index_cmds(video_input))
+        # stderr is read meanwhile, corrupt files fill it
+        # with errors while the packets come on stdout
+        errors = asyncio.ensure_future(process.stderr.read())
+        try:
+            while True:
+                chunk = await process.stdout.read(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                builder.feed(chunk)
+            error_output = await errors
+            returncode = await process.wait()
+        finally:
+            errors.cancel()
+            await terminate(process)  # e.g. when cancelled
+        if returncode != 0:
+            raise ProbeFailedError(self._probe_error(error_output),
+                                   video_input)
+
+        return self._save_index(builder.build(identity), index_path)
+
+    async def _probe(self, video_input):
+        cache_key, info = self._cache_lookup(video_input)
+        if info is not None:
+            return self._with_catalog(info)
+        stdout, stderr = await self._communicate(
+            self._probe_cmds(video_input, self.print_format))
+        if self.print_format == 'json':
+            info = MediaInfo()
+            try:
+                info.parse_ffprobe_json(json.loads(
+                    stdout.decode('utf-8', 'replace')))
+            except ValueError:  # not json, parse the default output
+                stdout, stderr = await self._communicate(
+                    self._probe_cmds(video_input, 'default'))
+                info = self._parse_text(stdout)
+        else:
+            info = self._parse_text(stdout)
+        if cache_key is not None:
+            self.cache.set(cache_key, info)
+
+        return self._with_catalog(info)
+
+    async def _communicate(self, cmds):
+        process = await self._aspawn(cmds)
+        try:
+            stdout, stderr = await process.communicate()
+        finally:
+            await terminate(process)  # e.g. when cancelled
+        if process.returncode != 0:
+            raise ProbeFailedError(self._probe_error(stderr), cmds[-1])
+
+        return stdout, stderr
+
+    @staticmethod
+    def _parse_text(stdout):
+        info = MediaInfo()
+        for line in LineSplitter().feed(stdout + b'\n'):
+            info.parse_ffprobe(line)
+
+        return info
+
+
+class AsyncVideoFFMpeg(VideoFFMpeg):
+    """VideoFFMpeg whose operations are coroutines:
+
+        v = AsyncVideoFFMpeg(verbose=False)
+        await v.convert_video('in.mp4', 'out.avi')
+
+    the operations take a progress callable like the
+    ones of VideoFFMpeg, it can be a coroutine function
+    as well; aiter_progress yields the records."""
+    probe_class = AsyncFFProbe
+
+    async def _aspawn(self, cmds=[]):
+        cmds = self._base_cmds(cmds)
+        # stdin is not a pipe which is never written, ffmpeg
+        # would wait on it e.g. for the overwrite question;
+        # nothing reads stdout either, a child writing to a
+        # full pipe would block
+        return await asyncio.create_subprocess_exec(
+            *cmds, stdin=DEVNULL, stdout=DEVNULL, stderr=PIPE)
+
+    async def _arun(self, cmds, progress=None):
+        cmds = self._thread_cmds(cmds)
+        if progress is not None:
+            cmds = self._progress_cmds() + cmds
+        process = await self._aspawn(cmds)
+        _parser = AsyncParser(process, self.parser)
+        _parser.verbose = self.verbose
+        _parser.progress_interval = self.progress_interval
+        await _parser.parse_output(progress)
+
+        return _parser.status_finished
+
+    async def _aprobe(self, video_input):
+        return await self.probe_class(verbose=self.verbose)._probe(
+            video_input)
+
+    async def convert_video(self, video_input, video_output,
+                            overwrite=False, vcodec=None,
+                            acodec=None, progress=None):
+        _cmds = self._convert_video_cmds(video_input, video_output,
+                                         overwrite, vcodec, acodec)
+        return await self._arun(_cmds, progress=progress)
+
+    async def extract_audio(self, video_input, progress=None):
+        if not os.path.exists(video_input):
+            print('Make sure video exists')
+            return None
+        info = await self._aprobe(video_input)
+        _cmds = self._extract_audio_cmds(video_input, info)
+        return await self._arun(_cmds, progress=progress)
+
+    async def extract_video(self, video_input, progress=None):
+        if not os.path.exists(video_input):
+            print('Make sure videos exists')
+            return None
+        info = await self._aprobe(video_input)
+        _cmds = self._extract_video_cmds(video_input, info)
+        return await self._arun(_cmds, progress=progress)
+
+    async def cut_video(self, video_input, video_output,
+                        start_cut, end_cut=None, progress=None):
+        if not os.path.exists(video_input):
+            print('Make sure video exists')
+            return None
+        if end_cut is None:
+            info = await self._aprobe(video_input)
+            end_cut = str(info.get_media_duration())
+        _cmds = self._cut_video_cmds(video_input, video_output,
+                                     start_cut, end_cut)
+        return await self._arun(_cmds, progress=progress)
+
+    async def extract_image(self, video_input, start_point,
+                            extract_all=False, progress=None):
+        _cmds = self._extract_image_cmds(video_input, start_point,
+                                         extract_all)
+        return await self._arun(_cmds, progress=progress)
+
+    async def add_audio(self, video_input, audio_input,
+                        video_output, progress=None):
+        _cmds = self._add_audio_cmds(video_input, audio_input,
+                                     video_output)
+        return await self._arun(_cmds, progress=progress)
+
+    async def aiter_progress(self, method, *args, **kwargs):
+        """Runs one of the operations, e.g. self.convert_video,
+        and yields its progress records:
+
+            async for record in v.aiter_progress(
+                    v.convert_video, 'in.mp4', 'out.avi'):
+                print(record.frame)
+
+        at most progress_queue_size records wait for the
+        caller, then ffmpeg waits as well. Leaving the loop
+        early cancels the operation and terminates ffmpeg
+        once the generator is closed, e.g. with
+        contextlib.aclosing."""
+        records = asyncio.Queue(self.progress_queue_size)
+        task = asyncio.ensure_future(
+            method(*args, progress=records.put, **kwargs))
+        try:
+            while True:
+                getter = asyncio.ensure_future(records.get())
+                done, _ = await asyncio.wait(
+                    [getter, task], return_when=asyncio.FIRST_COMPLETED)
+                if getter in done:
+                    yield getter.result()
+                    continue
+                getter.cancel()
+                # the operation finished, give the records it
+                # left in the queue and raise its error, if any
+                while not records.empty():
+                    yield records.get_nowait()
+                task.result()
+                break
+        finally:
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
@@ -1,4 +1,19 @@
-from ffmpeg import BaseFFMpeg
+import itertools
+from .ffmpeg import BaseFFMpeg
+from .ffprobe import BasicFFProbe
+from .utils import import_numpy
+
+
+# sample formats of the blocks returned by iter_samples
+# and read_all; numpy dtype -> (raw format of ffmpeg, its
+# pcm codec, numpy dtype of a sample)
+PCM_FORMATS = {
+    'float32': ('f32le', 'pcm_f32le', '<f4'),
+    'float64': ('f64le', 'pcm_f64le', '<f8'),
+    'int16': ('s16le', 'pcm_s16le', '<i2'),
+    'int32': ('s32le', 'pcm_s32le', '<i4'),
+    'uint8': ('u8', 'pcm_u8', 'u1'),
+}
 
 
 # should we have a specific base parser for audio?
@@ -21,3 +36,118 @@ class AudioFFMpeg(BaseFFMpeg):
         audio file from one format
         to another"""
         pass
+
+    def iter_samples(self, path, sample_rate=None, channels=None,
+                     dtype='float32', block_frames=65536, buffers=2,
+                     start=None, end=None):
+        """Decodes the first audio stream of path and yields
+        its samples in numpy arrays of shape (frames, channels),
+        block_frames frames each, the last block has the frames
+        which are left; the memory used does not grow with the
+        length of the audio.
+
+        ffmpeg writes the raw samples to a pipe and they are
+        read into a ring of buffers arrays allocated once, the
+        arrays yielded are views of the ring: a block is
+        overwritten buffers blocks later, copy it to keep it.
+
+        :param sample_rate: e.g. 16000, None keeps the one
+        of the stream
+        :param channels: e.g. 1 mixes down to mono, None
+        keeps the ones of the stream
+        :param dtype: sample type, see PCM_FORMATS
+        :param start: seconds or '%H:%M:%S' to start from
+        :param end: seconds or '%H:%M:%S' to stop at
+        """
+        numpy = import_numpy('iter_samples')
+        sample_rate, channels, _ = self._sample_layout(path, sample_rate,
+                                                       channels, dtype)
+        ring = [numpy.empty((block_frames, channels), PCM_FORMATS[dtype][2])
+                for _ in range(max(buffers, 1))]
+        _cmds = self._samples_cmds(path, sample_rate, channels, dtype,
+                                   start, end)
+        for block, frames in self._iter_raw(_cmds, itertools.cycle(ring)):
+            yield block[:frames]
+
+    def read_all(self, path, sample_rate=None, channels=None,
+                 dtype='float32', start=None, end=None):
+        """Decodes the first audio stream of path into one
+        numpy array of shape (frames, channels); the array
+        is allocated once from the probed duration and the
+        samples are read straight into it, it only grows
+        when the duration was short. The arguments are the
+        ones of iter_samples."""
+        numpy = import_numpy('read_all')
+        sample_rate, channels, duration = self._sample_layout(
+            path, sample_rate, channels, dtype)
+        # the frames between start and end when they are
+        # seconds, else the duration of the whole stream
+        try:
+            duration = (float(end) if end is not None else duration) - \
+                (float(start) if start is not None else 0.0)
+        except (TypeError, ValueError):
+            pass
+        # a little more than the duration, a frame of the
+        # codec may end after the duration of the stream
+        frames = int((duration or 0) * sample_rate) + sample_rate // 10 + 1
+        samples = [numpy.empty((max(frames, 1), channels),
+                               PCM_FORMATS[dtype][2])]
+        filled = [0]
+
+        def blocks():
+            while True:
+                if filled[0] == len(samples[0]):
+                    # the duration was short, grow by half
+                    grown = numpy.empty((len(samples[0]) * 3 // 2 + 1,
+                                         channels), samples[0].dtype)
+                    grown[:filled[0]] = samples[0]
+                    samples[0] = grown
+                yield samples[0][filled[0]:]
+
+        _cmds = self._samples_cmds(path, sample_rate, channels, dtype,
+                                   start, end)
+        for _, frames in self._iter_raw(_cmds, blocks()):
+            filled[0] += frames
+
+        return samples[0][:filled[0]]
+
+    def _sample_layout(self, path, sample_rate, channels, dtype):
+        # sample rate and channels of the samples, the ones
+        # of the audio stream unless they are given, and the
+        # duration of the stream in seconds
+        if dtype not in PCM_FORMATS:
+            raise ValueError('dtype %s is not one of %s' % (
+                dtype, ', '.join(sorted(PCM_FORMATS))))
+        info = BasicFFProbe(verbose=self.verbose).probe(path)
+        stream = None
+        if info is not None:
+            for stream in info.streams:
+                if stream.codec_type == 'audio':
+                    break
+            else:
+                stream = None
+        if stream is None:
+            raise ValueError('%s has no audio stream' % path)
+        sample_rate = int(sample_rate or stream.sample_rate)
+        channels = int(channels or stream.channels)
+        duration = stream.duration
+        if duration is None:  # e.g. matroska, only the format has it
+            duration = info.get_media_duration()
+
+        return sample_rate, channels, duration
+
+    def _samples_cmds(self, path, sample_rate, channels, dtype,
+                      start=None, end=None):
+        # -ss and -to are options of the input, ffmpeg seeks
+        # to start and stops reading the input at end
+        raw_format, codec, _ = PCM_FORMATS[dtype]
+        _cmds = []
+        if start is not None:
+            _cmds.extend(['-ss', str(start)])
+        if end is not None:
+            _cmds.extend(['-to', str(end)])
+        _cmds.extend(['-i', path, '-map', '0:a:0', '-vn', '-sn',
+                      '-acodec', codec, '-ar', str(sample_rate),
+                      '-ac', str(channels), '-f', raw_format, 'pipe:1'])
+
+        return _cmds
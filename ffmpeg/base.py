@@ -1,29 +1,93 @@
 """Base classes and functions for
 the ffmpeg package"""
-import pdb
 import re
 import os
 import sys
-import re
+from fractions import Fraction
 from subprocess import Popen, PIPE
-from utils import find_codec
+from .utils import find_codec, iter_lines
+from .progress import ProgressParser
+from .registry import CapabilityRegistry, LISTINGS
+from .resolver import ExecutableResolver
 
 
 # general error class to be used to catch specific
 # errors in lines produced by tools of the ffmpeg
-# tools; error.error_class(*arguments) will be
-# thrown. in the following __init__ constructor,
-# arguments is going to be a list which stores
-# specific regular expressions
+# tools; name is a piece of text which is always in
+# the line of the error. pattern is a regular expression
+# searched in the line, its named groups are passed as
+# keyword arguments, error.error_class(line, **groups)
+# will be thrown. without a pattern the line has to start
+# with name, arguments is then a list of specific regular
+# expressions and error.error_class(name, *matches) is
+# thrown, like in the first versions of the parser
 class FFMpegError(object):
-    def __init__(self, name, error_class, arguments):
+    def __init__(self, name, error_class, arguments=(),
+                 pattern=None):
         self.name = name
         self.error_class = error_class
-        self.arguments = arguments
+        # every error keeps its own compiled arguments
+        self.arguments = [re.compile(argument)
+                          for argument in arguments]
+        if pattern is None:
+            pattern = '^' + re.escape(name)
+            self.legacy = True  # build with error.arguments
+        else:
+            self.legacy = False  # build with named groups
+        self.pattern = pattern
+        self.regex = re.compile(pattern)
 
     #  returns a Bool, True or False?
     def error_matches(self, line):
-        return line.startswith(self.name)
+        return self.regex.search(line) is not None
+
+    def build_error(self, line, match_obj):
+        """Returns the exception to raise for line,
+        match_obj is the match of self.regex."""
+        if self.legacy:
+            arguments = [self.name]
+            for argument in self.arguments:
+                arg_match = argument.search(line)
+                if arg_match is not None:
+                    arguments.append(arg_match.group())
+            return self.error_class(*arguments)
+
+        return self.error_class(line.strip(), **match_obj.groupdict())
+
+
+class ErrorMatcher(object):
+    """Compiles the names of a list of FFMpegError
+    objects into one regular expression, an alternation
+    of literals; a line without errors is searched once.
+    When a name is found, the pattern of its error gives
+    the arguments of the exception."""
+
+    def __init__(self, errors):
+        self.errors = errors
+        self._by_name = {}  # name -> errors with that name
+        for error in errors:
+            self._by_name.setdefault(error.name, []).append(error)
+        # longer names first, so a name which starts
+        # with a shorter one is not hidden by it
+        names = sorted(self._by_name, key=len, reverse=True)
+        if names:
+            self._regex = re.compile('|'.join(re.escape(name)
+                                              for name in names))
+        else:
+            self._regex = None
+
+    def search(self, line):
+        """Returns the exception to raise for line,
+        None if the line does not contain an error."""
+        if self._regex is None:
+            return None
+        for name_match in self._regex.finditer(line):
+            for error in self._by_name[name_match.group()]:
+                match_obj = error.regex.search(line)
+                if match_obj is not None:
+                    return error.build_error(line, match_obj)
+
+        return None
 
 
 # the following deals with encoding errors
@@ -51,71 +115,302 @@ class Video(object):  # maybe we don't need it
         self.quality = quality
 
 
+# ffprobe -print_format json nests tags and dispositions
+# in objects and writes integers as numbers; the following
+# turns an object of the json output into the key, value
+# pairs of the default output, e.g. TAG:title=Intro, so both
+# outputs fill the internal structures the same way
+def ffprobe_json_items(data):
+    for key, value in data.items():
+        if key == 'tags':
+            for tag, tag_value in value.items():
+                yield 'TAG:%s' % tag, tag_value
+        elif isinstance(value, dict):  # e.g. disposition
+            for sub_key, sub_value in value.items():
+                yield '%s:%s' % (key.upper(), sub_key), str(sub_value)
+        elif isinstance(value, list):  # e.g. side_data_list
+            continue
+        elif isinstance(value, bool):
+            yield key, str(value).lower()
+        else:
+            yield key, value if isinstance(value, type(u'')) \
+                else str(value)
+
+
+# converters of the raw values, ffprobe writes N/A or
+# 0/0 for the values it does not know, they become None
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_fraction(value):
+    # e.g. 30000/1001 for r_frame_rate, 1/12800 for time_base
+    try:
+        return Fraction(value)
+    except (TypeError, ValueError, ZeroDivisionError):
+        return None
+
+
+# most records of a catalog have the same keys, e.g. every
+# h264 stream probed by one build of ffprobe; each set of
+# keys is kept once in the following table, with the
+# position of each key, and the records keep only a tuple
+# of values. The table is bounded, records with an unusual
+# set of keys keep a table of their own
+_key_tables = {}
+_KEY_TABLES_MAX = 4096
+
+# values which are the same in many records, e.g. h264 or
+# und, are interned; the values of these keys are unique
+# to each file and are kept as they come
+_UNIQUE_KEYS = frozenset(['filename', 'size', 'duration', 'duration_ts',
+                          'bit_rate', 'nb_frames', 'TAG:creation_time'])
+_intern = getattr(sys, 'intern', None)
+
+
+def _key_table(keys):
+    table = _key_tables.get(keys)
+    if table is None:
+        table = (tuple(_intern(key) if _intern else key for key in keys),
+                 dict((key, i) for i, key in enumerate(keys)))
+        if len(_key_tables) < _KEY_TABLES_MAX:
+            _key_tables[keys] = table
+
+    return table
+
+
+def _compact_value(key, value):
+    if (_intern is not None and type(value) is str and
+            len(value) <= 40 and key not in _UNIQUE_KEYS):
+        return _intern(value)
+
+    return value
+
+
+class _Field(object):
+    # typed field of a ProbeRecord, converted from the raw
+    # value of key on first access and kept in slot
+    def __init__(self, key, convert=None):
+        self.key = key
+        self.convert = convert
+        self.slot = '_' + key
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        try:
+            return getattr(obj, self.slot)
+        except AttributeError:  # not converted yet
+            value = obj.get(self.key)
+            if value is not None and self.convert is not None:
+                value = self.convert(value)
+            setattr(obj, self.slot, value)
+            return value
+
+    def __set__(self, obj, value):
+        setattr(obj, self.slot, value)
+
+
+class _Prefixed(_Field):
+    # dict of the raw keys which start with prefix, e.g.
+    # TAG:title=Intro gives {'title': 'Intro'}
+    def __init__(self, name, prefix, convert=None):
+        super(_Prefixed, self).__init__(name, convert)
+        self.prefix = prefix
+
+    def __get__(self, obj, cls):
+        if obj is None:
+            return self
+        try:
+            return getattr(obj, self.slot)
+        except AttributeError:
+            size = len(self.prefix)
+            value = dict((key[size:], self.convert(raw) if self.convert
+                          else raw)
+                         for key, raw in obj.items()
+                         if key.startswith(self.prefix))
+            setattr(obj, self.slot, value)
+            return value
+
+
+class ProbeRecord(object):
+    """A section of the ffprobe output, e.g. [FORMAT];
+    keeps every raw key, value pair in a compact form
+    and converts the typed fields of the subclasses,
+    e.g. StreamInfo.width, on first access. The raw
+    values are strings as written by ffprobe."""
+    __slots__ = ('_table', '_values')
+
+    def __init__(self):
+        self._table = None  # (keys, {key: position}) once sealed
+        self._values = []  # [key, value] pairs until sealed
+
+    def set_raw(self, key, value):
+        if self._table is not None:  # sealed, open it again
+            self._values = [list(item) for item in self.items()]
+            self._table = None
+        self._values.append([key, _compact_value(key, value)])
+
+    def seal(self):
+        """Packs the pairs into a tuple of values and a
+        table of keys shared with the records which have
+        the same keys; called at the end of the section."""
+        if self._table is not None:
+            return
+        items = dict(self._values)  # the last value of a key wins
+        self._table = _key_table(tuple(items))
+        self._values = tuple(items.values())
+
+    def get(self, key, default=None):
+        """Returns the raw value of key as
+        returned by ffprobe, e.g. get('pix_fmt')"""
+        if self._table is None:
+            for item_key, value in reversed(self._values):
+                if item_key == key:
+                    return value
+            return default
+        position = self._table[1].get(key)
+        if position is None:
+            return default
+
+        return self._values[position]
+
+    def items(self):
+        """Yields the raw key, value pairs."""
+        if self._table is None:
+            return iter(dict(self._values).items())
+
+        return zip(self._table[0], self._values)
+
+    def __getitem__(self, key):
+        value = self.get(key)
+        if value is None:
+            raise KeyError(key)
+
+        return value
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+
 # the following class is going to
 # be used inside MediaInfo, an object
 # which is being utilized by the
 # ffmpeg.ffprobe.BasicFFProbeParser
-class FormatInfo(object):
-
-    def __init__(self):
-        self.nb_streams = None
-        self.start_time = None
-        self.format_long_name = None
-        self.format_name = None
-        self.filename = None
-
-    # we set the attributes declared inside
-    # the __init__ constructor through the parsing
-    # method which is defined below; key, value approach
+class FormatInfo(ProbeRecord):
+    __slots__ = ('_filename', '_nb_streams', '_nb_programs',
+                 '_format_name', '_format_long_name', '_start_time',
+                 '_duration', '_size', '_bit_rate', '_probe_score',
+                 '_tags')
+
+    filename = _Field('filename')
+    nb_streams = _Field('nb_streams', _to_int)
+    nb_programs = _Field('nb_programs', _to_int)
+    format_name = _Field('format_name')  # e.g. mov,mp4,m4a,3gp,3g2,mj2
+    format_long_name = _Field('format_long_name')
+    start_time = _Field('start_time', _to_float)  # seconds
+    duration = _Field('duration', _to_float)  # seconds
+    size = _Field('size', _to_int)  # bytes
+    bit_rate = _Field('bit_rate', _to_int)  # bits/s
+    probe_score = _Field('probe_score', _to_int)
+    tags = _Prefixed('tags', 'TAG:')  # TAG:key=value of the format
+
+    # key, value pairs of the output go to the raw table,
+    # the attributes are converted from it when asked for
     def parse_format(self, key, value):
-        if hasattr(self, key):
-            setattr(self, key, value)  # attr based on key, value
+        self.set_raw(key, value)
 
 
 # the following is a custom base class which can
 # be used to create skeleton of an internal structure
 # that we are going to utilize to store stream data
-class StreamInfo(object):
-
-    # the constructor of the class, __init__
-    def __init__(self):
-        """Stores data of a stream returned by ffprobe
-        utility of the ffmpeg framework into an internal
-        structure. This class will be used in MediaInfo
-        to build the stream objects."""
-        self.has_b_frames = None
-        self.duration_ts = None
-        self.duration = None  # duration in seconds
-        self.creation_time = None  # when is stream created?
-        self.nb_frames = None  # frames in stream
-        self.index = None  # each stream has its index
-        self._codec_info = {}  # store codec info from stream
-        self._codec = None  # each stream has a codec
+class StreamInfo(ProbeRecord):
+    """Stores data of a stream returned by ffprobe
+    utility of the ffmpeg framework into an internal
+    structure. This class will be used in MediaInfo
+    to build the stream objects."""
+    __slots__ = ('_codec', '_catalog_source', '_index', '_codec_name',
+                 '_codec_long_name', '_codec_type', '_profile',
+                 '_width', '_height', '_pix_fmt', '_has_b_frames',
+                 '_r_frame_rate', '_avg_frame_rate', '_time_base',
+                 '_start_time', '_duration_ts', '_duration', '_bit_rate',
+                 '_nb_frames', '_sample_rate', '_sample_fmt', '_channels',
+                 '_channel_layout', '_tags', '_disposition')
+    # object with a codec_catalog, e.g. a BaseFFMpeg, for
+    # the streams which have no catalog_source of their own;
+    # BasicFFProbe.probe sets the source of the streams it
+    # returns to itself
+    default_catalog_source = None
+
+    index = _Field('index', _to_int)  # each stream has its index
+    codec_name = _Field('codec_name')  # e.g. h264
+    codec_long_name = _Field('codec_long_name')
+    codec_type = _Field('codec_type')  # video, audio, subtitle, ...
+    profile = _Field('profile')
+    width = _Field('width', _to_int)  # only for video streams
+    height = _Field('height', _to_int)  # only for video streams
+    pix_fmt = _Field('pix_fmt')
+    has_b_frames = _Field('has_b_frames', _to_int)
+    r_frame_rate = _Field('r_frame_rate', _to_fraction)
+    avg_frame_rate = _Field('avg_frame_rate', _to_fraction)
+    time_base = _Field('time_base', _to_fraction)
+    start_time = _Field('start_time', _to_float)  # seconds
+    duration_ts = _Field('duration_ts', _to_int)  # in time_base units
+    duration = _Field('duration', _to_float)  # duration in seconds
+    bit_rate = _Field('bit_rate', _to_int)
+    nb_frames = _Field('nb_frames', _to_int)  # frames in stream
+    sample_rate = _Field('sample_rate', _to_int)  # only for audio
+    sample_fmt = _Field('sample_fmt')
+    channels = _Field('channels', _to_int)
+    channel_layout = _Field('channel_layout')
+    tags = _Prefixed('tags', 'TAG:')  # TAG:key=value of the stream
+    disposition = _Prefixed('disposition', 'DISPOSITION:', _to_int)
 
     def parse_stream(self, key, value):
         """Method which parses the stream based on raw
         live output returned by ffprobe utility."""
-        codec_keys = ['codec_name', 'codec_tag', 'codec_long_name',
-                      'codec_type', 'codec_time', 'codec_tag_string']
-        if hasattr(self, key):
-            setattr(self, key, value)
-        elif key in codec_keys:
-            self._codec_info[key] = value
+        self.set_raw(key, value)
+
+    @property
+    def creation_time(self):  # when is stream created?
+        return self.get('TAG:creation_time')
+
+    @property
+    def catalog_source(self):
+        try:
+            return self._catalog_source
+        except AttributeError:
+            return self.default_catalog_source
+
+    @catalog_source.setter
+    def catalog_source(self, source):
+        self._catalog_source = source
 
     # each stream has a codec
     @property  # build Codec object
-    def codec(self):  # build it from list_codecs?
-        if self._codec is None:
-            # list codecs
-            # set self._codec by looking in codecs returned
-            # by list_codecs
-            _codec_name = self._codec_info.get('codec_name')
-        # for now just return the name of the codec
+    def codec(self):
+        """Codec object of the stream, found in the
+        CodecCatalog of catalog_source; None when the
+        codec is not known"""
+        codec = getattr(self, '_codec', None)
+        if codec is None and self.catalog_source is not None:
+            codec = self.catalog_source.codec_catalog.get(self.codec_name)
+            self._codec = codec
 
-        return _codec_name
+        return codec
 
     def __repr__(self):
-        return 'Stream %s' % self.codec
+        return 'Stream %s' % self.codec_name
 
     def __str__(self):
         return self.__repr__()
@@ -123,12 +418,30 @@ class StreamInfo(object):
 
 # specific class for the audio streams
 class AudioStream(StreamInfo):
-    pass
+    __slots__ = ()
 
 
 # specific class for the video streams
 class VideoStream(StreamInfo):
-    pass
+    __slots__ = ()
+
+
+# stores a chapter returned by ffprobe -show_chapters
+class ChapterInfo(ProbeRecord):
+    __slots__ = ('_id', '_time_base', '_start_time', '_end_time', '_tags')
+
+    id = _Field('id', _to_int)
+    time_base = _Field('time_base', _to_fraction)
+    start_time = _Field('start_time', _to_float)  # start in seconds
+    end_time = _Field('end_time', _to_float)  # end in seconds
+    tags = _Prefixed('tags', 'TAG:')  # e.g. TAG:title=Intro
+
+    def parse_chapter(self, key, value):
+        self.set_raw(key, value)
+
+    @property
+    def title(self):
+        return self.tags.get('title')
 
 
 class MediaInfo(object):
@@ -137,13 +450,17 @@ class MediaInfo(object):
     media duration etc; parses the output
     returned by the ffprobe utility into internal
     structures, respectively FormatInfo and StreamInfo."""
+    __slots__ = ('current_stream', 'current_format', 'current_chapter',
+                 'format_info', 'streams', 'chapters')
 
     def __init__(self):  # __init__ constructor of class
         self.current_stream = None  # stream reading on or off?
         self.current_format = None  # format reading on or off?
+        self.current_chapter = None  # chapter reading on or off?
         self.format_info = None  # ffmpeg.base.FormatInfo
         # self.format_info = FormatInfo()  # move it inside parse_ffprobe
         self.streams = []  # store media streams as StreamInfo objects
+        self.chapters = []  # store chapters as ChapterInfo objects
         # self.format_info = {}  # store FORMAT info
 
     def parse_ffprobe(self, line):
@@ -154,6 +471,7 @@ class MediaInfo(object):
             self.current_stream = StreamInfo()
         if line == '[/STREAM]':
             # set self.parse_stream to False ?
+            self.current_stream.seal()  # pack the raw values
             self.streams.append(self.current_stream)
             self.current_stream = None  # reset self.current_stream to None
 
@@ -161,11 +479,22 @@ class MediaInfo(object):
             self.current_format = FormatInfo()
 
         if line == '[/FORMAT]':  # end of format data
+            self.current_format.seal()
             self.format_info = self.current_format
             self.current_format = None
 
+        if line == '[CHAPTER]':  # start of a chapter
+            self.current_chapter = ChapterInfo()
+
+        if line == '[/CHAPTER]':  # end of the chapter
+            self.current_chapter.seal()
+            self.chapters.append(self.current_chapter)
+            self.current_chapter = None
+
         if '=' in line:
-            k, v = line.split('=')
+            # values can contain = as well, e.g. in tags
+            # or file names, split on the first one only
+            k, v = line.split('=', 1)
             k = k.strip()
             v = v.strip()
             if self.current_stream:
@@ -173,11 +502,67 @@ class MediaInfo(object):
             elif self.current_format:
                 # self.format_info[k] = v
                 self.current_format.parse_format(k, v)
+            elif self.current_chapter:
+                self.current_chapter.parse_chapter(k, v)
+
+    def parse_ffprobe_json(self, data):
+        """Fills the MediaInfo from the output of
+        ffprobe -print_format json, already decoded
+        with json.loads into data, a dict."""
+        for stream_data in data.get('streams', []):
+            stream = StreamInfo()
+            for k, v in ffprobe_json_items(stream_data):
+                stream.parse_stream(k, v)
+            stream.seal()
+            self.streams.append(stream)
+
+        for chapter_data in data.get('chapters', []):
+            chapter = ChapterInfo()
+            for k, v in ffprobe_json_items(chapter_data):
+                chapter.parse_chapter(k, v)
+            chapter.seal()
+            self.chapters.append(chapter)
+
+        format_data = data.get('format')
+        if format_data is not None:
+            self.format_info = FormatInfo()
+            for k, v in ffprobe_json_items(format_data):
+                self.format_info.parse_format(k, v)
+            self.format_info.seal()
+
+    def to_ffprobe_json(self):
+        """Returns the MediaInfo as the dict which
+        ffprobe -print_format json would return, it
+        can be given back to parse_ffprobe_json."""
+        data = {'streams': [self._record_json(stream)
+                            for stream in self.streams],
+                'chapters': [self._record_json(chapter)
+                             for chapter in self.chapters]}
+        if self.format_info is not None:
+            data['format'] = self._record_json(self.format_info)
+
+        return data
+
+    @staticmethod
+    def _record_json(record):
+        # TAG:title=Intro goes back to {'tags': {'title': 'Intro'}}
+        data = {}
+        for key, value in record.items():
+            if ':' in key:
+                section, sub_key = key.split(':', 1)
+                section = 'tags' if section == 'TAG' else section.lower()
+                data.setdefault(section, {})[sub_key] = value
+            else:
+                data[key] = value
+
+        return data
 
     def get_media_duration(self):
-        duration = self.format_info['duration']
+        """Duration of the media in seconds, a float"""
+        if self.format_info is None:
+            return None
 
-        return duration
+        return self.format_info.duration
 
     def get_media_title(self):
         pass
@@ -202,82 +587,244 @@ class MediaInfo(object):
 # ffmpeg objects such as filters, encoders,
 # decoders, subtitles,
 class Filter(object):
-    pass
+    """Filter of libavfilter as listed by
+    ffmpeg -filters"""
+
+    def __init__(self):
+        self.name = None  # e.g. scale
+        self.desc = None
+        self.inputs = None  # e.g. V, AA, N (dynamic) or | (source)
+        self.outputs = None
+        self.timeline = False  # supports enable=
+        self.slice_threads = False
+        self.command_support = False
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, self.name)
+
+    def parse_filter(self, features, name, inputs, outputs, desc):
+        # features is a string like T.C, with . for
+        # the features the filter does not have
+        self.timeline = 'T' in features
+        self.slice_threads = 'S' in features
+        self.command_support = 'C' in features
+        self.name = name
+        self.inputs = inputs
+        self.outputs = outputs
+        self.desc = desc
 
+    @property
+    def source(self):
+        return self.inputs == '|'
 
-class Decoder(object):
-    decoder_attr = []
+    @property
+    def sink(self):
+        return self.outputs == '|'
+
+
+class Encoder(object):
+    """Encoder as listed by ffmpeg -encoders;
+    codec_name is the codec it produces, e.g.
+    h264 for the libx264 encoder"""
 
     def __init__(self):
-        pass
+        self.name = None  # e.g. libx264
+        self.desc = None
+        self.codec_name = None  # e.g. h264
+        self.codec_type = None  # audio, video or subtitle
+        self.frame_threads = False
+        self.slice_threads = False
+        self.experimental = False
+        self.draw_horiz_band = False
+        self.direct_rendering = False
 
-    def parse_decoder(self):
-        pass
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, self.name)
+
+    def parse_encoder(self, features, name, desc):
+        # features is a string like V.S..D, the first
+        # letter is the type and the others are flags
+        # in their own columns
+        self.codec_type = _encoder_type_map.get(features[0])
+        self.frame_threads = features[1] == 'F'
+        self.slice_threads = features[2] == 'S'
+        self.experimental = features[3] == 'X'
+        self.draw_horiz_band = features[4] == 'B'
+        self.direct_rendering = features[5] == 'D'
+        self.name = name
+        # the description ends with (codec h264) when the
+        # name of the encoder is not the name of its codec
+        match_obj = _encoder_codec_regex.search(desc)
+        if match_obj is not None:
+            self.codec_name = match_obj.group(1)
+            desc = desc[:match_obj.start()]
+        else:
+            self.codec_name = name
+        self.desc = desc
+
+
+_encoder_type_map = {'V': 'video', 'A': 'audio', 'S': 'subtitle'}
+_encoder_codec_regex = re.compile(r'\s*\(codec (\S+)\)$')
+
+
+# ffmpeg -decoders has the same columns as -encoders
+class Decoder(Encoder):
+
+    def parse_decoder(self, features, name, desc):
+        self.parse_encoder(features, name, desc)
+
+
+class Muxer(object):
+    """File format as listed by ffmpeg -muxers"""
+
+    def __init__(self):
+        self.name = None  # e.g. matroska
+        self.desc = None
+        self.demuxing = False
+        self.muxing = False
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, self.name)
+
+    def parse_muxer(self, features, name, desc):
+        self.demuxing = 'D' in features
+        self.muxing = 'E' in features
+        self.name = name
+        self.desc = desc
+
+
+class Layout(object):
+    """Standard channel layout, e.g. stereo"""
+
+    def __init__(self, name, channels, descriptions):
+        self.name = name
+        self.channels = channels  # e.g. ['FL', 'FR']
+        self.descriptions = descriptions  # e.g. ['front left', ...]
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, self.name)
+
+    @property
+    def nb_channels(self):
+        return len(self.channels)
+
+
+class Color(object):
+    """Named color of ffmpeg -colors"""
+
+    def __init__(self, name, value):
+        self.name = name  # e.g. AliceBlue
+        self.value = value  # e.g. #f0f8ff
+
+    def __repr__(self):
+        return '%s(%s, %s)' % (self.__class__.__name__, self.name,
+                               self.value)
+
+    @property
+    def rgb(self):
+        """(red, green, blue) from 0 to 255"""
+        value = self.value.lstrip('#')
+        return tuple(int(value[i:i + 2], 16) for i in (0, 2, 4))
+
+
+# capability bits of Device.flags and Codec.flags; each
+# column of the feature string which ffmpeg prints in front
+# of a device or a codec, e.g. DEV.LS, maps its letter to
+# a bit, so the features are parsed in a single pass
+DEMUXING = 1 << 0
+MUXING = 1 << 1
+
+CODEC_DECODING = 1 << 0
+CODEC_ENCODING = 1 << 1
+CODEC_VIDEO = 1 << 2
+CODEC_AUDIO = 1 << 3
+CODEC_SUBTITLE = 1 << 4
+CODEC_DATA = 1 << 5
+CODEC_ATTACHMENT = 1 << 6
+CODEC_INTRAFRAME_ONLY = 1 << 7
+CODEC_LOSSY = 1 << 8
+CODEC_LOSSLESS = 1 << 9
+
+# letter -> bit for each column, the same letter means
+# something else in another column, e.g. S in DES..S
+_device_columns = ({'D': DEMUXING}, {'E': MUXING})
+_codec_columns = ({'D': CODEC_DECODING},
+                  {'E': CODEC_ENCODING},
+                  {'V': CODEC_VIDEO, 'A': CODEC_AUDIO,
+                   'S': CODEC_SUBTITLE, 'D': CODEC_DATA,
+                   'T': CODEC_ATTACHMENT},
+                  {'I': CODEC_INTRAFRAME_ONLY},
+                  {'L': CODEC_LOSSY},  # ....L. = Lossy compression
+                  {'S': CODEC_LOSSLESS})  # .....S = Lossless compression
+_codec_types = ((CODEC_VIDEO, 'video'), (CODEC_AUDIO, 'audio'),
+                (CODEC_SUBTITLE, 'subtitle'), (CODEC_DATA, 'data'),
+                (CODEC_ATTACHMENT, 'attachment'))
+
+# a build has a few dozen distinct feature strings for
+# hundreds of codecs, each one is parsed once
+_flags_cache = {}
+
+
+def parse_flags(features, columns):
+    """Returns the bitmask of a feature string,
+    e.g. parse_flags('DEV.LS', _codec_columns)"""
+    key = (features, id(columns))
+    flags = _flags_cache.get(key)
+    if flags is None:
+        flags = 0
+        for column, letter in zip(columns, features):
+            flags |= column.get(letter, 0)
+        _flags_cache[key] = flags
+
+    return flags
 
 
 class Device(object):
     """Class which is going to provide
     behavior for ffmpeg devices"""
+    __slots__ = ('device_name', 'device_desc', 'flags')
 
     def __init__(self):
-        self._demuxing = False
-        self._muxing = False
-        self.device_info = {}
         self.device_name = None
         self.device_desc = None
+        self.flags = 0  # DEMUXING | MUXING
+
+    def __repr__(self):
+        return '%s(%s)' % (self.__class__.__name__, self.device_name)
 
     def parse_device(self, features, name, desc):
-        device_map = {
-            'D': {'demuxing': True},
-            'E': {'muxing': True}
-        }
-        for el in features:
-            device_data = device_map.get(el)
-            if device_data is not None:
-                self.device_info.update(device_data)
+        # features is a string like DE or ' E'
+        self.flags = parse_flags(features, _device_columns)
 
         # set name and desc for the device
         self.device_name = name
         self.device_desc = desc
 
-        return self.device_info
+        return self.flags
 
     @property
     def demuxing(self):
-        if not self._demuxing:
-            if self.device_info.get('demuxing'):
-                self._demuxing = True
-
-        return self._demuxing
+        return bool(self.flags & DEMUXING)
 
     @property
     def muxing(self):
-        if not self._muxing:
-            if self.device_info.get('muxing'):
-                self._muxing = True
+        return bool(self.flags & MUXING)
 
 
 class Codec(object):  # Codec instance factory
-    # codec.codec_type returns a dict
-    # codec.decoding = True or False?
-    # codec.name --> xsub
+    # codec.codec_type --> video
+    # codec.decoding_support = True or False
+    # codec.codec_name --> xsub
+    # one record per codec of each build, hundreds of them,
+    # so no __dict__ and the capabilities in one int
+    __slots__ = ('codec_name', 'codec_desc', 'flags')
 
     # init is the first method which is executed in the
     # initialization of the object
     def __init__(self):
-        self._codec_type = {}  # audio, video, subtitle
-        self._codec_info = {}
-        self._video_support = False
-        self._audio_support = False
-        self._subtitle_support = False
-        self._encoding_support = False
-        self._decoding_support = False
-        self._intraframe_only = False
-        self._compression_type = None  # lossy or lossless
         self.codec_name = None  # e.g., xsub
         self.codec_desc = None  # a longer description of codec
-
-        # should we execute parse_codec here
+        self.flags = 0  # CODEC_* bits
 
     def __repr__(self):
         """Returns a representation of the
@@ -301,100 +848,155 @@ class Codec(object):  # Codec instance factory
         # codec_name is a string, e.g., 4xm
         # codec_desc is another string, e.g.,
         # in this case it is 4X Movie
-        codec_type_map = {
-            'A': 'audio',
-            'V': 'video',
-            'S': 'subtitle'
-        }
-        codec_map = {
-            'D': {'decoding': True},
-            'E': {'encoding': True},
-            'I': {'intraframe_only': True},
-            'L': {'lossless': True},
-            'S': {'lossy': True},
-        }
-        # features is a string like '..V...' or a string
-        # like ..S..S which means subtitle codec support and
-        # lossless compression support
-        for el in features:
-            if features.index(el) == 2:
-                # set self._codec_type in here
-                self._codec_type = codec_type_map.get(el)
-                continue
-            codec_map_el = codec_map.get(el)
-            if codec_map_el is not None:
-                self._codec_info.update(codec_map_el)
-        # return some dict in here
+        # each letter is read from its own column, ..S..S
+        # is a subtitle codec with lossless compression
+        self.flags = parse_flags(features, _codec_columns)
 
         # the following sets up the name of the codec
         # instance and also the description of the codec
         self.codec_name = codec_name
         self.codec_desc = codec_desc
-        # self._codec_type = codec_type
 
-        return self._codec_info
+        return self.flags
+
+    @property
+    def codec_type(self):
+        """video, audio, subtitle, data or attachment"""
+        for bit, codec_type in _codec_types:
+            if self.flags & bit:
+                return codec_type
+
+        return None
 
     @property
     def audio_support(self):
         """Method which finds out
         if the codec supports audio
         stream or not"""
-        # check the codec_type dict, if 'audio' is not
-        if not self._audio_support:
-            if self._codec_type == 'audio':
-                self._audio_support = True
-
-        return self._audio_support
+        return bool(self.flags & CODEC_AUDIO)
 
     @property
     def video_support(self):
-        if not self._video_support:
-            if self._codec_type == 'video':
-                # set self._video_support to True
-                self._video_support = True
-
-        return self._video_support
+        return bool(self.flags & CODEC_VIDEO)
 
     @property
     def subtitle_support(self):
         """Finds out if codec supports subtitles
         or not."""
-        if not self._subtitle_support:
-            if self._codec_type == 'subtitle':
-                # set self._subtitle_support to True
-                self._subtitle_support = True
-
-        return self._subtitle_support
+        return bool(self.flags & CODEC_SUBTITLE)
 
     @property
     def compression_type(self):
         """Finds out the compression type of
-        codec, is it lossy or lossless."""
-        pass
+        codec, lossy, lossless or both, e.g. h264;
+        None when ffmpeg does not tell it."""
+        lossy = self.flags & CODEC_LOSSY
+        lossless = self.flags & CODEC_LOSSLESS
+        if lossy and lossless:
+            return 'both'
+        if lossy:
+            return 'lossy'
+        if lossless:
+            return 'lossless'
+
+        return None
 
     @property
     def decoding_support(self):
-        if not self._decoding_support:
-            if self._codec_info.get('decoding') is not None:
-                self._decoding_support = True
-
-        return self._decoding_support
+        return bool(self.flags & CODEC_DECODING)
 
     @property
     def encoding_support(self):
-        if not self._encoding_support:
-            if self._codec_info.get('encoding') is not None:
-                self._encoding_support = True
-
-        return self._encoding_support
+        return bool(self.flags & CODEC_ENCODING)
 
     @property
     def intraframe_only(self):
-        if not self._intraframe_only:
-            if self._codec_info.get('intraframe_only') is not None:
-                self._intraframe_only = True
+        return bool(self.flags & CODEC_INTRAFRAME_ONLY)
 
-        return self._intraframe_only
+    @property
+    def lossy(self):
+        return bool(self.flags & CODEC_LOSSY)
+
+    @property
+    def lossless(self):
+        return bool(self.flags & CODEC_LOSSLESS)
+
+
+class CodecCatalog(object):
+    """Codecs of a build by name, with an index for
+    each capability, so a lookup by name is a dict
+    lookup and select('video', 'encoding', 'lossless')
+    only tests the bits of the codecs in the smallest
+    index; the result of each
+    selection is kept for the next call."""
+    # capability -> bit of Codec.flags
+    capabilities = {
+        'audio': CODEC_AUDIO,
+        'video': CODEC_VIDEO,
+        'subtitle': CODEC_SUBTITLE,
+        'data': CODEC_DATA,
+        'attachment': CODEC_ATTACHMENT,
+        'decoding': CODEC_DECODING,
+        'encoding': CODEC_ENCODING,
+        'intraframe_only': CODEC_INTRAFRAME_ONLY,
+        'lossy': CODEC_LOSSY,
+        'lossless': CODEC_LOSSLESS,
+    }
+
+    def __init__(self, codecs=()):
+        self._codecs = {}  # codec_name -> Codec
+        self._index = dict((capability, [])
+                           for capability in self.capabilities)
+        self._selections = {}  # frozenset of capabilities -> tuple
+        for codec in codecs:
+            self.add(codec)
+
+    def __repr__(self):
+        return '%s(%d codecs)' % (self.__class__.__name__,
+                                  len(self._codecs))
+
+    def __len__(self):
+        return len(self._codecs)
+
+    def __iter__(self):
+        return iter(self._codecs.values())
+
+    def __contains__(self, codec_name):
+        return codec_name in self._codecs
+
+    def __getitem__(self, codec_name):
+        return self._codecs[codec_name]
+
+    def add(self, codec):
+        self._codecs[codec.codec_name] = codec
+        for capability, bit in self.capabilities.items():
+            if codec.flags & bit:
+                self._index[capability].append(codec)
+        self._selections.clear()
+
+    def get(self, codec_name, default=None):
+        """Returns the Codec named codec_name, e.g. h264"""
+        return self._codecs.get(codec_name, default)
+
+    def select(self, *capabilities):
+        """Returns a tuple with the codecs which have all
+        the capabilities, e.g. select('audio', 'encoding');
+        raises KeyError for an unknown capability"""
+        key = frozenset(capabilities)
+        selection = self._selections.get(key)
+        if selection is None:
+            if not key:
+                selection = tuple(self._codecs.values())
+            else:
+                mask = 0
+                for capability in key:
+                    mask |= self.capabilities[capability]
+                first = min(key, key=lambda c: len(self._index[c]))
+                selection = tuple(codec for codec in self._index[first]
+                                  if codec.flags & mask == mask)
+            self._selections[key] = selection
+
+        return selection
 
 
 class Subtitle(object):
@@ -407,16 +1009,6 @@ class Subtitle(object):
         pass
 
 
-class Encoder(object):
-    encoder_attr = []
-
-    def __init__(self):
-        pass
-
-    def parse_encoder(self):
-        pass
-
-
 # the following class should be used to raise
 # an error when looking for an executable which
 # is missing; a binary build that doesn't exist
@@ -484,70 +1076,84 @@ class BasicParser(object):
         self.stdout_read = False  # normal output goes
         # self.parse_output()     # to stdout
         self.status_finished = None  # child process status
+        self.returncode = None  # exit code of child process
+        self.verbose = True  # print the output on console
+        self.progress_interval = 0.0  # seconds between progress records
 
     # the following method reads output from the opened
     # subprocess which is passed in the __init__; reads
     # output from self.child_p, a subprocess.Popen object
-    # FIXME find a better way to check the status of child_p
     def get_live_output(self):
         """Get live output from the opened
         subprocess.Popen object, reads chunk by chunk."""
-        line = ''  # an empty line of ffmpeg output .e.g.
-        new_lines = ['\n', '\r\n', '\r']  # help to find the end of line
         # base parsing is going to be the same
-        # for any kind of executable, read data
-        # chunk by chunk, append it to line, yield line,
-        # reset line and so on until the whole data is read
-
-        # the following while loop generates a python generator
-        # it helps to read the ffmpeg output in live mode
-        while True:  # we need a while True condition in here
-            # when there is predicted that there is no error
-            # in the output, it is redirected to stdout
-            # instead of stderr where live ffmpeg output goes
-            if self.stdout_read:  # read from stdout
-                chunk = self.child_p.stdout.read(1)
-            else:  # read from stderr
-                chunk = self.child_p.stderr.read(1)
-            # pdb.set_trace()
-            if chunk == '' and self.child_p.poll() is not None:
-                self.status_finished = True
-                break  # break the while True loop
-            #  pdb.set_trace()
-            line += chunk  # build the line chunk by chunk
-            if chunk in new_lines:  # line finished, yield line
-                yield line  # generate a line
-                line = ''  # reset line to empty string, start over
-
-    def parse_output(self):  # parses live output, checks for errors
+        # for any kind of executable; when there is
+        # predicted that there is no error in the output,
+        # it is redirected to stdout instead of stderr
+        # where live ffmpeg output goes
+        if self.stdout_read:  # read from stdout
+            stream = self.child_p.stdout
+        else:  # read from stderr
+            stream = self.child_p.stderr
+
+        # utils.iter_lines reads big chunks from the pipe and
+        # stops at the end of file, the child process has then
+        # closed its output so we only wait for its exit status
+        for line in iter_lines(stream):
+            yield line
+        self.returncode = self.child_p.wait()
+        self.status_finished = True
+
+    def parse_output(self, progress=None):  # parses live output
         # depending on the output of which tool
         # we are parsing we need to return the
         # specific objects, e.g MediaInfo objects
-        # for the output which comes from ffprobe
-        # parse_output at the moment just prints to
-        # stdout raw output, does not process it at all
-        arguments = []  # store arguments for the error class
-
-        for line in self.get_live_output():  # iterate through live output
-            #  pdb.set_trace()
-            print(line)  # prints line on console
-            # pdb.set_trace()
-            for error in self.errors:  # iterate errors of the specific parser
-                if error.error_matches(line):  # if error matches, process it
-                    arguments.append(error.name)  # append the name argument
-                    # TODO get the args from the line with a regex
-                    # arguments = ['Failed to select codec', 'h264', 'mp4']
-                    # _arguments = error.arguments
-                    for argument in error.arguments:
-                        match_obj = re.search(argument, line)
-                        if match_obj is not None:
-                            arguments.append(match_obj.group())
-                    # pdb.set_trace()
-                    raise error.error_class(*arguments)  # raise the error in here
-
-        #  should we catch and raise the ffmpeg errors in here?
-        #  if line.startswith('Automatic encoder selection failed'):
-        #        raise EncoderSelectionFailed('Encoder selection failed', 'h264', 'mp4')
+        # for the output which comes from ffprobe;
+        # progress is a callable which gets every
+        # ffmpeg.progress.Progress record
+        for record in self.iter_progress():
+            if progress is not None:
+                progress(record)
+
+    def iter_progress(self):
+        """Parses the live output, checks it for errors
+        and yields the ffmpeg.progress.Progress records
+        which ffmpeg writes when run with -progress."""
+        progress_parser = ProgressParser(self.progress_interval)
+        error_matcher = self.error_matcher()
+        try:
+            for line in self.get_live_output():  # iterate through live output
+                # key=value lines of -progress are not printed,
+                # they are collected into Progress records
+                if progress_parser.feed(line):
+                    record = progress_parser.take()
+                    if record is not None:
+                        yield record
+                    continue
+                if self.verbose:
+                    print(line)  # prints line on console
+                # all the errors of the parser are searched
+                # with one compiled regular expression
+                error = error_matcher.search(line)
+                if error is not None:
+                    raise error  # raise the error in here
+        finally:
+            # the caller stopped reading or an error was raised,
+            # do not leave the child process running on its own
+            if self.child_p.poll() is None:
+                self.child_p.terminate()
+                self.child_p.wait()
+
+    @classmethod
+    def error_matcher(cls):
+        """Returns the ErrorMatcher for the errors
+        of the parser class, built once per class."""
+        matcher = cls.__dict__.get('_error_matcher')
+        if matcher is None or matcher.errors is not cls.errors:
+            matcher = ErrorMatcher(cls.errors)
+            cls._error_matcher = matcher
+
+        return matcher
 
     def parse_filters(self):
         pass
@@ -616,6 +1222,14 @@ class Base(object):
     # variable to be override by subclass
     exec_name = None  # exec_name = 'ffmpeg'
     parser = None  # class object to parse data
+    # registry.CapabilityRegistry shared by all the instances,
+    # keeps the codecs, filters, ... of each build on disk;
+    # Base.registry = None reads them from ffmpeg every time
+    registry = CapabilityRegistry()
+    # resolver.ExecutableResolver shared by all the instances, finds
+    # ffmpeg, ffprobe, ... once per process; Base.resolver.pin(path)
+    # takes all of them from the install directory path
+    resolver = ExecutableResolver()
 
     def __init__(self, executable=None,
                  verbose=True):
@@ -639,51 +1253,38 @@ class Base(object):
         self._muxers = []
         self._devices = []  # list to store Device obj
         self._codecs = []  # list to store Codec obj
+        self._codec_catalog = None  # CodecCatalog of self._codecs
         self._version = None  # version of exec
         self._colors = []  # colors supported by ffmpeg
         self._layouts = {}  # layouts supported by ffmpeg
         # if verbose is set to true, print to stdout
         self.verbose = verbose  # we need to keep state
         self.cmds = []  # list to store default commands
-        split_by = ':'  # default split for unix PATH
-        # if system runs windows exec_name should be
-        # with .exe at the end for which(name) to locate it
-        # in the PATH windows environment variable
-        if os.name == 'nt':  # in Windows paths are separated
-            split_by = ';'   # by a ; instead of a : like nix
-
-        # the following function checks for an executable inside
-        # the directories of the $PATH environmental variable
-        def which_name(name):
-            # get the PATH environment variable, which is str
-            path = os.getenv('PATH', os.defpath)
-            for d in path.split(split_by):
-                f_path = os.path.join(d, name)
-                if os.path.exists(f_path) and os.access(f_path, os.X_OK):
-                    return f_path
-            return None  # python None by def, makes code readable
 
         # if executable is not provided in __init__
         if executable is None:
             executable = self.exec_name  # set executable to global exec_name
-        # pdb.set_trace()
 
-        # this condition returns always True? shitty hack?
         # if the path stored in executable is not a unix or a windows path
-        # then we make use of which_name tool to automatically look for the
-        # path of the executable within the deafult PATH of the current os
-        if '/' not in executable and '\\' not in executable:  # \\ windows path
-            executable = which_name(self.exec_name) or executable
+        # then the resolver looks for the executable within the directories
+        # of the PATH of the current os, or of the pinned install directory;
+        # the path it finds is kept for all the instances
+        resolved = '/' not in executable and '\\' not in executable  # \\ windows
+        if resolved:
+            name = executable
+            executable = self.resolver.resolve(name) or name
 
-        # pdb.set_trace()
         self.executable = executable  # setup the executable as instance var
-        # pdb.set_trace()
         self.cmds = [self.executable, ]  # why keep track of cmds here?
 
         # what arguments should the following class call take,
         # self and message; we raise an ExecutableDoesNotExistError in here
         # to inform the user that the executable is not available in the os
         if not os.path.exists(self.executable):
+            if resolved:
+                # the executable was removed since it was found,
+                # the next instance looks for it again
+                self.resolver.forget(name)
             raise ExecutableDoesNotExistError(self.executable)
 
     # private method to spawn a child process, we need
@@ -732,29 +1333,13 @@ class Base(object):
         """Method to read live output
         from the opened subprocess and
         yield it; python generator."""
-        line = ''  # create an empty line
-        # define new line chars to find end
-        # of line so we can reset line variable
-        # and yield the line for print to stdout
-        new_lines = ['\n', '\r\n', '\r']  # end of line
-        while True:
-            # read data chunk by chunk from stderr
-            chunk = open_p.stderr.read(1)
-            # if there is no chunk to read and
-            # open_p.poll() is not None then yield True
-            # and break the while loop, finished.
-            # shitty hack to find out if reading data is
-            # finished, look for a more cool way to do it.
-            if chunk == '' and open_p.poll() is not None:
-                yield 'True'  # finished reading data
-                break
-
-            # populate the line with chunks and
-            # yield it
-            line += chunk
-            if chunk in new_lines:
-                yield line
-                line = ''  # set line to empty
+        # read data chunk by chunk from stderr with the
+        # same line reader the parsers use, once the end
+        # of file is reached yield True, finished.
+        for line in iter_lines(open_p.stderr):
+            yield line
+        open_p.wait()
+        yield 'True'  # finished reading data
 
     def _check_status(self, open_p):
         """Method to check status of a child
@@ -775,94 +1360,95 @@ class Base(object):
             if 'True' in line:
                 return True
 
+    # the listings are read through the registry, which
+    # spawns the executable only for the listings it does
+    # not know yet, see registry.CapabilityRegistry
+    def _listing(self, listing):
+        if self.registry is None:
+            cmds, parse = LISTINGS[listing]
+            return parse(self._listing_output(cmds))
+
+        return self.registry.get(self.executable, listing,
+                                 self._listing_output)
+
+    def _listing_output(self, cmds):
+        child_p = self._spawn(cmds)
+        _parser = self.parser(child_p)
+        _parser.stdout_read = True  # listings go to stdout
+
+        return ''.join(_parser.get_live_output())
+
 # shared options among the ff* tools
     @property
     def version(self):
         """Method to show version of the program
         executable in use."""
         if self._version is None:
-            child_p = self._spawn()  # spawn process
-            # pdb.set_trace()
-            # parsing should be done in self.parser object
-            _parser = self.parser(child_p)
-            # pdb.set_trace()
-            version = _parser.parse_version()
-            # change the state of the _version
-            self._version = version
+            self._version = self._listing('version')
 
         return self._version  # return object._version
 
-    @property  # TODO
+    @property
     def filters(self):
         """Method which is used to list
         filters in ffmpeg multimedia
         framework"""
-        cmds = ['-filters']
-        child_p = self._spawn(cmds)
-        _parser = self.parser(child_p)
-        _parser.stdout_read = True
-        _parser.parse_output()
+        if not len(self._filters):
+            for features, name, inputs, outputs, desc in \
+                    self._listing('filters'):
+                _filter = Filter()
+                _filter.parse_filter(features, name, inputs,
+                                     outputs, desc)
+                self._filters.append(_filter)
+
+        return self._filters
 
-    @property  # TODO
+    @property
     def encoders(self):
-        cmds = ['-encoders']
-        child_p = self._spawn(cmds)
-        _parser = self.parser(child_p)
-        _parser.stdout_read = True
-        _parser.parse_output()
+        if not len(self._encoders):
+            for features, name, desc in self._listing('encoders'):
+                encoder = Encoder()
+                encoder.parse_encoder(features, name, desc)
+                self._encoders.append(encoder)
+
+        return self._encoders
 
-    @property  # TODO
+    @property
     def decoders(self):
-        cmds = ['-decoders']
-        child_p = self._spawn(cmds)
-        _parser = self.parser(child_p)
-        _parser.stdout_read = True
-        _parser.parse_output()
+        if not len(self._decoders):
+            for features, name, desc in self._listing('decoders'):
+                decoder = Decoder()
+                decoder.parse_decoder(features, name, desc)
+                self._decoders.append(decoder)
+
+        return self._decoders
 
-    @property  # TODO
-    def layouts(self):  # special parsing
+    @property
+    def layouts(self):
+        """Standard channel layouts by name,
+        e.g. self.layouts['stereo']"""
         if not len(self._layouts):
-            cmds = ['-layouts']
-            child_p = self._spawn(cmds)
-            _parser = self.parser(child_p)
-            _parser.stdout_read = True
-            _parser.parse_output()
+            for name, channels, descriptions in self._listing('layouts'):
+                self._layouts[name] = Layout(name, channels,
+                                             descriptions)
 
-        # return self._layouts
+        return self._layouts
 
-    # FIXME return a list with dicts [{'Blue': '0000ff'}]
-    @property  # FIXME output goes to stdout
+    @property
     def colors(self):
         """Method which is used to list
         all the colors available in the
         ffmpeg multimedia framework."""
-        # {'AliceBlue': 'f0f8ff'}
         if not len(self._colors):
-            cmds = ['-colors']
-            child_p = self._spawn(cmds)
-            _parser = self.parser(child_p)
-            _parser.stdout_read = True
-            # pdb.set_trace()
-            for color in _parser.parse_blocks():
-                color_dict = {color[0]: color[1]}
-                self._colors.append(color_dict)
-        # we need to return colors in some
-        # dictionary in here self._colors
+            for name, value in self._listing('colors'):
+                self._colors.append(Color(name, value))
+
         return self._colors
 
     @property
     def codecs(self):
-        unproc_lines = 10  # ignore the first 10 lines
         if not len(self._codecs):
-            cmds = ['-codecs']  # spawn a process
-            child_p = self._spawn(cmds)
-            _parser = self.parser(child_p)
-            _parser.stdout_read = True
-            for block in _parser.parse_blocks(
-                    sep_by=2,
-                    unproc_lines=unproc_lines):
-                # pdb.set_trace()
-                features, codec_name, desc = block
+            for features, codec_name, desc in self._listing('codecs'):
                 codec = Codec()
                 codec.parse_codec(
                     features, codec_name, desc
@@ -871,18 +1457,20 @@ class Base(object):
 
         return self._codecs
 
-    @property  # TODO
+    @property
+    def codec_catalog(self):
+        """CodecCatalog with the codecs of
+        this build, indexed by name and by
+        capability"""
+        if self._codec_catalog is None:
+            self._codec_catalog = CodecCatalog(self.codecs)
+
+        return self._codec_catalog
+
+    @property
     def devices(self):
-        unproc_lines = 4  # lines to be skipped
         if not len(self._devices):
-            cmds = ['-devices']
-            child_p = self._spawn(cmds)  # spawns child process
-            _parser = self.parser(child_p)
-            _parser.stdout_read = True  # output goes to stdout
-            for block in _parser.parse_blocks(
-                    sep_by=2,
-                    unproc_lines=unproc_lines):
-                features, device_name, desc = block
+            for features, device_name, desc in self._listing('devices'):
                 device = Device()
                 device.parse_device(features, device_name, desc)
 
@@ -890,10 +1478,12 @@ class Base(object):
 
         return self._devices  # return the devices in the list
 
-    @property  # TODO
+    @property
     def muxers(self):
-        cmds = ['-muxers']
-        child_p = self._spawn(cmds)
-        _parser = self.parser(child_p)
-        _parser.stdout_read = True
-        _parser.parse_output()
+        if not len(self._muxers):
+            for features, name, desc in self._listing('muxers'):
+                muxer = Muxer()
+                muxer.parse_muxer(features, name, desc)
+                self._muxers.append(muxer)
+
+        return self._muxers
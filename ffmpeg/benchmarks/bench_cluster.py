@@ -0,0 +1,89 @@
+"""Scaling of SegmentCoordinator.convert_video with the number
+of workers: the same video is converted with 1, 2, 4, ...
+SegmentWorker processes started on this machine, each with
+-threads 1 so one worker uses about one core.
+
+    python bench_cluster.py [minutes] [max workers]
+
+ffmpeg and ffprobe have to be in the PATH; the source is made
+from the testsrc2 and sine sources of lavfi, 1280x720 with a
+keyframe every 2 seconds and aac, 2 minutes by default, and
+is converted to libx264 -preset veryfast and aac, with the
+segments sent to the workers. The workers run on the cores of
+this machine, so the scaling stops with them, max workers is
+the number of cores by default.
+"""
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from subprocess import Popen, PIPE
+
+# go to the root of the repository, the ffmpeg package is there
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..'))
+
+from ffmpeg.cluster import SegmentCoordinator
+from ffmpeg.scheduler import available_cpus
+
+CLUSTER = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..',
+                       'cluster.py')
+
+
+def make_video(path, minutes):
+    seconds = minutes * 60
+    p = Popen(['ffmpeg', '-v', 'error', '-y', '-f', 'lavfi', '-i',
+               'testsrc2=size=1280x720:rate=25:duration=%d' % seconds,
+               '-f', 'lavfi', '-i', 'sine=duration=%d' % seconds,
+               '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '50',
+               '-c:a', 'aac', path], stdout=PIPE, stderr=PIPE)
+    p.communicate()
+
+
+def convert(path, output, count):
+    with SegmentCoordinator() as coordinator:
+        address = '%s:%d' % coordinator.address
+        workers = [subprocess.Popen([sys.executable, CLUSTER, address,
+                                     '--threads', '1'])
+                   for _ in range(count)]
+        try:
+            coordinator.wait_for_workers(count)
+            start = time.time()
+            coordinator.convert_video(path, output, overwrite=True,
+                                      vcodec='libx264', acodec='aac',
+                                      options=['-preset', 'veryfast'])
+            elapsed = time.time() - start
+        finally:
+            coordinator.close()
+            for worker in workers:
+                worker.wait()
+
+    return elapsed
+
+
+def run(minutes, max_workers):
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'source.mp4')
+        make_video(path, minutes)
+        output = os.path.join(directory, 'output.mp4')
+        print('%d minutes of 1280x720, %d cores' % (minutes,
+                                                    available_cpus()))
+        count = 1
+        first = None
+        while count <= max_workers:
+            elapsed = convert(path, output, count)
+            first = first or elapsed
+            print('  %2d workers %8.1f s  speedup %5.2fx  %3.0f%% of linear'
+                  % (count, elapsed, first / elapsed,
+                     100.0 * first / elapsed / count))
+            count *= 2
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 2,
+        int(sys.argv[2]) if len(sys.argv) > 2 else available_cpus())
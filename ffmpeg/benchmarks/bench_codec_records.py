@@ -0,0 +1,113 @@
+"""Memory and parse time of the Codec records built from
+a full ffmpeg -codecs listing, against the dict based Codec
+of the earlier versions (copied below as LegacyCodec).
+
+    python bench_codec_records.py [catalogues]
+
+ffmpeg has to be in the PATH; catalogues is the number of
+listings held at once, e.g. of several builds, 10 by default.
+"""
+import os
+import sys
+import time
+import tracemalloc
+from subprocess import Popen, PIPE
+
+# go to the root of the repository, the ffmpeg package is there
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..'))
+
+from ffmpeg.base import Codec
+from ffmpeg.registry import parse_features
+
+
+class LegacyCodec(object):
+    # Codec before it was a __slots__ record, two dicts
+    # and eight private attributes per codec
+
+    def __init__(self):
+        self._codec_type = {}
+        self._codec_info = {}
+        self._video_support = False
+        self._audio_support = False
+        self._subtitle_support = False
+        self._encoding_support = False
+        self._decoding_support = False
+        self._intraframe_only = False
+        self._compression_type = None
+        self.codec_name = None
+        self.codec_desc = None
+
+    def parse_codec(self, features, codec_name, codec_desc):
+        codec_type_map = {'A': 'audio', 'V': 'video', 'S': 'subtitle',
+                          'D': 'data', 'T': 'attachment'}
+        codec_map = {'D': {'decoding': True}, 'E': {'encoding': True},
+                     'I': {'intraframe_only': True},
+                     'L': {'lossy': True}, 'S': {'lossless': True}}
+        for el in features:
+            if features.index(el) == 2:
+                self._codec_type = codec_type_map.get(el)
+                continue
+            codec_map_el = codec_map.get(el)
+            if codec_map_el is not None:
+                self._codec_info.update(codec_map_el)
+        self.codec_name = codec_name
+        self.codec_desc = codec_desc
+
+        return self._codec_info
+
+
+def codec_rows():
+    p = Popen(['ffmpeg', '-hide_banner', '-codecs'], stdout=PIPE,
+              stderr=PIPE, stdin=PIPE)
+    stdout, _ = p.communicate()
+
+    return parse_features(stdout.decode('utf-8', 'replace'), 6)
+
+
+def build(codec_class, rows):
+    codecs = []
+    for features, name, desc in rows:
+        codec = codec_class()
+        codec.parse_codec(features, name, desc)
+        codecs.append(codec)
+
+    return codecs
+
+
+def measure(codec_class, rows, catalogues):
+    build(codec_class, rows)  # warm up, e.g. the flags cache
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    held = [build(codec_class, rows) for _ in range(catalogues)]
+    size = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    del held
+
+    loops = 50
+    start = time.time()
+    for _ in range(loops):
+        build(codec_class, rows)
+    parse_time = (time.time() - start) / loops
+
+    return size, parse_time
+
+
+def run(catalogues):
+    rows = codec_rows()
+    print('%d codecs, %d catalogues held' % (len(rows), catalogues))
+    results = []
+    for name, codec_class in [('dict Codec', LegacyCodec),
+                              ('__slots__ Codec', Codec)]:
+        size, parse_time = measure(codec_class, rows, catalogues)
+        results.append((size, parse_time))
+        print('  %-16s %8.1f KiB  %6.0f bytes/codec  %6.2f ms/listing' % (
+            name, size / 1024.0, float(size) / (len(rows) * catalogues),
+            parse_time * 1000))
+    (old_size, old_time), (new_size, new_time) = results
+    print('  memory %.1fx smaller, parsing %.1fx faster' % (
+        float(old_size) / new_size, old_time / new_time))
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
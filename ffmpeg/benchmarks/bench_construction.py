@@ -0,0 +1,59 @@
+"""Time to construct the wrappers in a tight loop, e.g. the
+BasicFFProbe objects built by the helpers of VideoFFMpeg,
+with the executables found once per process against a
+search of PATH on every construction as before.
+
+    python bench_construction.py [loops] [extra PATH entries]
+
+ffmpeg and ffprobe have to be in the PATH; the extra
+entries, 0 by default, are put in front of PATH like the
+directories of a virtualenv, a shell profile, ...
+"""
+import os
+import sys
+import tempfile
+import time
+
+# go to the root of the repository, the ffmpeg package is there
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..'))
+
+from ffmpeg.base import Base
+from ffmpeg.ffprobe import BasicFFProbe
+from ffmpeg.video import VideoFFMpeg
+
+
+def construct(classes, loops, clear):
+    start = time.time()
+    for _ in range(loops):
+        for wrapper_class in classes:
+            if clear:  # the search of PATH which was done before
+                Base.resolver.clear()
+            wrapper_class()
+
+    return (time.time() - start) / (loops * len(classes))
+
+
+def run(loops, extra):
+    directories = [tempfile.mkdtemp() for _ in range(extra)]
+    os.environ['PATH'] = os.pathsep.join(
+        directories + [os.environ.get('PATH', os.defpath)])
+    entries = len(os.environ['PATH'].split(os.pathsep))
+    classes = [VideoFFMpeg, BasicFFProbe]
+    construct(classes, 10, False)  # warm up
+    print('%d constructions of %s, %d PATH entries' % (
+        loops * len(classes), ', '.join(c.__name__ for c in classes),
+        entries))
+    searched = construct(classes, loops, True)
+    resolved = construct(classes, loops, False)
+    for name, seconds in [('PATH searched', searched),
+                          ('resolved once', resolved)]:
+        print('  %-14s %8.2f us/construction' % (name, seconds * 1e6))
+    print('  %.1fx faster' % (searched / resolved))
+    for directory in directories:
+        os.rmdir(directory)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 0)
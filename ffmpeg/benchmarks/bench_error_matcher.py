@@ -0,0 +1,89 @@
+"""Micro benchmark of the error checks done on every line
+of ffmpeg output; compares the compiled ErrorMatcher of
+VideoFFMpegParser with checking its errors one by one, on
+the log of a clean transcode which contains no errors.
+
+    python bench_error_matcher.py [recorded_log]
+"""
+import os
+import re
+import sys
+import time
+
+# go to the root of the repository, the ffmpeg package is there
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..'))
+
+from ffmpeg.utils import iter_lines
+from ffmpeg.video import VideoFFMpegParser
+
+HEADER = """ffmpeg version 3.2 Copyright (c) 2000-2016 the FFmpeg developers
+  built with Apple LLVM version 8.0.0 (clang-800.0.42.1)
+  configuration: --prefix=/usr/local/Cellar/ffmpeg/3.2 --enable-shared --enable-pthreads --enable-gpl --enable-version3 --enable-hardcoded-tables --enable-avresample --cc=clang --host-cflags= --host-ldflags= --enable-libmp3lame --enable-libx264 --enable-libxvid --enable-opencl --disable-lzma --enable-vda
+  libavutil      55. 34.100 / 55. 34.100
+  libavcodec     57. 64.100 / 57. 64.100
+  libavformat    57. 56.100 / 57. 56.100
+Input #0, mov,mp4,m4a,3gp,3g2,mj2, from 'test.mp4':
+  Metadata:
+    major_brand     : mp42
+    encoder         : HandBrake 0.10.2 2015061100
+  Duration: 00:04:53.63, start: 0.000000, bitrate: 1452 kb/s
+    Stream #0:0(und): Video: h264 (Main) (avc1 / 0x31637661), yuv420p(tv, bt709), 1280x720 [SAR 1:1 DAR 16:9], 1317 kb/s, 23.98 fps, 23.98 tbr, 90k tbn, 47.95 tbc (default)
+    Stream #0:1(und): Audio: aac (LC) (mp4a / 0x6134706D), 48000 Hz, stereo, fltp, 128 kb/s (default)
+Output #0, flv, to 'test.flv':
+Stream mapping:
+  Stream #0:0 -> #0:0 (h264 (native) -> flv1 (flv))
+  Stream #0:1 -> #0:1 (aac (native) -> mp3 (libmp3lame))
+Press [q] to stop, [?] for help
+"""
+
+
+def generate_log(frames):
+    lines = HEADER.splitlines(True)
+    for frame in range(1, frames):
+        lines.append('frame=%5d fps=120 q=31.0 size=%8dkB '
+                     'time=00:%02d:%05.2f bitrate=1452.7kbits/s '
+                     'speed=4.98x    \r' % (frame, frame * 3,
+                                           frame / 1440 % 60,
+                                           frame / 24.0 % 60))
+    lines.append('video:52116kB audio:4589kB subtitle:0kB '
+                 'other streams:0kB global headers:0kB '
+                 'muxing overhead: 0.581521%\n')
+
+    return lines
+
+
+# what parse_output did before: every error of the
+# parser is checked on its own for every line
+def check_one_by_one(lines, errors):
+    for line in lines:
+        for error in errors:
+            if re.search(error.pattern, line):
+                raise Exception(line)
+
+
+def check_compiled(lines, matcher):
+    for line in lines:
+        if matcher.search(line) is not None:
+            raise Exception(line)
+
+
+def run(lines):
+    errors = VideoFFMpegParser.errors
+    matcher = VideoFFMpegParser.error_matcher()
+    print('%d lines, %d errors in VideoFFMpegParser' % (len(lines),
+                                                        len(errors)))
+    for name, check, arg in [('one by one', check_one_by_one, errors),
+                             ('ErrorMatcher', check_compiled, matcher)]:
+        start = time.time()
+        check(lines, arg)
+        elapsed = time.time() - start
+        print('  %-14s %10.0f lines/s' % (name, len(lines) / elapsed))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        with open(sys.argv[1], 'rb') as log:
+            run(list(iter_lines(log)))
+    else:
+        run(generate_log(200000))
@@ -0,0 +1,86 @@
+"""Time to extract thumbnails at many timestamps of a video:
+one ffmpeg per image, with -ss after -i as extract_image did
+and with -ss before -i, against VideoFFMpeg.extract_images,
+one ffmpeg for all of them, seeking to each timestamp or
+decoding once from the first to the last.
+
+    python bench_extract_images.py [images] [minutes]
+
+ffmpeg and ffprobe have to be in the PATH; the video is made
+from the testsrc2 source of lavfi, 640x360 h264 with a
+keyframe every 2 seconds, 2 minutes long by default, and
+the 24 images by default are spread over all of it.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from subprocess import Popen, PIPE
+
+# go to the root of the repository, the ffmpeg package is there
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..'))
+
+from ffmpeg.video import VideoFFMpeg
+
+
+def make_video(path, minutes):
+    p = Popen(['ffmpeg', '-v', 'error', '-y', '-f', 'lavfi', '-i',
+               'testsrc2=size=640x360:rate=25:duration=%d' % (minutes * 60),
+               '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '50',
+               '-pix_fmt', 'yuv420p', path], stdout=PIPE, stderr=PIPE)
+    p.communicate()
+
+
+def one_process_each(path, timestamps, directory, input_seek):
+    for i, t in enumerate(timestamps):
+        output = os.path.join(directory, '%03d.png' % i)
+        if input_seek:
+            cmds = ['-ss', str(t), '-i', path]
+        else:  # the way of extract_image before
+            cmds = ['-i', path, '-ss', str(t)]
+        p = Popen(['ffmpeg', '-v', 'error', '-y'] + cmds +
+                  ['-vframes', '1', output], stdout=PIPE, stderr=PIPE)
+        p.communicate()
+
+
+def one_process(path, timestamps, directory, dense):
+    VideoFFMpeg(verbose=False).extract_images(
+        path, timestamps, os.path.join(directory, '%03d.png'), dense=dense)
+
+
+def run(images, minutes):
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'video.mp4')
+        make_video(path, minutes)
+        step = minutes * 60.0 / images
+        timestamps = [round(step * (i + 0.5), 2) for i in range(images)]
+        print('%d images of a %d minutes video' % (images, minutes))
+        results = []
+        for name, extract in [
+                ('a process each, -ss after -i',
+                 lambda d: one_process_each(path, timestamps, d, False)),
+                ('a process each, -ss before -i',
+                 lambda d: one_process_each(path, timestamps, d, True)),
+                ('extract_images, seeks',
+                 lambda d: one_process(path, timestamps, d, False)),
+                ('extract_images, one decoder',
+                 lambda d: one_process(path, timestamps, d, True))]:
+            output_dir = tempfile.mkdtemp(dir=directory)
+            start = time.time()
+            extract(output_dir)
+            elapsed = time.time() - start
+            results.append(elapsed)
+            print('  %-32s %7.2f s  %6.1f images/s' % (
+                name, elapsed, images / elapsed))
+        print('  extract_images %.1fx faster than a process each'
+              % (results[1] / min(results[2:])))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 24,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 2)
@@ -0,0 +1,131 @@
+"""Benchmark of the json backend of BasicFFProbe.probe
+against the default (text) output of ffprobe.
+
+Parse CPU is measured on generated ffprobe output with
+many streams and chapters; probe latency is measured with
+the real ffprobe when media files are given.
+
+    python bench_ffprobe_json.py [media_file ...]
+"""
+import json
+import os
+import sys
+import time
+from io import BytesIO
+
+# go to the root of the repository, the ffmpeg package is there
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..'))
+
+from ffmpeg.base import MediaInfo
+from ffmpeg.ffprobe import BasicFFProbe
+from ffmpeg.utils import iter_lines
+
+STREAM = {'codec_name': 'aac', 'codec_long_name': 'AAC (Advanced Audio Coding)',
+          'profile': 'LC', 'codec_type': 'audio', 'codec_tag_string': 'mp4a',
+          'codec_tag': '0x6134706d', 'sample_fmt': 'fltp',
+          'sample_rate': '48000', 'channels': 2, 'channel_layout': 'stereo',
+          'bits_per_sample': 0, 'r_frame_rate': '0/0',
+          'avg_frame_rate': '0/0', 'time_base': '1/48000', 'start_pts': 0,
+          'start_time': '0.000000', 'duration_ts': 14094336,
+          'duration': '293.632000', 'bit_rate': '128000', 'nb_frames': '13764',
+          'disposition': {'default': 1, 'dub': 0, 'original': 0,
+                          'comment': 0, 'lyrics': 0, 'karaoke': 0},
+          'tags': {'language': 'eng', 'handler_name': 'SoundHandler'}}
+CHAPTER = {'time_base': '1/1000', 'start': 0, 'start_time': '0.000000',
+           'end': 5000, 'end_time': '5.000000', 'tags': {'title': 'Chapter'}}
+FORMAT = {'filename': 'test.mkv', 'nb_streams': 0, 'nb_programs': 0,
+          'format_name': 'matroska,webm', 'format_long_name': 'Matroska / WebM',
+          'start_time': '0.000000', 'duration': '293.632000',
+          'size': '53318712', 'bit_rate': '1452696', 'probe_score': 100,
+          'tags': {'title': 'Title with = sign', 'encoder': 'Lavf57.56.100'}}
+
+
+# builds the output of ffprobe for the same media
+# in the json and in the default output format
+def generate_output(streams, chapters):
+    data = {'streams': [], 'chapters': [], 'format': dict(FORMAT)}
+    text = []
+    for index in range(streams):
+        stream = dict(STREAM, index=index)
+        data['streams'].append(stream)
+        text.append(section('STREAM', stream))
+    for index in range(chapters):
+        chapter = dict(CHAPTER, id=index)
+        data['chapters'].append(chapter)
+        text.append(section('CHAPTER', chapter))
+    data['format']['nb_streams'] = streams
+    text.append(section('FORMAT', data['format']))
+
+    return (json.dumps(data, indent=4).encode('utf-8'),
+            ''.join(text).encode('utf-8'))
+
+
+def section(name, values):
+    lines = ['[%s]\n' % name]
+    for key, value in values.items():
+        if key == 'tags':
+            lines.extend('TAG:%s=%s\n' % item for item in value.items())
+        elif key == 'disposition':
+            lines.extend('DISPOSITION:%s=%s\n' % item
+                         for item in value.items())
+        else:
+            lines.append('%s=%s\n' % (key, value))
+    lines.append('[/%s]\n' % name)
+
+    return ''.join(lines)
+
+
+def parse_text(output):
+    media_info = MediaInfo()
+    for line in iter_lines(BytesIO(output)):
+        media_info.parse_ffprobe(line)
+
+    return media_info
+
+
+def parse_json(output):
+    media_info = MediaInfo()
+    media_info.parse_ffprobe_json(json.loads(output.decode('utf-8')))
+
+    return media_info
+
+
+def cpu_time(func, arg, repeat):
+    start = time.process_time()
+    for _ in range(repeat):
+        func(arg)
+
+    return (time.process_time() - start) / repeat
+
+
+def bench_parse():
+    print('parse CPU per probe')
+    for streams, chapters in [(2, 0), (32, 100), (256, 1000)]:
+        json_output, text_output = generate_output(streams, chapters)
+        repeat = max(1, 2000 // (streams + chapters))
+        text_time = cpu_time(parse_text, text_output, repeat)
+        json_time = cpu_time(parse_json, json_output, repeat)
+        print('  %4d streams %5d chapters  text %8.2f ms  json %8.2f ms'
+              '  %.1fx' % (streams, chapters, text_time * 1000,
+                           json_time * 1000, text_time / json_time))
+
+
+def bench_probe(paths, repeat=20):
+    print('probe latency with %s' % BasicFFProbe().executable)
+    for path in paths:
+        for print_format in ['default', 'json']:
+            probe = BasicFFProbe()
+            probe.print_format = print_format
+            start = time.time()
+            for _ in range(repeat):
+                probe.probe(path)
+            print('  %-24s %-8s %8.2f ms' % (
+                os.path.basename(path), print_format,
+                (time.time() - start) / repeat * 1000))
+
+
+if __name__ == '__main__':
+    bench_parse()
+    if len(sys.argv) > 1:
+        bench_probe(sys.argv[1:])
@@ -0,0 +1,90 @@
+"""Frames per second read from ffmpeg into numpy by
+VideoFFMpeg.iter_frames, which reads into a ring of
+arrays allocated once, against reading a bytes object
+per frame and copying it into a new array.
+
+    python bench_iter_frames.py [seconds] [size]
+
+ffmpeg and ffprobe have to be in the PATH; the video is
+made from the testsrc2 source of lavfi, 10 seconds of
+1280x720 by default, e.g. 1920x1080 for bigger frames.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from subprocess import Popen, PIPE
+
+# go to the root of the repository, the ffmpeg package is there
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..'))
+
+import numpy
+
+from ffmpeg.video import VideoFFMpeg
+
+
+def make_video(path, seconds, size):
+    # rawvideo in nut decodes at almost no cost, the
+    # time left is the one of reading the frames
+    p = Popen(['ffmpeg', '-v', 'error', '-y', '-f', 'lavfi', '-i',
+               'testsrc2=size=%s:rate=25:duration=%s' % (size, seconds),
+               '-c:v', 'rawvideo', '-pix_fmt', 'rgb24', path],
+              stdout=PIPE, stderr=PIPE)
+    p.communicate()
+
+
+def read_copies(path, width, height):
+    # the way before iter_frames, a new bytes object and
+    # a new array for each frame
+    v = VideoFFMpeg(verbose=False)
+    p = v._spawn(['-v', 'error', '-i', path, '-f', 'rawvideo',
+                  '-pix_fmt', 'rgb24', 'pipe:1'])
+    frame_size = width * height * 3
+    frames = 0
+    while True:
+        data = p.stdout.read(frame_size)
+        if len(data) < frame_size:
+            break
+        numpy.frombuffer(data, numpy.uint8).reshape(height, width, 3).copy()
+        frames += 1
+    p.wait()
+
+    return frames
+
+
+def read_ring(path):
+    frames = 0
+    for frame in VideoFFMpeg(verbose=False).iter_frames(path):
+        frames += 1
+
+    return frames
+
+
+def run(seconds, size):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'frames.nut')
+    try:
+        make_video(path, seconds, size)
+        width, height = [int(n) for n in size.split('x')]
+        print('%s frames of %s rgb24' % (seconds * 25, size))
+        results = []
+        for name, read in [('bytes per frame',
+                            lambda: read_copies(path, width, height)),
+                           ('iter_frames ring', lambda: read_ring(path))]:
+            start = time.time()
+            frames = read()
+            elapsed = time.time() - start
+            results.append(elapsed)
+            print('  %-18s %8.1f frames/s  %6.1f MB/s' % (
+                name, frames / elapsed,
+                frames * width * height * 3 / elapsed / 1e6))
+        print('  %.2fx faster' % (results[0] / results[1]))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 10,
+        sys.argv[2] if len(sys.argv) > 2 else '1280x720')
@@ -0,0 +1,82 @@
+"""Peak memory and time of decoding a long audio file into
+numpy: all of ffmpeg's output read at once and converted,
+against AudioFFMpeg.read_all, which reads into one array
+sized from the probe, and AudioFFMpeg.iter_samples, which
+reads into a ring of small arrays.
+
+    python bench_iter_samples.py [minutes]
+
+ffmpeg and ffprobe have to be in the PATH; the audio is a
+16 kHz mono wav made from the sine source of lavfi, 60
+minutes by default, decoded to float32.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from subprocess import Popen, PIPE
+
+# go to the root of the repository, the ffmpeg package is there
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..'))
+
+import numpy
+
+from ffmpeg.audio import AudioFFMpeg
+
+
+def make_audio(path, minutes):
+    p = Popen(['ffmpeg', '-v', 'error', '-y', '-f', 'lavfi', '-i',
+               'sine=frequency=440:sample_rate=16000:duration=%d' %
+               (minutes * 60), '-c:a', 'pcm_s16le', path],
+              stdout=PIPE, stderr=PIPE)
+    p.communicate()
+
+
+def read_output(path):
+    # all of the output in one bytes object, then an array
+    p = Popen(['ffmpeg', '-v', 'error', '-i', path, '-f', 'f32le',
+               '-acodec', 'pcm_f32le', 'pipe:1'], stdout=PIPE, stderr=PIPE)
+    stdout, _ = p.communicate()
+    samples = numpy.frombuffer(stdout, '<f4').reshape(-1, 1).copy()
+
+    return len(samples)
+
+
+def read_all(path):
+    return len(AudioFFMpeg(verbose=False).read_all(path))
+
+
+def iter_samples(path):
+    frames = 0
+    for block in AudioFFMpeg(verbose=False).iter_samples(path):
+        frames += len(block)
+
+    return frames
+
+
+def run(minutes):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'audio.wav')
+    try:
+        make_audio(path, minutes)
+        print('%d minutes of 16 kHz mono audio to float32' % minutes)
+        for name, read in [('whole output', read_output),
+                           ('read_all', read_all),
+                           ('iter_samples', iter_samples)]:
+            tracemalloc.start()
+            start = time.time()
+            frames = read(path)
+            elapsed = time.time() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            print('  %-14s %9d frames  %8.1f MiB peak  %6.2f s' % (
+                name, frames, peak / 1048576.0, elapsed))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 60)
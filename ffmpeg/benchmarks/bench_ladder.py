@@ -0,0 +1,91 @@
+"""CPU-seconds and wall-clock time of encoding an adaptive
+bitrate ladder, 720p, 480p, 360p and audio only, from a
+1080p source: one ffmpeg for each rendition, each decoding
+the source again, against VideoFFMpeg.encode_ladder, one
+ffmpeg which decodes it once for all of them.
+
+    python bench_ladder.py [seconds]
+
+ffmpeg and ffprobe have to be in the PATH; the source is made
+from the testsrc2 and sine sources of lavfi, 1920x1080 h264
+-preset medium with aac, 20 seconds by default, so decoding
+it is a fair part of the work; the renditions are libx264
+-preset veryfast. The CPU-seconds are the user and system
+time of the child processes.
+"""
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from subprocess import Popen, PIPE
+
+# go to the root of the repository, the ffmpeg package is there
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..'))
+
+from ffmpeg.video import VideoFFMpeg, Rendition
+
+
+def make_video(path, seconds):
+    p = Popen(['ffmpeg', '-v', 'error', '-y', '-f', 'lavfi', '-i',
+               'testsrc2=size=1920x1080:rate=25:duration=%d' % seconds,
+               '-f', 'lavfi', '-i', 'sine=duration=%d' % seconds,
+               '-c:v', 'libx264', '-preset', 'medium', '-c:a', 'aac', path],
+              stdout=PIPE, stderr=PIPE)
+    p.communicate()
+
+
+def ladder(directory):
+    options = ['-preset', 'veryfast']
+    return [Rendition(os.path.join(directory, '720.mp4'), 720, '3M',
+                      audio_bitrate='128k', options=options),
+            Rendition(os.path.join(directory, '480.mp4'), 480, '1500k',
+                      audio_bitrate='96k', options=options),
+            Rendition(os.path.join(directory, '360.mp4'), 360, '800k',
+                      audio_bitrate='64k', options=options),
+            Rendition(os.path.join(directory, 'audio.m4a'), video=False,
+                      audio_bitrate='128k')]
+
+
+def separate(v, path, directory):
+    for rendition in ladder(directory):
+        v.encode_ladder(path, [rendition])
+
+
+def one_process(v, path, directory):
+    v.encode_ladder(path, ladder(directory))
+
+
+def child_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def run(seconds):
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'source.mp4')
+        make_video(path, seconds)
+        v = VideoFFMpeg(verbose=False)
+        print('4 renditions of %d seconds of 1080p' % seconds)
+        results = []
+        for name, encode in [('a process each', separate),
+                             ('encode_ladder', one_process)]:
+            output_dir = tempfile.mkdtemp(dir=directory)
+            cpu = child_cpu()
+            start = time.time()
+            encode(v, path, output_dir)
+            elapsed = time.time() - start
+            cpu = child_cpu() - cpu
+            results.append(cpu)
+            print('  %-16s %7.1f CPU-s  %7.1f s' % (name, cpu, elapsed))
+        print('  %.0f%% fewer CPU-seconds' % (
+            100 * (1 - results[1] / results[0])))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 20)
@@ -0,0 +1,104 @@
+"""Benchmark of the chunked line reader against the old
+one byte reader of BasicParser.get_live_output. Runs on
+recorded ffmpeg/ffprobe output given on the command line,
+or on generated output of a few megabytes if none is given.
+
+    python bench_line_reader.py [recorded_output ...]
+"""
+import os
+import sys
+import tempfile
+import time
+from subprocess import Popen, PIPE
+
+# go to the root of the repository, the ffmpeg package is there
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..'))
+
+from ffmpeg.utils import iter_lines
+
+
+# the reader which was used before, adapted to bytes so
+# it stops at the end of file with python 3 pipes as well
+def one_byte_lines(stream):
+    line = b''
+    new_lines = [b'\n', b'\r\n', b'\r']
+    while True:
+        chunk = stream.read(1)
+        if chunk == b'':
+            break
+        line += chunk
+        if chunk in new_lines:
+            yield line.decode('utf-8', 'replace')
+            line = b''
+
+
+# stderr of a long transcode: banner followed by many
+# progress lines ended by \r, like ffmpeg prints them
+def generate_transcode_log(path, size):
+    with open(path, 'wb') as f:
+        f.write(b'ffmpeg version 3.2 Copyright (c) 2000-2016 '
+                b'the FFmpeg developers\n')
+        frame = 0
+        while f.tell() < size:
+            frame += 1
+            f.write(('frame=%5d fps= 25 q=28.0 size=%8dkB '
+                     'time=00:00:%05.2f bitrate=1452.7kbits/s '
+                     'speed=1.01x    \r' % (frame, frame * 3,
+                                           frame / 25.0 % 60)).encode())
+        f.write(b'\nvideo:1kB audio:1kB muxing overhead: 0.1%\n')
+
+
+# output of ffprobe -show_streams for many streams
+def generate_ffprobe_dump(path, size):
+    stream = b''.join(b'%s=%d\n' % (key, n) for n, key in enumerate(
+        [b'index', b'width', b'height', b'has_b_frames', b'nb_frames',
+         b'duration_ts', b'start_pts', b'bits_per_raw_sample']))
+    with open(path, 'wb') as f:
+        while f.tell() < size:
+            f.write(b'[STREAM]\ncodec_name=h264\n' + stream + b'[/STREAM]\n')
+
+
+# pipes the file through a child process so both readers
+# read from a real subprocess.Popen pipe, like in the parsers
+def time_reader(reader, path):
+    p = Popen([sys.executable, '-c',
+               'import shutil, sys; '
+               'shutil.copyfileobj(open(sys.argv[1], "rb"), '
+               'sys.stdout.buffer)', path], stdout=PIPE)
+    start = time.time()
+    lines = 0
+    for _ in reader(p.stdout):
+        lines += 1
+    elapsed = time.time() - start
+    p.wait()
+
+    return lines, elapsed
+
+
+def run(paths):
+    for path in paths:
+        size = os.path.getsize(path) / (1024.0 * 1024.0)
+        print('%s (%.1f MB)' % (os.path.basename(path), size))
+        for name, reader in [('one byte reads', one_byte_lines),
+                             ('chunked reader', iter_lines)]:
+            lines, elapsed = time_reader(reader, path)
+            print('  %-16s %8d lines %8.3f s %8.1f MB/s' % (
+                name, lines, elapsed, size / elapsed))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(sys.argv[1:])
+    else:
+        tmp_dir = tempfile.mkdtemp()
+        transcode_log = os.path.join(tmp_dir, 'transcode.log')
+        ffprobe_dump = os.path.join(tmp_dir, 'ffprobe.txt')
+        generate_transcode_log(transcode_log, 8 * 1024 * 1024)
+        generate_ffprobe_dump(ffprobe_dump, 8 * 1024 * 1024)
+        try:
+            run([transcode_log, ffprobe_dump])
+        finally:
+            os.unlink(transcode_log)
+            os.unlink(ffprobe_dump)
+            os.rmdir(tmp_dir)
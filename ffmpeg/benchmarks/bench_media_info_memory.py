@@ -0,0 +1,131 @@
+"""Memory of a catalog of MediaInfo objects, e.g. the probe
+results of a million assets, built from ffprobe json output
+of one video and one audio stream with the values which are
+unique to each file changed, like the disk cache reads them.
+
+    python bench_media_info_memory.py [objects]
+
+1000000 objects by default, the size of the catalogs this is
+for. The memory is the growth of the resident set of the
+process: tracemalloc keeps a trace of each of the tens of
+millions of allocations, which makes the run three times
+slower and adds gigabytes to the 2.5 GiB of the objects.
+"""
+import gc
+import json
+import os
+import resource
+import sys
+import time
+
+# go to the root of the repository, the ffmpeg package is there
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..'))
+
+from ffmpeg.base import MediaInfo
+
+DISPOSITION = {'default': 1, 'dub': 0, 'original': 0, 'comment': 0,
+               'lyrics': 0, 'karaoke': 0, 'forced': 0,
+               'hearing_impaired': 0, 'visual_impaired': 0,
+               'clean_effects': 0, 'attached_pic': 0,
+               'timed_thumbnails': 0}
+OUTPUT = json.dumps({
+    'streams': [
+        {'index': 0, 'codec_name': 'h264',
+         'codec_long_name': 'H.264 / AVC / MPEG-4 AVC / MPEG-4 part 10',
+         'profile': 'High', 'codec_type': 'video', 'codec_tag_string': 'avc1',
+         'codec_tag': '0x31637661', 'width': 1920, 'height': 1080,
+         'coded_width': 1920, 'coded_height': 1080, 'has_b_frames': 2,
+         'sample_aspect_ratio': '1:1', 'display_aspect_ratio': '16:9',
+         'pix_fmt': 'yuv420p', 'level': 40, 'chroma_location': 'left',
+         'field_order': 'progressive', 'refs': 1, 'is_avc': 'true',
+         'nal_length_size': '4', 'id': '0x1', 'r_frame_rate': '25/1',
+         'avg_frame_rate': '25/1', 'time_base': '1/12800', 'start_pts': 0,
+         'start_time': '0.000000', 'duration_ts': 3758592,
+         'duration': '293.640000', 'bit_rate': '4123456',
+         'bits_per_raw_sample': '8', 'nb_frames': '7341',
+         'disposition': DISPOSITION,
+         'tags': {'language': 'und', 'handler_name': 'VideoHandler',
+                  'vendor_id': '[0][0][0][0]'}},
+        {'index': 1, 'codec_name': 'aac',
+         'codec_long_name': 'AAC (Advanced Audio Coding)', 'profile': 'LC',
+         'codec_type': 'audio', 'codec_tag_string': 'mp4a',
+         'codec_tag': '0x6134706d', 'sample_fmt': 'fltp',
+         'sample_rate': '48000', 'channels': 2, 'channel_layout': 'stereo',
+         'bits_per_sample': 0, 'id': '0x2', 'r_frame_rate': '0/0',
+         'avg_frame_rate': '0/0', 'time_base': '1/48000', 'start_pts': 0,
+         'start_time': '0.000000', 'duration_ts': 14094336,
+         'duration': '293.632000', 'bit_rate': '128000',
+         'nb_frames': '13764', 'disposition': DISPOSITION,
+         'tags': {'language': 'eng', 'handler_name': 'SoundHandler',
+                  'vendor_id': '[0][0][0][0]'}}],
+    'format': {'filename': 'assets/000000.mp4', 'nb_streams': 2,
+               'nb_programs': 0, 'format_name': 'mov,mp4,m4a,3gp,3g2,mj2',
+               'format_long_name': 'QuickTime / MOV',
+               'start_time': '0.000000', 'duration': '293.640000',
+               'size': '153318712', 'bit_rate': '4252696', 'probe_score': 100,
+               'tags': {'major_brand': 'isom', 'minor_version': '512',
+                        'compatible_brands': 'isomiso2avc1mp41',
+                        'encoder': 'Lavf60.3.100'}}})
+
+
+def output(number):
+    # the output of another file, the values which differ
+    # from file to file are new strings in each output
+    data = json.loads(OUTPUT)
+    seconds = 60 + number % 3600
+    data['format']['filename'] = 'assets/%06d.mp4' % number
+    data['format']['size'] = str(1000000 + number * 37)
+    data['format']['duration'] = data['format']['bit_rate'] = \
+        '%d.%06d' % (seconds, number % 1000000)
+    for stream in data['streams']:
+        stream['duration'] = '%d.%06d' % (seconds, number % 999983)
+        stream['duration_ts'] = seconds * 12800
+        stream['nb_frames'] = str(seconds * 25)
+
+    return data
+
+
+def resident():
+    # bytes of the resident set; the peak where there is no
+    # /proc, the catalog only grows so both are the same
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * resource.getpagesize()
+    except (IOError, OSError):
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def run(objects):
+    gc.collect()
+    before = resident()
+    start = time.time()
+    catalog = []
+    for number in range(objects):
+        info = MediaInfo()
+        info.parse_ffprobe_json(output(number))
+        catalog.append(info)
+    build_time = time.time() - start
+    gc.collect()
+    size = resident() - before
+    print('%d MediaInfo objects' % objects)
+    print('  %-26s %8.1f MiB  %6.0f bytes/object  %5.1f s' % (
+        'parsed', size / 1048576.0, float(size) / objects, build_time))
+
+    # the typed fields are converted on first access
+    start = time.time()
+    for info in catalog:
+        info.get_media_duration()
+        for stream in info.streams:
+            stream.width, stream.duration, stream.r_frame_rate, stream.tags
+    access_time = time.time() - start
+    gc.collect()
+    size = resident() - before
+    print('  %-26s %8.1f MiB  %6.0f bytes/object  %5.1f s' % (
+        'after typed access', size / 1048576.0, float(size) / objects,
+        access_time))
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000)
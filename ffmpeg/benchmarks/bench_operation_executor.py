@@ -0,0 +1,126 @@
+"""Memory and time of running an operation sheet of
+loadvideos.py.
+
+Reading: the peak memory of loading every row of a csv
+sheet, the way of BaseExtractor, against the groups of
+OperationExecutor, which reads the rows one at a time.
+Running: one ffmpeg for each row against OperationExecutor,
+one ffmpeg for the rows of each video.
+
+    python bench_operation_executor.py [rows] [videos] [cuts]
+
+ffmpeg and ffprobe have to be in the PATH; the sheet has 1
+million rows by default, the videos, 4 of 30 seconds made
+from the testsrc2 source of lavfi, get 10 cuts each which
+are converted to mkv.
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+from subprocess import Popen, PIPE
+
+# go to the root of the repository, loadvideos.py is there
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..'))
+
+from loadvideos import OperationCSVExtractor, OperationExecutor
+
+
+def make_sheet(path, rows):
+    with open(path, 'w') as f:
+        f.write('video_id,cut,convert\n')
+        for i in range(rows):
+            start = random.randint(0, 3000)
+            f.write('video%d.mp4,%d-%d,mkv\n' % (i // 50, start, start + 10))
+
+
+def make_video(path):
+    p = Popen(['ffmpeg', '-v', 'error', '-y', '-f', 'lavfi', '-i',
+               'testsrc2=size=640x360:rate=25:duration=30',
+               '-c:v', 'libx264', '-preset', 'ultrafast', path],
+              stdout=PIPE, stderr=PIPE)
+    p.communicate()
+
+
+def reading(directory, rows):
+    path = os.path.join(directory, 'sheet.csv')
+    make_sheet(path, rows)
+    print('%d rows, %.0f MiB of csv' % (rows, os.path.getsize(path) /
+                                        1048576.0))
+
+    def load():
+        return len(OperationCSVExtractor(path).data)
+
+    def stream():
+        executor = OperationExecutor(OperationCSVExtractor(path, load=False),
+                                     directory)
+        return sum(len(group) for _, group in executor.groups())
+
+    for name, read in [('load every row', load),
+                       ('OperationExecutor groups', stream)]:
+        tracemalloc.start()
+        start = time.time()
+        count = read()
+        elapsed = time.time() - start
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        print('  %-26s %8.1f MiB peak  %8.0f rows/s' % (
+            name, peak / 1048576.0, count / elapsed))
+
+
+def running(directory, videos, cuts):
+    rows = []
+    for i in range(videos):
+        path = os.path.join(directory, 'video%d.mp4' % i)
+        make_video(path)
+        for j in range(cuts):
+            rows.append((path, j * 2.5, j * 2.5 + 2))
+    sheet = os.path.join(directory, 'run.csv')
+    with open(sheet, 'w') as f:
+        f.write('video_id,cut,convert\n')
+        for path, start, end in rows:
+            f.write('%s,%g-%g,mkv\n' % (path, start, end))
+    print('%d videos, %d cuts of each converted to mkv' % (videos, cuts))
+
+    def each_row(output_dir):
+        for path, start, end in rows:
+            p = Popen(['ffmpeg', '-v', 'error', '-y', '-i', path,
+                       '-ss', str(start), '-to', str(end),
+                       os.path.join(output_dir, '%s_%g.mkv' % (
+                           os.path.basename(path), start))],
+                      stdout=PIPE, stderr=PIPE)
+            p.communicate()
+
+    def executor(output_dir):
+        OperationExecutor(OperationCSVExtractor(sheet, load=False),
+                          output_dir).run()
+
+    results = []
+    for name, run in [('a process each row', each_row),
+                      ('OperationExecutor', executor)]:
+        output_dir = tempfile.mkdtemp(dir=directory)
+        start = time.time()
+        run(output_dir)
+        elapsed = time.time() - start
+        results.append(elapsed)
+        print('  %-26s %8.2f s' % (name, elapsed))
+    print('  %.1fx faster' % (results[0] / results[1]))
+
+
+def run(rows, videos, cuts):
+    directory = tempfile.mkdtemp()
+    try:
+        reading(directory, rows)
+        running(directory, videos, cuts)
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 1000000,
+        int(sys.argv[2]) if len(sys.argv) > 2 else 4,
+        int(sys.argv[3]) if len(sys.argv) > 3 else 10)
@@ -0,0 +1,76 @@
+"""Memory and throughput of reading an operation sheet of
+loadvideos.py: the rows loaded as a list of dicts, the way of
+load=True, the Operation records of iter_records kept in a
+list, and iter_records read one at a time, the way of
+OperationExecutor.
+
+    python bench_operation_records.py [rows]
+
+The csv sheet has 3 million rows by default, with a header
+whose columns are not in the default order; load=True maps
+them by position, without the header. The peak memory is measured with
+tracemalloc, the rows/s in another pass without it.
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# go to the root of the repository, loadvideos.py is there
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..'))
+
+from loadvideos import OperationCSVExtractor
+
+
+def make_sheet(path, rows):
+    with open(path, 'w') as f:
+        f.write('convert,video_id,cut\n')
+        for i in range(rows):
+            start = random.randint(0, 3000)
+            f.write('mkv,video%d.mp4,00:%02d:%02d-%d\n' % (
+                i // 50, start // 60 % 60, start % 60, start + 10))
+
+
+def run(rows):
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'sheet.csv')
+        make_sheet(path, rows)
+        print('%d rows, %.0f MiB of csv' % (rows, os.path.getsize(path) /
+                                            1048576.0))
+
+        def load():
+            return len(OperationCSVExtractor(path).data)
+
+        def records():
+            extractor = OperationCSVExtractor(path, load=False)
+            return len(list(extractor.iter_records()))
+
+        def stream():
+            extractor = OperationCSVExtractor(path, load=False)
+            return sum(1 for _ in extractor.iter_records())
+
+        for name, read in [('dicts, load=True', load),
+                           ('list of Operation', records),
+                           ('iter_records', stream)]:
+            tracemalloc.start()
+            read()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            start = time.time()
+            count = read()
+            elapsed = time.time() - start
+            print('  %-20s %8.1f MiB peak  %9.0f rows/s' % (
+                name, peak / 1048576.0, count / elapsed))
+        print('  the dicts keep the cuts as text, the records parse '
+              'and check them')
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 3000000)
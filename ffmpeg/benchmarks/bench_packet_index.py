@@ -0,0 +1,88 @@
+"""Cost of BasicFFProbe.build_index on a long file: the
+first build, which reads the packets with ffprobe, the
+sidecar read again, and the keyframe lookups against a
+scan of the packets.
+
+    python bench_packet_index.py [minutes]
+
+ffmpeg and ffprobe have to be in the PATH; the file is
+made from the testsrc and sine sources of lavfi, small
+h264 with a keyframe every 2 seconds and aac, 60 minutes
+by default, so the packets are the ones of a long file.
+"""
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from subprocess import Popen, PIPE
+
+# go to the root of the repository, the ffmpeg package is there
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..'))
+
+from ffmpeg.ffprobe import BasicFFProbe
+
+
+def make_media(path, minutes):
+    seconds = minutes * 60
+    p = Popen(['ffmpeg', '-v', 'error', '-y', '-f', 'lavfi', '-i',
+               'testsrc=size=160x90:rate=25:duration=%d' % seconds,
+               '-f', 'lavfi', '-i', 'sine=duration=%d' % seconds,
+               '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '50',
+               '-c:a', 'aac', path], stdout=PIPE, stderr=PIPE)
+    p.communicate()
+
+
+def run(minutes):
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'long.mp4')
+        make_media(path, minutes)
+        probe = BasicFFProbe(verbose=False)
+        start = time.time()
+        index = probe.build_index(path)
+        build_time = time.time() - start
+        packets = sum(len(stream) for stream in index)
+        size = os.path.getsize(path + '.pktidx')
+        print('%d minutes, %d packets' % (minutes, packets))
+        print('  %-22s %8.3f s  %5.2f us/packet' % (
+            'build', build_time, build_time / packets * 1e6))
+        start = time.time()
+        index = probe.build_index(path)
+        print('  %-22s %8.3f s  %5.1f bytes/packet on disk' % (
+            'load the sidecar', time.time() - start, float(size) / packets))
+
+        video = index.video
+        times = [random.uniform(0, minutes * 60) for _ in range(10000)]
+        start = time.time()
+        for t in times:
+            video.previous_keyframe(t)
+        lookup = (time.time() - start) / len(times)
+
+        def scan(t):
+            # the keyframe before t without the index
+            found = None
+            for i in range(len(video)):
+                if video.flags[i] & 1 and video.pts[i] * \
+                        video.time_base <= t:
+                    found = i
+            return found
+        start = time.time()
+        for t in times[:10]:
+            scan(t)
+        scan_time = (time.time() - start) / 10
+        print('  %-22s %8.2f us' % ('previous_keyframe', lookup * 1e6))
+        print('  %-22s %8.2f us  %.0fx slower' % (
+            'scan of the packets', scan_time * 1e6, scan_time / lookup))
+        start = time.time()
+        gops = video.gop_stats()
+        print('  %-22s %8.3f s  %d GOPs' % ('gop_stats',
+                                           time.time() - start, len(gops)))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 60)
@@ -0,0 +1,80 @@
+"""Wall-clock time of converting a long video: one ffmpeg for
+the whole file, the way of convert_video, against
+VideoFFMpeg.convert_video_parallel, which encodes segments
+split at keyframes at the same time and joins them.
+
+    python bench_parallel_convert.py [minutes] [workers]
+
+ffmpeg and ffprobe have to be in the PATH; the source is made
+from the testsrc2 and sine sources of lavfi, 1280x720 with a
+keyframe every 2 seconds and aac, 5 minutes by default, and
+is converted to libx264 -preset veryfast and aac. workers is
+the default of scheduler.JobScheduler, one for every two
+cores, when it is not given; the speedup depends on the
+cores of the machine, the time of both is printed.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from subprocess import Popen, PIPE
+
+# go to the root of the repository, the ffmpeg package is there
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..'))
+
+from ffmpeg.scheduler import JobScheduler, available_cpus
+from ffmpeg.video import VideoFFMpeg
+
+OPTIONS = ['-preset', 'veryfast', '-crf', '23']
+
+
+def make_video(path, minutes):
+    seconds = minutes * 60
+    p = Popen(['ffmpeg', '-v', 'error', '-y', '-f', 'lavfi', '-i',
+               'testsrc2=size=1280x720:rate=25:duration=%d' % seconds,
+               '-f', 'lavfi', '-i', 'sine=duration=%d' % seconds,
+               '-c:v', 'libx264', '-preset', 'ultrafast', '-g', '50',
+               '-c:a', 'aac', path], stdout=PIPE, stderr=PIPE)
+    p.communicate()
+
+
+def one_process(path, output, workers):
+    v = VideoFFMpeg(verbose=False)
+    v._run(['-i', path, '-c:v', 'libx264'] + OPTIONS +
+           ['-c:a', 'aac', output])
+
+
+def segments(path, output, workers):
+    VideoFFMpeg(verbose=False).convert_video_parallel(
+        path, output, vcodec='libx264', acodec='aac', options=OPTIONS,
+        workers=workers)
+
+
+def run(minutes, workers):
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'source.mp4')
+        make_video(path, minutes)
+        scheduler = JobScheduler(max_workers=workers)
+        print('%d minutes of 1280x720, %d cores, %d workers' % (
+            minutes, available_cpus(), scheduler.max_workers))
+        results = []
+        for name, convert in [('one process', one_process),
+                              ('convert_video_parallel', segments)]:
+            output = os.path.join(directory, '%d.mp4' % len(results))
+            start = time.time()
+            convert(path, output, scheduler.max_workers)
+            elapsed = time.time() - start
+            results.append(elapsed)
+            print('  %-24s %8.1f s  %6.1f frames/s' % (
+                name, elapsed, minutes * 60 * 25 / elapsed))
+        print('  speedup %.2fx' % (results[0] / results[1]))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 5,
+        int(sys.argv[2]) if len(sys.argv) > 2 else None)
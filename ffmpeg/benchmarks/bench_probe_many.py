@@ -0,0 +1,70 @@
+"""Throughput of BasicFFProbe.probe_many for different
+numbers of workers, against probe called in a loop. The
+cache is turned off so every probe spawns ffprobe.
+
+    python bench_probe_many.py [media_file ...]
+
+Without arguments a few short files are generated with
+ffmpeg; the files are probed over and over to reach
+the number of probes of the benchmark.
+"""
+import itertools
+import os
+import shutil
+import sys
+import tempfile
+import time
+from subprocess import Popen, PIPE
+
+# go to the root of the repository, the ffmpeg package is there
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..'))
+
+from ffmpeg.ffprobe import BasicFFProbe
+
+PROBES = 200
+
+
+def generate_media(tmp_dir):
+    paths = []
+    for name, size in [('small.mp4', '320x240'), ('medium.mkv', '1280x720')]:
+        path = os.path.join(tmp_dir, name)
+        p = Popen(['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i',
+                   'testsrc=size=%s:rate=25' % size, '-f', 'lavfi', '-i',
+                   'sine', '-t', '2', path], stdin=PIPE)
+        p.communicate()
+        paths.append(path)
+
+    return paths
+
+
+def run(paths):
+    BasicFFProbe.cache = None
+    probe = BasicFFProbe()
+    all_paths = list(itertools.islice(itertools.cycle(paths), PROBES))
+
+    start = time.time()
+    for path in all_paths:
+        probe.probe(path)
+    loop_rate = PROBES / (time.time() - start)
+    print('%d probes, %d cpus' % (PROBES, os.cpu_count() or 1))
+    print('  %-18s %8.1f probes/s' % ('probe in a loop', loop_rate))
+
+    for workers in [1, 2, 4, 8, 16]:
+        start = time.time()
+        for _ in probe.probe_many(all_paths, max_workers=workers):
+            pass
+        rate = PROBES / (time.time() - start)
+        print('  %-18s %8.1f probes/s  %.2fx' % (
+            'max_workers=%d' % workers, rate, rate / loop_rate))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(sys.argv[1:])
+    else:
+        tmp_dir = tempfile.mkdtemp()
+        try:
+            run(generate_media(tmp_dir))
+        finally:
+            shutil.rmtree(tmp_dir)
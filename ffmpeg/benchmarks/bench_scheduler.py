@@ -0,0 +1,76 @@
+"""Throughput of JobScheduler against running the same
+ffmpeg jobs one after the other and all at once. Each job
+encodes a synthetic lavfi source with libx264 to null.
+
+    python bench_scheduler.py [jobs] [seconds_per_job]
+
+ffmpeg has to be in the PATH and built with libx264.
+"""
+import os
+import sys
+import threading
+import time
+
+# go to the root of the repository, the ffmpeg package is there
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..'))
+
+from ffmpeg.scheduler import JobScheduler, available_cpus
+from ffmpeg.video import VideoFFMpeg
+
+
+def job_cmds(seconds):
+    return ['-f', 'lavfi', '-i',
+            'testsrc2=size=640x360:rate=25:duration=%s' % seconds,
+            '-vf', 'scale=1280:720', '-c:v', 'libx264',
+            '-preset', 'veryfast', '-f', 'null', '-']
+
+
+def sequential(v, jobs, seconds):
+    for _ in range(jobs):
+        v._run(job_cmds(seconds))
+
+
+def unbounded(v, jobs, seconds):
+    # every job at once, each ffmpeg picks its own threads
+    threads = [threading.Thread(target=v._run, args=(job_cmds(seconds),))
+               for _ in range(jobs)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+def scheduled(v, jobs, seconds):
+    with JobScheduler() as scheduler:
+        futures = [scheduler.submit(v._run, job_cmds(seconds))
+                   for _ in range(jobs)]
+    for future in futures:
+        future.result()
+    return scheduler
+
+
+def run(jobs, seconds):
+    v = VideoFFMpeg(verbose=False)
+    print('%d jobs of %s s of video, %d cpus' % (jobs, seconds,
+                                                 available_cpus()))
+    base_rate = None
+    for name, func in [('sequential', sequential),
+                       ('unbounded parallel', unbounded),
+                       ('JobScheduler', scheduled)]:
+        start = time.time()
+        result = func(v, jobs, seconds)
+        rate = jobs / (time.time() - start)
+        if base_rate is None:
+            base_rate = rate
+        if isinstance(result, JobScheduler):
+            name = '%s (%d x %d threads)' % (name, result.max_workers,
+                                             result.threads_per_job)
+        print('  %-34s %6.2f jobs/s  %.2fx' % (name, rate,
+                                               rate / base_rate))
+
+
+if __name__ == '__main__':
+    jobs = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    seconds = sys.argv[2] if len(sys.argv) > 2 else '4'
+    run(jobs, seconds)
@@ -0,0 +1,78 @@
+"""Time of a chain of edits, crop, scale, rotate and blur:
+one ffmpeg for each edit, writing a file for the next one,
+against VideoEdit, which puts them in one filtergraph and
+decodes and encodes the video once.
+
+    python bench_video_edit.py [seconds]
+
+ffmpeg and ffprobe have to be in the PATH; the video is made
+from the testsrc2 source of lavfi, 1280x720 h264, 30 seconds
+by default; every pass encodes with libx264 -preset veryfast.
+"""
+import os
+import shutil
+import sys
+import tempfile
+import time
+from subprocess import Popen, PIPE
+
+# go to the root of the repository, the ffmpeg package is there
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                             '..', '..'))
+
+from ffmpeg.video import BasicVideoFFMpegEdit
+
+OPTIONS = ['-preset', 'veryfast']
+
+
+def make_video(path, seconds):
+    p = Popen(['ffmpeg', '-v', 'error', '-y', '-f', 'lavfi', '-i',
+               'testsrc2=size=1280x720:rate=25:duration=%d' % seconds,
+               '-c:v', 'libx264', '-preset', 'ultrafast', path],
+              stdout=PIPE, stderr=PIPE)
+    p.communicate()
+
+
+EDITS = [lambda edit: edit.crop(960, 720),
+         lambda edit: edit.scale(640, 480),
+         lambda edit: edit.rotate(90),
+         lambda edit: edit.blur(2)]
+
+
+def file_by_file(v, path, directory):
+    for i, step in enumerate(EDITS):
+        output = os.path.join(directory, 'step%d.mp4' % i)
+        step(v.edit(path)).run(output, vcodec='libx264', options=OPTIONS)
+        path = output
+
+
+def fused(v, path, directory):
+    edit = v.edit(path)
+    for step in EDITS:
+        step(edit)
+    edit.run(os.path.join(directory, 'fused.mp4'), vcodec='libx264',
+             options=OPTIONS)
+
+
+def run(seconds):
+    directory = tempfile.mkdtemp()
+    try:
+        path = os.path.join(directory, 'source.mp4')
+        make_video(path, seconds)
+        v = BasicVideoFFMpegEdit(verbose=False)
+        print('%d edits of %d seconds of 1280x720' % (len(EDITS), seconds))
+        results = []
+        for name, edit in [('a pass for each edit', file_by_file),
+                           ('one filtergraph', fused)]:
+            start = time.time()
+            edit(v, path, directory)
+            elapsed = time.time() - start
+            results.append(elapsed)
+            print('  %-22s %7.2f s' % (name, elapsed))
+        print('  %.2fx faster' % (results[0] / results[1]))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == '__main__':
+    run(int(sys.argv[1]) if len(sys.argv) > 1 else 30)
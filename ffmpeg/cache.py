@@ -0,0 +1,140 @@
+"""Cache of the MediaInfo objects returned by
+BasicFFProbe.probe, in memory and on disk"""
+import json
+import threading
+import time
+from collections import OrderedDict
+from .base import MediaInfo
+from .utils import file_identity
+
+
+class ProbeCache(object):
+    """Keeps MediaInfo objects by (realpath, size,
+    mtime_ns, inode, ffprobe build) of the probed file.
+    The first layer is an LRU dict in memory with at
+    most maxsize entries; when path is given, entries
+    are stored in a sqlite database as well and are
+    found again by other processes. Entries older than
+    max_age seconds are dropped from both layers.
+
+    The MediaInfo objects are shared by the callers
+    which get them from the cache, do not modify them."""
+
+    def __init__(self, maxsize=1024, max_age=None, path=None,
+                 disk_maxsize=None):
+        self.maxsize = maxsize
+        self.max_age = max_age
+        self.path = path  # sqlite database, None for memory only
+        self.disk_maxsize = disk_maxsize
+        self.hits = 0  # probes answered by the cache
+        self.disk_hits = 0  # part of the hits read from disk
+        self.misses = 0  # probes which spawned ffprobe
+        self.evictions = 0  # entries dropped from memory
+        self._stored = 0  # entries written to disk
+        self._memory = OrderedDict()  # key -> (time, MediaInfo)
+        self._lock = threading.Lock()
+        self._db = None
+        if path is not None:
+            self._open_db()
+
+    def __repr__(self):
+        return '%s(hits=%d, misses=%d, entries=%d)' % (
+            self.__class__.__name__, self.hits, self.misses,
+            len(self._memory))
+
+    def _open_db(self):
+        # sqlite3 is imported by the disk cache only, it
+        # slows down the import of the package otherwise
+        try:
+            import sqlite3
+        except ImportError:  # python built without sqlite
+            raise ImportError('sqlite3 is needed for the disk cache')
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS probe '
+                         '(key TEXT PRIMARY KEY, created REAL, '
+                         'output TEXT)')
+        if self.max_age is not None:
+            self._db.execute('DELETE FROM probe WHERE created < ?',
+                             (time.time() - self.max_age,))
+        self._db.commit()
+
+    # the build of ffprobe is part of the key, a new build
+    # can probe the same file differently; it is told by the
+    # stat of the executable so no process is spawned for it
+    def key(self, media_input, executable):
+        """Returns the cache key of media_input, None
+        when media_input is not a local file."""
+        identity = file_identity(media_input)
+        if identity is None:
+            return None
+
+        return identity + (file_identity(executable),)
+
+    def get(self, key):
+        """Returns the cached MediaInfo or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                created, media_info = entry
+                if self.max_age is None or now - created < self.max_age:
+                    self._memory.move_to_end(key)  # most recently used
+                    self.hits += 1
+                    return media_info
+                del self._memory[key]  # too old
+            if self._db is not None:
+                row = self._db.execute(
+                    'SELECT created, output FROM probe WHERE key = ?',
+                    (json.dumps(key),)).fetchone()
+                if row is not None and (self.max_age is None or
+                                        now - row[0] < self.max_age):
+                    media_info = MediaInfo()
+                    media_info.parse_ffprobe_json(json.loads(row[1]))
+                    self._remember(key, media_info, row[0])
+                    self.hits += 1
+                    self.disk_hits += 1
+                    return media_info
+            self.misses += 1
+
+        return None
+
+    def set(self, key, media_info):
+        """Stores media_info under key."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, media_info, now)
+            if self._db is not None:
+                self._db.execute(
+                    'INSERT OR REPLACE INTO probe VALUES (?, ?, ?)',
+                    (json.dumps(key), now,
+                     json.dumps(media_info.to_ffprobe_json())))
+                self._stored += 1
+                if self.disk_maxsize is not None and self._stored % 100 == 0:
+                    # every 100 writes keep the newest disk_maxsize
+                    # entries, the database may go over the limit
+                    # by less than 100 entries in between
+                    self._db.execute(
+                        'DELETE FROM probe WHERE key NOT IN (SELECT key '
+                        'FROM probe ORDER BY created DESC LIMIT ?)',
+                        (self.disk_maxsize,))
+                self._db.commit()
+
+    def _remember(self, key, media_info, created):
+        self._memory[key] = (created, media_info)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.maxsize:
+            self._memory.popitem(last=False)  # least recently used
+            self.evictions += 1
+
+    def clear(self):
+        """Drops every entry, in memory and on disk."""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute('DELETE FROM probe')
+                self._db.commit()
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
@@ -0,0 +1,611 @@
+"""Encodes the segments of VideoFFMpeg.convert_video_parallel
+on worker processes of other machines: a SegmentCoordinator
+listens on a TCP or unix socket, SegmentWorkers connect to it
+and encode the segments it sends them.
+
+    # on each worker machine
+    python cluster.py coordinator-host:7300 --threads 8
+
+    # on the coordinator
+    with SegmentCoordinator(('0.0.0.0', 7300)) as coordinator:
+        coordinator.wait_for_workers(4)
+        coordinator.convert_video('in.mp4', 'out.mp4',
+                                  vcodec='libx264', acodec='aac')
+
+A message is 4 bytes, the big endian length of a json
+header, the header and, when the header has a size, that
+many bytes of a file, e.g. a segment."""
+import argparse
+import collections
+import json
+import os
+import shutil
+import socket
+import struct
+import sys
+import tempfile
+import threading
+
+from .base import FFMpegAlreadyExistsError
+from .ffprobe import BasicFFProbe
+from .video import VideoFFMpeg
+
+_length_struct = struct.Struct('>I')
+# bytes read from the socket at once
+_CHUNK_SIZE = 65536
+
+
+# raised by SegmentCoordinator.convert_video when a segment
+# failed on max_attempts workers, or they were lost with it
+class SegmentFailedError(Exception):
+
+    def __init__(self, msg, segment, error=None):
+        super(SegmentFailedError, self).__init__(msg)
+        self.msg = msg
+        self.segment = segment  # index of the segment
+        self.error = error  # what the last worker said
+
+    def __repr__(self):
+        return '%s: segment %d, %s' % (self.msg, self.segment, self.error)
+
+    def __str__(self):
+        return self.__repr__()
+
+
+def parse_address(address):
+    """'host:port' -> (host, port), a path with a / is
+    the one of a unix socket and is returned as it is."""
+    if '/' in address:
+        return address
+    host, _, port = address.rpartition(':')
+
+    return (host or '127.0.0.1', int(port))
+
+
+def _family(address):
+    if isinstance(address, str):
+        return socket.AF_UNIX
+    return socket.AF_INET6 if ':' in address[0] else socket.AF_INET
+
+
+def send_message(sock, message, path=None):
+    """Sends the dict message and the file path after it."""
+    if path is not None:
+        message = dict(message, size=os.path.getsize(path))
+    header = json.dumps(message).encode('utf-8')
+    sock.sendall(_length_struct.pack(len(header)) + header)
+    if path is not None:
+        with open(path, 'rb') as f:
+            sock.sendfile(f)
+
+
+def recv_message(stream, directory):
+    """Reads a message from stream, the makefile('rb') of
+    a socket; the file which follows it is written to
+    directory. Returns (message, path of the file or None),
+    (None, None) at the end of the stream. The path comes
+    from here only, never from the peer."""
+    data = stream.read(_length_struct.size)
+    if not data:
+        return None, None
+    if len(data) < _length_struct.size:
+        raise ValueError('connection closed in a message')
+    length, = _length_struct.unpack(data)
+    message = json.loads(stream.read(length).decode('utf-8'))
+    if not isinstance(message, dict):
+        raise ValueError('invalid message')
+    message.pop('path', None)  # only the return value has one
+    size = message.pop('size', None)
+    path = None
+    if size is not None:
+        if directory is None or not isinstance(size, int) or size < 0:
+            raise ValueError('unexpected file in a message')
+        fd, path = tempfile.mkstemp(dir=directory, suffix='.part')
+        with os.fdopen(fd, 'wb') as f:
+            while size:
+                chunk = stream.read(min(size, _CHUNK_SIZE))
+                if not chunk:
+                    os.remove(path)
+                    raise ValueError('connection closed in a file')
+                f.write(chunk)
+                size -= len(chunk)
+
+    return message, path
+
+
+class _Segment(object):
+    # a segment of the conversion in progress
+    def __init__(self, index, start, frames, output):
+        self.index = index
+        self.start = start  # seconds, None for the first one
+        self.frames = frames
+        self.output = output  # where the encoded one is put
+        self.source = None  # its packets, sent to the workers
+        self.attempts = 0
+        self.done = False
+
+
+class SegmentCoordinator(object):
+    """Splits videos like VideoFFMpeg.convert_video_parallel
+    and sends the segments to the SegmentWorkers connected
+    to address, a (host, port) or the path of a unix socket;
+    port 0 picks a free port, see self.address.
+
+    Each worker gets a segment at a time. With shared=False
+    the packets of the segment, copied from the input, are
+    sent to the worker and the encoded segment comes back;
+    with shared=True the workers read the input and write
+    the segment where the coordinator does, a file system
+    mounted at the same path on every machine. A worker
+    which is not heard from, not even its heartbeat, for
+    heartbeat_timeout seconds is dropped and its segment
+    goes to another one."""
+    heartbeat_timeout = 10.0
+    # a segment is sent to at most max_attempts workers
+    max_attempts = 3
+
+    def __init__(self, address=('127.0.0.1', 0), verbose=False):
+        self.address = address
+        self.verbose = verbose
+        self.wrapper = VideoFFMpeg(verbose=verbose)
+        self._listener = None
+        self._condition = threading.Condition()
+        self._workers = {}  # name -> socket
+        self._jobs = collections.deque()  # segments to send
+        self._segments = []  # of the conversion in progress
+        self._settings = None  # likewise, what the jobs need
+        self._error = None
+        self._busy = 0  # segments sent and not back yet
+        self._closed = False
+        self._convert_lock = threading.Lock()  # one at a time
+
+    def __repr__(self):
+        return '%s(%r, %d workers)' % (self.__class__.__name__,
+                                       self.address, len(self._workers))
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.close()
+
+    def start(self):
+        """Listens on self.address and accepts workers
+        on a thread of its own; returns self."""
+        self._listener = socket.socket(_family(self.address))
+        if not isinstance(self.address, str):
+            self._listener.setsockopt(socket.SOL_SOCKET,
+                                      socket.SO_REUSEADDR, 1)
+        self._listener.bind(self.address)
+        self._listener.listen(16)
+        self.address = self._listener.getsockname()
+        accepter = threading.Thread(target=self._accept)
+        accepter.daemon = True
+        accepter.start()
+
+        return self
+
+    def close(self):
+        """Tells the workers to stop and stops listening."""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+        if self._listener is not None:
+            self._listener.close()
+            if isinstance(self.address, str) and \
+                    os.path.exists(self.address):
+                os.remove(self.address)  # the unix socket
+
+    @property
+    def workers(self):
+        """Names of the workers connected."""
+        with self._condition:
+            return sorted(self._workers)
+
+    def wait_for_workers(self, count, timeout=None):
+        """Waits until count workers are connected, returns
+        False when timeout seconds passed before."""
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: len(self._workers) >= count, timeout)
+
+    def _accept(self):
+        while True:
+            try:
+                sock, _ = self._listener.accept()
+            except OSError:  # closed
+                return
+            handler = threading.Thread(target=self._serve, args=(sock,))
+            handler.daemon = True
+            handler.start()
+
+    def convert_video(self, video_input, video_output, overwrite=False,
+                      vcodec=None, acodec=None, options=None,
+                      shared=False, check=True):
+        """
+        Converts video_input like VideoFFMpeg.convert_video_parallel,
+        the segments are encoded by the workers, about two for each
+        worker connected, and the audio by the coordinator. Waits
+        for workers when none is connected.
+        :param shared: the workers read video_input and write the
+        segments next to video_output themselves
+        :param_type: Bool
+        :return: the status of the concat process
+        """
+        if os.path.exists(video_output) and not overwrite:
+            raise FFMpegAlreadyExistsError(video_output)
+        with self._convert_lock:
+            return self._convert(video_input, video_output, vcodec,
+                                 acodec, options, shared, check)
+
+    def _convert(self, video_input, video_output, vcodec, acodec,
+                 options, shared, check):
+        wrapper = self.wrapper
+        probe = BasicFFProbe(verbose=self.verbose)
+        info = probe._probe(video_input)
+        video = probe.build_index(video_input).video
+        if video is None or not len(video):
+            raise ValueError('no video frames in %s' % video_input)
+        has_audio = any(stream.codec_type == 'audio'
+                        for stream in info.streams)
+        self.wait_for_workers(1)
+        plan = wrapper._segments(video, info.format_info.start_time,
+                                 len(self._workers))
+        extension = os.path.splitext(video_output)[1]
+        directory = tempfile.mkdtemp(
+            dir=os.path.dirname(os.path.abspath(video_output)))
+        try:
+            with self._condition:
+                self._segments = [
+                    _Segment(i, start, frames, os.path.join(
+                        directory, 'segment%05d%s' % (i, extension)))
+                    for i, (start, frames) in enumerate(plan)]
+                self._settings = {
+                    'input': os.path.abspath(video_input),
+                    'stream_index': video.index, 'vcodec': vcodec,
+                    'options': options or [], 'extension': extension,
+                    'shared': shared, 'directory': directory}
+                self._error = None
+                self._jobs.extend(self._segments)
+                self._condition.notify_all()
+            # the audio is encoded here meanwhile
+            audio_path = None
+            audio_errors = []
+            if has_audio:
+                audio_path = os.path.join(directory, 'audio.mka')
+                audio = threading.Thread(target=self._encode_audio, args=(
+                    video_input, audio_path, acodec, audio_errors))
+                audio.daemon = True
+                audio.start()
+            with self._condition:
+                self._condition.wait_for(
+                    lambda: self._error is not None or self._closed or
+                    all(segment.done for segment in self._segments))
+                error = self._error
+                if error is None and self._closed:
+                    error = RuntimeError('coordinator closed')
+                self._jobs.clear()
+                # the directory is removed after the segments
+                # still being encoded come back and are handled
+                self._condition.wait_for(lambda: not self._busy)
+                segments, self._segments = self._segments, []
+                self._jobs.clear()
+            if has_audio:
+                audio.join()
+            if error is not None:
+                raise error
+            if audio_errors:
+                raise audio_errors[0]
+
+            list_path = os.path.join(directory, 'segments.txt')
+            with open(list_path, 'w') as f:
+                for segment in segments:
+                    f.write("file '%s'\n" %
+                            os.path.basename(segment.output))
+            status = wrapper._run(wrapper._concat_cmds(
+                list_path, audio_path, video_output))
+            if check:
+                wrapper._check_conversion(
+                    probe, video_output, directory,
+                    sum(segment.frames for segment in segments),
+                    info.get_media_duration())
+        finally:
+            shutil.rmtree(directory)
+
+        return status
+
+    def _encode_audio(self, video_input, audio_path, acodec, errors):
+        try:
+            self.wrapper._run(self.wrapper._audio_cmds(
+                video_input, audio_path, acodec))
+        except Exception as e:
+            errors.append(e)
+
+    def _source(self, segment, settings):
+        # the packets of the segment in a file of their own,
+        # -c copy from its keyframe; -ss is a microsecond after
+        # the time of the keyframe, which was rounded down, so
+        # the seek lands on it and not on the one before
+        if segment.source is None:
+            path = os.path.join(settings['directory'],
+                                'source%05d.mkv' % segment.index)
+            _cmds = []
+            if segment.start is not None:
+                _cmds.extend(['-ss', '%.6f' % (segment.start + 1e-6)])
+            _cmds.extend(['-i', settings['input'], '-map',
+                          '0:%d' % settings['stream_index'], '-frames:v',
+                          str(segment.frames), '-c', 'copy', path])
+            self.wrapper._run(_cmds)
+            segment.source = path
+
+        return segment.source
+
+    def _next_job(self):
+        # the next segment to send, None once closed
+        with self._condition:
+            self._condition.wait_for(lambda: self._jobs or self._closed)
+            if self._closed:
+                return None, None
+            self._busy += 1
+            return self._jobs.popleft(), self._settings
+
+    def _retry(self, segment, error):
+        # the segment goes back in the queue, or fails the
+        # conversion after max_attempts; nothing is queued
+        # once the conversion failed or is not this one
+        with self._condition:
+            if segment.done or self._error is not None or \
+                    segment not in self._segments:
+                return
+            if segment.attempts >= self.max_attempts:
+                self._error = SegmentFailedError(
+                    'Segment failed on %d workers' % segment.attempts,
+                    segment.index, error)
+            else:
+                self._jobs.appendleft(segment)
+            self._condition.notify_all()
+
+    def _fail(self, segment, msg, error):
+        # the coordinator itself failed with the segment, the
+        # conversion fails and the worker stays connected
+        with self._condition:
+            if self._error is None and segment in self._segments:
+                self._error = SegmentFailedError(msg, segment.index, error)
+            self._condition.notify_all()
+
+    def _serve(self, sock):
+        # one thread for each worker: sends it a segment and
+        # reads its messages until the segment comes back
+        name = None
+        stream = sock.makefile('rb')
+        try:
+            sock.settimeout(self.heartbeat_timeout)
+            hello, _ = recv_message(stream, None)
+            if not hello or hello.get('type') != 'hello':
+                return
+            name = '%s#%d' % (hello.get('worker'), id(sock))
+            with self._condition:
+                self._workers[name] = sock
+                self._condition.notify_all()
+            while True:
+                segment, settings = self._next_job()
+                if segment is None:
+                    send_message(sock, {'type': 'stop'})
+                    return
+                # _busy counts the segment until its reply is
+                # handled, the directory of the conversion stays
+                try:
+                    if not self._serve_segment(sock, stream, segment,
+                                               settings):
+                        return
+                finally:
+                    with self._condition:
+                        self._busy -= 1
+                        self._condition.notify_all()
+        except (OSError, ValueError):
+            pass  # lost while it had no segment
+        finally:
+            with self._condition:
+                self._workers.pop(name, None)
+            stream.close()
+            sock.close()
+
+    def _serve_segment(self, sock, stream, segment, settings):
+        # sends segment to the worker and handles its reply;
+        # returns False when the worker is lost
+        source = None
+        if not settings['shared']:
+            try:
+                source = self._source(segment, settings)
+            except Exception as e:
+                self._fail(segment, 'Segment could not be cut', str(e))
+                return True
+        try:
+            reply, path = self._send_segment(sock, stream, segment,
+                                             settings, source)
+        except Exception as e:
+            # lost, socket.timeout is an OSError
+            self._retry(segment, 'worker lost: %s' % e)
+            return False
+        if reply['type'] != 'done':  # another worker may succeed
+            if path is not None:
+                os.remove(path)
+            self._retry(segment, reply.get('error'))
+            return True
+        if not settings['shared']:
+            if path is None:
+                self._retry(segment, 'no segment in the reply')
+                return True
+            try:
+                os.rename(path, segment.output)
+            except OSError as e:
+                os.remove(path)
+                self._fail(segment, 'Segment could not be saved', str(e))
+                return True
+        elif path is not None:
+            os.remove(path)
+        with self._condition:
+            segment.done = True
+            self._condition.notify_all()
+
+        return True
+
+    def _send_segment(self, sock, stream, segment, settings, source):
+        # sends the job of segment, source is its packets in
+        # transfer mode; returns the reply and the path of
+        # the file which came with it
+        segment.attempts += 1
+        job = {'type': 'segment', 'segment': segment.index,
+               'frames': segment.frames, 'vcodec': settings['vcodec'],
+               'options': settings['options'],
+               'extension': settings['extension']}
+        if settings['shared']:
+            job.update(input=settings['input'], output=segment.output,
+                       start=segment.start,
+                       stream_index=settings['stream_index'])
+            send_message(sock, job)
+        else:
+            job.update(start=None, stream_index=0)
+            send_message(sock, job, source)
+        while True:
+            # heartbeats come at least every timeout
+            reply, path = recv_message(stream, settings['directory'])
+            if reply is None:
+                raise ValueError('connection closed')
+            if reply['type'] != 'heartbeat':
+                break
+            if path is not None:
+                os.remove(path)
+
+        return reply, path
+
+
+class SegmentWorker(object):
+    """Connects to the SegmentCoordinator at address and
+    encodes the segments it sends with VideoFFMpeg, one at
+    a time, until the coordinator stops it or goes away;
+    a heartbeat is sent every heartbeat_interval seconds,
+    also while a segment is encoded. threads is the
+    -threads of ffmpeg, work_dir keeps the segments which
+    come and go, the temporary directory by default."""
+    heartbeat_interval = 2.0
+
+    def __init__(self, address, name=None, threads=None, work_dir=None,
+                 verbose=False):
+        self.address = address
+        self.name = name or socket.gethostname()
+        self.work_dir = work_dir
+        self.wrapper = VideoFFMpeg(verbose=verbose)
+        self.wrapper.threads = threads
+        self.segments = 0  # segments encoded
+        self._sock = None
+        self._send_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def __repr__(self):
+        return '%s(%r, %r)' % (self.__class__.__name__, self.name,
+                               self.address)
+
+    def stop(self):
+        """Disconnects, the segment being encoded is lost
+        and the coordinator sends it to another worker."""
+        self._stopped.set()
+        if self._sock is not None:
+            try:
+                self._sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def _send(self, message, path=None):
+        with self._send_lock:
+            send_message(self._sock, message, path)
+
+    def _heartbeat(self):
+        while not self._stopped.wait(self.heartbeat_interval):
+            try:
+                self._send({'type': 'heartbeat'})
+            except OSError:
+                return
+
+    def run(self):
+        """Works until stopped; returns the number of
+        segments encoded."""
+        directory = tempfile.mkdtemp(dir=self.work_dir)
+        self._sock = socket.socket(_family(self.address))
+        try:
+            self._sock.connect(self.address)
+            stream = self._sock.makefile('rb')
+            self._send({'type': 'hello', 'worker': self.name})
+            beater = threading.Thread(target=self._heartbeat)
+            beater.daemon = True
+            beater.start()
+            while not self._stopped.is_set():
+                try:
+                    job, source = recv_message(stream, directory)
+                except (OSError, ValueError):
+                    break
+                if job is None or job['type'] == 'stop':
+                    if source is not None:
+                        os.remove(source)
+                    break
+                self._encode(job, source, directory)
+        finally:
+            self._stopped.set()
+            self._sock.close()
+            shutil.rmtree(directory)
+
+        return self.segments
+
+    def _encode(self, job, source, directory):
+        output = job.get('output') or os.path.join(
+            directory, 'segment%05d%s' % (job['segment'], job['extension']))
+        error = None
+        try:
+            self.wrapper._run(self.wrapper._segment_cmds(
+                job.get('input') or source, output, job['stream_index'],
+                job['start'], job['frames'], job['vcodec'],
+                job['options']))
+            if not os.path.exists(output) or not os.path.getsize(output):
+                error = 'ffmpeg made no output'
+        except Exception as e:
+            error = str(e)
+        finally:
+            if source is not None:
+                os.remove(source)
+        try:
+            if error is not None:
+                self._send({'type': 'failed', 'segment': job['segment'],
+                            'error': error})
+            elif job.get('output'):  # shared, it is in place
+                self._send({'type': 'done', 'segment': job['segment']})
+            else:
+                self._send({'type': 'done', 'segment': job['segment']},
+                           output)
+            if error is None:
+                self.segments += 1
+        finally:
+            if not job.get('output') and os.path.exists(output):
+                os.remove(output)
+
+
+def main(argv=None):
+    """Entry point of a worker process."""
+    parser = argparse.ArgumentParser(
+        description='encodes video segments for a SegmentCoordinator')
+    parser.add_argument('address', help='host:port or path of a '
+                                        'unix socket of the coordinator')
+    parser.add_argument('--name', help='name of the worker, the '
+                                       'host name by default')
+    parser.add_argument('--threads', type=int,
+                        help='-threads of each ffmpeg')
+    parser.add_argument('--work-dir', help='directory of the segments')
+    args = parser.parse_args(argv)
+    worker = SegmentWorker(parse_address(args.address), args.name,
+                           args.threads, args.work_dir)
+    worker.run()
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
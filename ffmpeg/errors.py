@@ -0,0 +1,207 @@
+"""Catalogue of the fatal messages which ffmpeg
+writes to stderr and the exceptions raised for them"""
+from .base import FFMpegError
+
+
+# base class of the errors in the catalogue; the named
+# groups of the pattern which matched the line, e.g. path
+# or encoder, become attributes of the exception
+class FFMpegFatalError(Exception):
+
+    def __init__(self, msg, **details):
+        super(FFMpegFatalError, self).__init__(msg)
+        self.msg = msg
+        self.details = details
+        for key, value in details.items():
+            setattr(self, key, value)
+
+    def __repr__(self):
+        return '%s' % self.msg
+
+    def __str__(self):
+        return self.__repr__()
+
+
+class NoSuchFileError(FFMpegFatalError):
+    pass
+
+
+class PermissionDeniedError(FFMpegFatalError):
+    pass
+
+
+class InvalidDataError(FFMpegFatalError):
+    pass
+
+
+class InvalidArgumentError(FFMpegFatalError):
+    pass
+
+
+class InputOutputError(FFMpegFatalError):
+    pass
+
+
+class ProtocolNotFoundError(FFMpegFatalError):
+    pass
+
+
+class NetworkError(FFMpegFatalError):
+    pass
+
+
+class UnknownFormatError(FFMpegFatalError):
+    pass
+
+
+class UnknownCodecError(FFMpegFatalError):
+    pass
+
+
+class UnknownEncoderError(UnknownCodecError):
+    pass
+
+
+class UnknownDecoderError(UnknownCodecError):
+    pass
+
+
+class EncoderOpenError(FFMpegFatalError):
+    pass
+
+
+class UnrecognizedOptionError(FFMpegFatalError):
+    pass
+
+
+class StreamMapError(FFMpegFatalError):
+    pass
+
+
+class FilterGraphError(FFMpegFatalError):
+    pass
+
+
+class OutputError(FFMpegFatalError):
+    pass
+
+
+class OutOfMemoryError(FFMpegFatalError):
+    pass
+
+
+class ConversionFailedError(FFMpegFatalError):
+    pass
+
+
+# the fatal messages of ffmpeg; ffmpeg prefixes most of
+# them with the file name or with the context, like
+# [mp4 @ 0x7f9a], so the patterns are searched in the line.
+# the name of each error is literal text of the message,
+# base.ErrorMatcher looks for the names first and only runs
+# the pattern of an error whose name is in the line.
+# Conversion failed! is written after the specific message,
+# it is only reached when nothing more specific matched
+#
+# ffmpeg writes some of the messages of a file it could not
+# open for a damaged packet too, after "Error while decoding
+# stream #0:1: ", "Decoding error: " (ffmpeg 7) or a context
+# like [h264 @ 0x55d0]; it skips the packet and goes on, so
+# only the prefix of a file which could not be opened makes
+# them fatal: "test.mp4: " or, in ffmpeg 7, "[in#0 @ 0x55d0]
+# Error opening input: " whose file is named on the next line
+OPEN_FAILED = (r'^(?:\[in#\d+ @ 0x[0-9a-f]+\] Error opening input|'
+               r'(?!Error while decoding |Decoding error|'
+               r'\[[^\]]* @ 0x[0-9a-f]+\] )(?P<path>.+?)): ')
+
+FATAL_ERRORS = [
+    # files, protocols and devices
+    FFMpegError('No such file or directory', NoSuchFileError,
+                pattern=r'^(?P<path>.+?): No such file or directory'),
+    FFMpegError('Permission denied', PermissionDeniedError,
+                pattern=r'^(?P<path>.+?): Permission denied'),
+    FFMpegError('Invalid data found when processing input', InvalidDataError,
+                pattern=OPEN_FAILED + r'Invalid data found when '
+                                      r'processing input'),
+    FFMpegError('moov atom not found', InvalidDataError,
+                pattern=r'moov atom not found'),
+    FFMpegError('Invalid argument', InvalidArgumentError,
+                pattern=OPEN_FAILED + r'Invalid argument'),
+    FFMpegError('Input/output error', InputOutputError,
+                pattern=r'^(?P<path>.+?): Input/output error'),
+    FFMpegError('Protocol not found', ProtocolNotFoundError,
+                pattern=r'^(?P<path>.+?): Protocol not found'),
+    FFMpegError('Server returned', NetworkError,
+                pattern=r'Server returned (?P<status>[45]\d\d.*)'),
+    FFMpegError('Connection refused', NetworkError,
+                pattern=r'^(?P<path>.+?): Connection refused'),
+    FFMpegError('Connection timed out', NetworkError,
+                pattern=r'^(?P<path>.+?): Connection timed out'),
+    # formats
+    FFMpegError('Unable to find a suitable output format', UnknownFormatError,
+                pattern=r"Unable to find a suitable output format for "
+                        r"'(?P<path>[^']+)'"),
+    FFMpegError('Unknown input format', UnknownFormatError,
+                pattern=r"Unknown input format: '(?P<format>[^']+)'"),
+    FFMpegError('is not a suitable output format', UnknownFormatError,
+                pattern=r"Requested output format '(?P<format>[^']+)' "
+                        r"is not a suitable output format"),
+    # codecs
+    FFMpegError('Unknown encoder', UnknownEncoderError,
+                pattern=r"Unknown encoder '(?P<encoder>[^']+)'"),
+    FFMpegError('Unknown decoder', UnknownDecoderError,
+                pattern=r"Unknown decoder '(?P<decoder>[^']+)'"),
+    FFMpegError('Decoder (codec', UnknownDecoderError,
+                pattern=r'Decoder \(codec (?P<decoder>\w+)\) not found'),
+    FFMpegError('is not recognized', UnknownCodecError,
+                pattern=r"Codec '(?P<codec>[^']+)' is not recognized"),
+    FFMpegError('Error while opening encoder', EncoderOpenError,
+                pattern=r'Error while opening encoder(?: for output '
+                        r'stream #(?P<stream>[\d:]+))?'),
+    FFMpegError('Error initializing output stream', EncoderOpenError,
+                pattern=r'Error initializing output stream '
+                        r'#?(?P<stream>[\d:]+)'),
+    # options and stream selection
+    FFMpegError('Unrecognized option', UnrecognizedOptionError,
+                pattern=r"Unrecognized option '(?P<option>[^']+)'"),
+    FFMpegError(' not found', UnrecognizedOptionError,
+                pattern=r'^Option (?P<option>\S+) not found'),
+    FFMpegError('matches no streams', StreamMapError,
+                pattern=r"Stream map '(?P<stream>[^']*)' matches no streams"),
+    FFMpegError('Invalid stream specifier', StreamMapError,
+                pattern=r'Invalid stream specifier: (?P<stream>\S+)'),
+    # filters
+    FFMpegError('No such filter', FilterGraphError,
+                pattern=r"No such filter: '(?P<filter>[^']+)'"),
+    FFMpegError('has an unconnected output', FilterGraphError,
+                pattern=r'Filter (?P<filter>\S+) has an unconnected output'),
+    FFMpegError('does not exist in any defined filter graph', FilterGraphError,
+                pattern=r"Output with label '(?P<label>[^']+)' does not "
+                        r"exist in any defined filter graph"),
+    FFMpegError('Error while filtering', FilterGraphError,
+                pattern=r'^Error while filtering'),
+    FFMpegError('Error initializing complex filters', FilterGraphError,
+                pattern=r'^Error initializing complex filters'),
+    FFMpegError('Error initializing filter', FilterGraphError,
+                pattern=r"Error initializing filter '(?P<filter>[^']+)'"),
+    FFMpegError('Error reinitializing filters', FilterGraphError,
+                pattern=r'^Error reinitializing filters'),
+    FFMpegError('Error configuring filter', FilterGraphError,
+                pattern=r'Error configuring (?:the )?filter'),
+    # outputs
+    FFMpegError('At least one output file must be specified', OutputError,
+                pattern=r'^At least one output file must be specified'),
+    FFMpegError('does not contain any stream', OutputError,
+                pattern=r'^Output file #(?P<output>\d+) does not contain '
+                        r'any stream'),
+    FFMpegError('Could not write header', OutputError,
+                pattern=r'Could not write header for output file '
+                        r'#(?P<output>\d+)'),
+    FFMpegError('Too many packets buffered', OutputError,
+                pattern=r'Too many packets buffered for output stream '
+                        r'#?(?P<stream>[\d:]+)'),
+    FFMpegError('Cannot allocate memory', OutOfMemoryError,
+                pattern=OPEN_FAILED + r'Cannot allocate memory'),
+    FFMpegError('Conversion failed!', ConversionFailedError,
+                pattern=r'^Conversion failed!'),
+]
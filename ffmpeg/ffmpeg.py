@@ -1,8 +1,30 @@
-from base import Base, BasicParser
+import sys
+import threading
+from .base import Base, BasicParser
+from .progress import ProgressStopped
+from .errors import FATAL_ERRORS
+
+try:
+    from queue import Queue, Full
+except ImportError:  # python 2
+    from Queue import Queue, Full
+
+
+# options of ffmpeg which take no value, the others take
+# one; BaseFFMpeg._output_indexes tells the outputs by them
+FLAG_OPTIONS = frozenset([
+    '-y', '-n', '-an', '-vn', '-sn', '-dn', '-re', '-shortest',
+    '-stats', '-nostats', '-stdin', '-nostdin', '-hide_banner',
+    '-copyts', '-start_at_zero', '-accurate_seek', '-noaccurate_seek',
+    '-autorotate', '-noautorotate', '-autoscale', '-noautoscale',
+    '-benchmark', '-benchmark_all', '-dump', '-hex', '-xerror',
+    '-ignore_unknown', '-copy_unknown', '-debug_ts', '-psnr', '-vstats',
+    '-find_stream_info', '-nofind_stream_info', '-bitexact'])
 
 
 class BasicFFMpegParser(BasicParser):
     parse_exec = 'ffmpeg'
+    errors = FATAL_ERRORS  # fatal messages of every ffmpeg run
 
 
 class BaseFFMpeg(Base):
@@ -13,6 +35,19 @@ class BaseFFMpeg(Base):
     codec_type = None
     lib_type = None
     exec_name = 'ffmpeg'
+    # progress records are dropped when they come sooner
+    # than progress_interval seconds after the previous one;
+    # stats_period makes ffmpeg itself write them less often,
+    # the -stats_period option needs ffmpeg 4.4 or newer
+    progress_interval = 0.0
+    stats_period = None
+    progress_queue_size = 64  # records buffered by iter_progress
+    # threads ffmpeg may use for decoding and encoding and
+    # for the filters, None leaves the choice to ffmpeg which
+    # starts about one thread per core; scheduler.JobScheduler
+    # sets them on the wrapper of each job it runs
+    threads = None
+    filter_threads = None
 
     # TODO create a represenation method for dev
     # thing is that we can do in base subclass
@@ -37,3 +72,191 @@ class BaseFFMpeg(Base):
             return None
 
         return True
+
+    def _run(self, cmds, progress=None):
+        """Spawns ffmpeg with cmds and parses its
+        output until it finishes; progress is a
+        callable which gets ffmpeg.progress.Progress
+        records, ffmpeg is then run with -progress."""
+        cmds = self._thread_cmds(cmds)
+        if progress is not None:
+            cmds = self._progress_cmds() + cmds
+        p = self._spawn(cmds)  # spawn child process
+        _parser = self.parser(p)  # p goes in __init__
+        _parser.verbose = self.verbose
+        _parser.progress_interval = self.progress_interval
+        _parser.parse_output(progress)  # parses each line
+
+        return _parser.status_finished  # status of process
+
+    def _progress_cmds(self):
+        # ffmpeg writes the key=value progress blocks to
+        # stderr, next to its log; -nostats drops the
+        # human readable stats line which they replace
+        _cmds = ['-progress', 'pipe:2', '-nostats']
+        if self.stats_period is not None:
+            _cmds.extend(['-stats_period', str(self.stats_period)])
+
+        return _cmds
+
+    def _thread_cmds(self, cmds):
+        # -threads is an option of each file, it is put before
+        # every input and before every output, commands like
+        # the ones of encode_ladder have many of them
+        if self.threads is not None:
+            threads = ['-threads', str(self.threads)]
+            inputs, outputs = self._file_indexes(cmds)
+            _cmds = []
+            for i, cmd in enumerate(cmds):
+                if i in inputs or i in outputs:
+                    _cmds.extend(threads)
+                _cmds.append(cmd)
+            cmds = _cmds
+        if self.filter_threads is not None:
+            # global options, they go in front
+            cmds = ['-filter_threads', str(self.filter_threads),
+                    '-filter_complex_threads',
+                    str(self.filter_threads)] + cmds
+
+        return cmds
+
+    @staticmethod
+    def _file_indexes(cmds):
+        # indexes of the -i of each input and of each output
+        # in cmds; an output is an argument which is neither
+        # an option nor the value of one, options take a value
+        # but the ones of FLAG_OPTIONS
+        inputs, outputs = set(), set()
+        i = 0
+        while i < len(cmds):
+            cmd = str(cmds[i])
+            if cmd.startswith('-') and len(cmd) > 1:
+                if cmd == '-i':
+                    inputs.add(i)
+                i += 1 if cmd.split(':')[0] in FLAG_OPTIONS else 2
+            else:
+                outputs.add(i)
+                i += 1
+
+        return inputs, outputs
+
+    def _iter_raw(self, cmds, blocks):
+        """Spawns ffmpeg with cmds, which write raw data
+        to pipe:1, and reads the data into the numpy arrays
+        given by the iterator blocks, one after the other;
+        yields (block, rows) for each of them, rows is the
+        number of whole rows of the block which were read.
+        It stops after the first block which is not full."""
+        p = self._spawn(self._thread_cmds(cmds))
+        # errors of the log are raised once the data stops
+        worker, errors = self._parse_in_background(p)
+        try:
+            for block in blocks:
+                rows = self._read_into(p.stdout, block)
+                if rows:
+                    yield block, rows
+                if rows < len(block):  # end of the data
+                    break
+        finally:
+            # the caller may stop before the end
+            if p.poll() is None:
+                p.terminate()
+            p.stdout.close()
+            worker.join()
+            p.wait()
+        if errors:
+            raise errors[0]
+
+    def _parse_in_background(self, p, progress=None):
+        """Parses the log of the child process p on a thread
+        of its own, for the methods which use its stdin or
+        stdout meanwhile; stderr has to be read while they
+        are, else ffmpeg waits on a full pipe. Returns the
+        thread and the list which gets the error raised by
+        the parser, if any."""
+        _parser = self.parser(p)
+        _parser.verbose = self.verbose
+        _parser.progress_interval = self.progress_interval
+        errors = []
+
+        def parse():
+            try:
+                _parser.parse_output(progress)
+            except Exception as e:
+                errors.append(e)
+
+        worker = threading.Thread(target=parse)
+        worker.daemon = True
+        worker.start()
+
+        return worker, errors
+
+    @staticmethod
+    def _read_into(stream, block):
+        # fills block, a numpy array, from stream and
+        # returns the number of whole rows read into it
+        view = memoryview(block.reshape(-1).view('uint8'))
+        size = len(view)
+        filled = 0
+        while filled < size:
+            n = stream.readinto(view[filled:])
+            if not n:  # end of file
+                break
+            filled += n
+
+        return filled // (size // len(block)) if size else 0
+
+    def iter_progress(self, method, *args, **kwargs):
+        """Runs one of the methods of this object, e.g.
+        self.convert_video, and yields its progress
+        records while ffmpeg is running; errors raised
+        by the method are raised by the iterator.
+
+        for record in v.iter_progress(v.convert_video,
+                                      'in.mp4', 'out.avi'):
+            print(record.frame, record.speed)
+        """
+        records = Queue(self.progress_queue_size)
+        finished = object()  # marks the end of the records
+        stopped = threading.Event()  # set when the caller stops
+
+        # the queue is bounded, when the caller reads slower
+        # than the records come, the parser waits in here and
+        # ffmpeg waits on its full stderr pipe
+        def put(item):
+            while not stopped.is_set():
+                try:
+                    records.put(item, timeout=0.1)
+                    return True
+                except Full:
+                    pass
+            return False
+
+        def put_record(record):
+            if not put(record):
+                # the caller stopped reading, raising in here
+                # stops the parser and it terminates ffmpeg
+                raise ProgressStopped('progress iterator closed')
+
+        def run():
+            try:
+                method(*args, progress=put_record, **kwargs)
+            except BaseException:
+                put((finished, sys.exc_info()[1]))
+            else:
+                put((finished, None))
+
+        worker = threading.Thread(target=run)
+        worker.daemon = True
+        worker.start()
+        try:
+            while True:
+                record = records.get()
+                if isinstance(record, tuple) and record[0] is finished:
+                    if record[1] is not None:
+                        raise record[1]
+                    break
+                yield record
+        finally:
+            stopped.set()
+            worker.join()
@@ -1,6 +1,6 @@
 """Wrapper for the ffplay tool of the
 ffmpeg multimedia framework"""
-from base import Base
+from .base import Base
 
 
 class FFPlay(Base):
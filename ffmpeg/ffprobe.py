@@ -1,5 +1,27 @@
 """Wrapper for the ffprobe utility"""
-from base import Base, BasicParser, MediaInfo
+import json
+import threading
+from collections import deque
+from .base import Base, BasicParser, MediaInfo
+from .cache import ProbeCache
+from .index import PacketIndex, PacketIndexBuilder
+from .utils import file_identity, READ_CHUNK_SIZE
+
+
+# raised when ffprobe can not probe the input,
+# msg is what ffprobe wrote to stderr
+class ProbeFailedError(Exception):
+
+    def __init__(self, msg, media_input):
+        super(ProbeFailedError, self).__init__(msg)
+        self.msg = msg
+        self.media_input = media_input
+
+    def __repr__(self):
+        return '%s: %s' % (self.media_input, self.msg)
+
+    def __str__(self):
+        return self.__repr__()
 
 
 class FFprobeParser(BasicParser):
@@ -16,6 +38,23 @@ class FFprobeParser(BasicParser):
 
         return media_info
 
+    def parse_ffprobe_json(self):
+        """Parses the output of ffprobe -print_format json;
+        the whole output is read at once and decoded with
+        a single json.loads. Raises ValueError when the
+        output is not json."""
+        stdout, stderr = self.child_p.communicate()  # one buffered read
+        self.returncode = self.child_p.returncode
+        self.status_finished = True
+        self.error_output = stderr  # ffprobe -v error messages
+        if self.returncode != 0:
+            return None
+        data = json.loads(stdout.decode('utf-8', 'replace'))
+        media_info = MediaInfo()  # ffmpeg.base.MediaInfo
+        media_info.parse_ffprobe_json(data)
+
+        return media_info
+
 
 class BasicFFProbe(Base):
     """Class to package the ffprobe
@@ -24,18 +63,226 @@ class BasicFFProbe(Base):
     parser = FFprobeParser  # parser of child processes
     exec_name = 'ffprobe'  # why do we need this?
 
+    # json is the fastest output to parse and keeps
+    # every key, the default output is the fallback
+    print_format = 'json'
+    # cache.ProbeCache shared by all the instances, e.g. by
+    # the ones VideoFFMpeg creates; BasicFFProbe.cache =
+    # ProbeCache(path='probe.db') keeps results on disk,
+    # BasicFFProbe.cache = None probes every time
+    cache = ProbeCache()
+
     def probe(self, video_input):
         """Method to probe media with
         the help of the ffprobe tool
-        which comes with ffmpeg framework"""
-        _cmds = ['-show_format', '-show_streams',
-                 video_input]
+        which comes with ffmpeg framework;
+        returns None if ffprobe fails"""
+        try:
+            return self._probe(video_input)
+        except ProbeFailedError:
+            return None
+
+    def probe_many(self, paths, max_workers=4, ordered=False,
+                   chunk_size=None):
+        """Probes many files with at most max_workers ffprobe
+        processes running at once; yields (path, result) as
+        each probe finishes, result is a MediaInfo or the
+        exception raised for that file, e.g. ProbeFailedError.
+        :param paths: iterable of paths, read lazily
+        :param max_workers: ffprobe processes running at once
+        :param ordered: yield in the order of paths
+        :param chunk_size: probes submitted but not yielded yet,
+        bounds the memory for huge path lists, max_workers * 4
+        by default
+        """
+        # imported here, concurrent.futures imports logging
+        # which the single probes do not need
+        from concurrent.futures import ThreadPoolExecutor, wait, \
+            FIRST_COMPLETED
+        if chunk_size is None:
+            chunk_size = max_workers * 4
+        chunk_size = max(chunk_size, max_workers)
+        paths = iter(paths)
+        pending = deque()  # (path, future) in the order of paths
+
+        def submit(executor):
+            # submit the next path, False when there are no more
+            for path in paths:
+                pending.append((path, executor.submit(self._probe, path)))
+                return True
+            return False
+
+        def result(path, future):
+            try:
+                return path, future.result()
+            except Exception as e:  # the error stays with its file
+                return path, e
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            while len(pending) < chunk_size and submit(executor):
+                pass
+            while pending:
+                if ordered:
+                    # the window moves when its first probe is done
+                    path, future = pending.popleft()
+                    yield result(path, future)
+                else:
+                    done, _ = wait([future for _, future in pending],
+                                   return_when=FIRST_COMPLETED)
+                    for item in [item for item in pending
+                                 if item[1] in done]:
+                        pending.remove(item)
+                        yield result(*item)
+                while len(pending) < chunk_size and submit(executor):
+                    pass
+
+    def _probe(self, video_input):
+        # returns ffmpeg.base.MediaInfo or raises
+        # ProbeFailedError with the message of ffprobe;
+        # a file probed before is answered by the cache
+        # without spawning ffprobe
+        cache_key, info = self._cache_lookup(video_input)
+        if info is not None:
+            return self._with_catalog(info)
+        info = self._spawn_probe(video_input)
+        if cache_key is not None:
+            self.cache.set(cache_key, info)
+
+        return self._with_catalog(info)
+
+    def _with_catalog(self, info):
+        # StreamInfo.codec finds its Codec in the codec
+        # catalog of this build of ffprobe, it is only
+        # built when a codec is asked for
+        for stream in info.streams:
+            if stream.catalog_source is None:
+                stream.catalog_source = self
+
+        return info
+
+    def _cache_lookup(self, video_input):
+        # returns the cache key of video_input and the
+        # cached MediaInfo, None for what is not known
+        if self.cache is None:
+            return None, None
+        cache_key = self.cache.key(video_input, self.executable)
+        if cache_key is None:
+            return None, None
+
+        return cache_key, self.cache.get(cache_key)
+
+    def _probe_cmds(self, video_input, print_format):
+        if print_format == 'json':
+            return ['-v', 'error', '-print_format', 'json',
+                    '-show_format', '-show_streams',
+                    '-show_chapters', video_input]
+
+        return ['-show_format', '-show_streams',
+                '-show_chapters', video_input]
+
+    def _spawn_probe(self, video_input):
+        if self.print_format == 'json':
+            _cmds = self._probe_cmds(video_input, 'json')
+            p = self._spawn(_cmds)  # create child process
+            _parser = self.parser(p)  # self.parser = FFprobeParser
+            try:
+                info = _parser.parse_ffprobe_json()
+            except ValueError:  # not json, parse the default output
+                info = self._probe_text(video_input)
+            if info is None:
+                raise ProbeFailedError(self._probe_error(_parser.error_output),
+                                       video_input)
+            return info  # return ffmpeg.base.MediaInfo obj to caller
+
+        return self._probe_text(video_input)
+
+    def _probe_text(self, video_input):
+        _cmds = self._probe_cmds(video_input, 'default')
         p = self._spawn(_cmds)  # create child process
-        codecs = self.codecs  # ?
         _parser = self.parser(p)  # self.parser = FFprobeParser
         info = _parser.parse_ffprobe()  # ffmpeg.base.MediaInfo
+        if _parser.returncode != 0:
+            raise ProbeFailedError(self._probe_error(p.stderr.read()),
+                                   video_input)
+
+        return info
+
+    def build_index(self, video_input, index_path=None, rebuild=False):
+        """Returns the index.PacketIndex of the packets of
+        video_input: pts, dts, size, pos and flags of each
+        packet of each stream, and the keyframes. ffprobe
+        only reads the packets, nothing is decoded.
+
+        The index is kept in the sidecar file index_path,
+        video_input + '.pktidx' by default, and is read from
+        it, memory-mapped, while video_input is unchanged;
+        rebuild=True reads the packets again. An index which
+        can not be written is returned all the same.
+        """
+        index_path, identity, index = self._load_index(
+            video_input, index_path, rebuild)
+        if index is not None:
+            return index
+
+        builder = self._index_builder(self._probe(video_input))
+        p = self._spawn(self._index_cmds(video_input))
+        # stderr is read on a thread, corrupt files fill it
+        # with errors while the packets come on stdout
+        errors = []
+        reader = threading.Thread(target=lambda: errors.append(
+            p.stderr.read()))
+        reader.daemon = True
+        reader.start()
+        for chunk in iter(lambda: p.stdout.read(READ_CHUNK_SIZE), b''):
+            builder.feed(chunk)
+        reader.join()
+        if p.wait() != 0:
+            raise ProbeFailedError(self._probe_error(errors[0]),
+                                   video_input)
+        return self._save_index(builder.build(identity), index_path)
+
+    @staticmethod
+    def _load_index(video_input, index_path, rebuild):
+        # returns the path and identity of the sidecar of
+        # video_input, and its index when it is up to date
+        if index_path is None:
+            index_path = video_input + '.pktidx'
+        identity = file_identity(video_input)
+        index = None
+        if not rebuild and identity is not None:
+            index = PacketIndex.load(index_path, identity)
+
+        return index_path, identity, index
+
+    @staticmethod
+    def _index_builder(info):
+        return PacketIndexBuilder(dict(
+            (stream.index, (stream.codec_type, stream.time_base))
+            for stream in info.streams))
+
+    @staticmethod
+    def _save_index(index, index_path):
+        try:
+            index.save(index_path)
+        except (IOError, OSError):  # e.g. read-only directory
+            pass
+
+        return index
+
+    def _index_cmds(self, video_input):
+        # the csv columns come in the order of ffprobe,
+        # stream_index, pts, dts, size, pos and flags
+        return ['-v', 'error', '-show_entries',
+                'packet=stream_index,pts,dts,size,pos,flags',
+                '-print_format', 'csv=p=0', video_input]
 
-        return info  # return ffmpeg.base.MediaInfo obj to caller
+    @staticmethod
+    def _probe_error(error_output):
+        # last line ffprobe wrote to stderr, e.g.
+        # test.mp4: No such file or directory
+        lines = (error_output or b'').decode('utf-8', 'replace')
+        lines = lines.strip().splitlines()
+        return lines[-1] if lines else 'ffprobe failed'
 
     def test_func(self):
         pass
@@ -0,0 +1,321 @@
+"""Index of the packets of a media file, built from
+ffprobe -show_packets; the columns of each stream are
+arrays, kept in a sidecar file which is memory-mapped
+when it is read again"""
+import bisect
+import json
+import mmap
+import os
+import struct
+import sys
+import tempfile
+from array import array
+from collections import namedtuple
+from fractions import Fraction
+
+# format of the sidecar files, files written with
+# another format are ignored and built again
+INDEX_FORMAT = 1
+
+# the sidecar starts with MAGIC and the length of the
+# json header, the columns follow, 8 bytes aligned
+MAGIC = b'PYFFPKIX'
+_header_struct = struct.Struct('<8sQ')
+
+# pts, dts or pos which ffprobe printed as N/A,
+# the AV_NOPTS_VALUE of ffmpeg
+NOPTS = -(2 ** 63)
+
+# bits of the flags column
+PACKET_KEY = 1
+PACKET_DISCARD = 2
+PACKET_CORRUPT = 4
+
+# column -> typecode of its array
+COLUMNS = (('pts', 'q'), ('dts', 'q'), ('size', 'i'),
+           ('pos', 'q'), ('flags', 'B'))
+
+# statistics of a group of pictures, from a keyframe to
+# the next one; seconds, bytes and bits per second
+GOP = namedtuple('GOP', 'start duration size bit_rate')
+
+
+class StreamPackets(object):
+    """The packets of a stream in decode order, one array
+    or memoryview per column (pts, dts, size, pos, flags),
+    e.g. numpy.frombuffer(packets.pts, 'int64') makes an
+    array of the pts without a copy. key_pts and key_index
+    are the pts and the packet of each keyframe, sorted."""
+
+    def __init__(self, index, codec_type, time_base, columns,
+                 key_pts, key_index):
+        self.index = index  # index of the stream in the file
+        self.codec_type = codec_type
+        self.time_base = time_base  # Fraction, seconds per pts
+        self.pts, self.dts, self.size, self.pos, self.flags = \
+            [columns[name] for name, _ in COLUMNS]
+        self.key_pts = key_pts
+        self.key_index = key_index
+
+    def __repr__(self):
+        return '%s(%d, %s, %d packets)' % (
+            self.__class__.__name__, self.index, self.codec_type,
+            len(self))
+
+    def __len__(self):
+        return len(self.pts)
+
+    def _to_pts(self, t):
+        # exact, the pts are compared with a Fraction
+        return Fraction(t) / self.time_base
+
+    def _to_seconds(self, pts):
+        return float(pts * self.time_base)
+
+    def keyframes(self):
+        """Times of the keyframes in seconds."""
+        return [self._to_seconds(pts) for pts in self.key_pts]
+
+    def previous_keyframe(self, t):
+        """Time in seconds of the last keyframe at or
+        before t, None when there is none."""
+        i = bisect.bisect_right(self.key_pts, self._to_pts(t)) - 1
+        if i < 0:
+            return None
+
+        return self._to_seconds(self.key_pts[i])
+
+    def next_keyframe(self, t):
+        """Time in seconds of the first keyframe at or
+        after t, None when there is none."""
+        i = bisect.bisect_left(self.key_pts, self._to_pts(t))
+        if i == len(self.key_pts):
+            return None
+
+        return self._to_seconds(self.key_pts[i])
+
+    def keyframe_pos(self, t):
+        """Byte position in the file of the last keyframe
+        at or before t, None when it is not known."""
+        i = bisect.bisect_right(self.key_pts, self._to_pts(t)) - 1
+        if i < 0 or self.pos[self.key_index[i]] == NOPTS:
+            return None
+
+        return self.pos[self.key_index[i]]
+
+    def gop_stats(self):
+        """Returns a GOP record for each keyframe; the
+        duration of the last one ends with the last pts,
+        bit_rate is None when the duration is unknown."""
+        stats = []
+        keys = sorted(self.key_index)
+        ends = keys[1:] + [len(self)]
+        for first, end in zip(keys, ends):
+            start = self.pts[first]
+            if end < len(self):
+                stop = self.pts[end]
+            else:  # last pts of the stream
+                stop = max(pts for pts in self.pts[first:end]
+                           if pts != NOPTS) if end > first else start
+            size = sum(self.size[first:end])
+            duration = self._to_seconds(stop - start) if \
+                NOPTS not in (start, stop) else None
+            bit_rate = size * 8 / duration if duration else None
+            stats.append(GOP(self._to_seconds(start) if start != NOPTS
+                             else None, duration, size, bit_rate))
+
+        return stats
+
+
+class PacketIndex(object):
+    """The StreamPackets of the streams of a media file
+    by stream index; identity is the one of the file when
+    the index was built, see utils.file_identity."""
+
+    def __init__(self, streams, identity=None):
+        self.streams = streams  # stream index -> StreamPackets
+        self.identity = identity
+        self._mmap = None  # the sidecar when loaded from it
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__,
+                           sorted(self.streams.values(),
+                                  key=lambda s: s.index))
+
+    def __getitem__(self, stream_index):
+        return self.streams[stream_index]
+
+    def __iter__(self):
+        return iter(sorted(self.streams.values(), key=lambda s: s.index))
+
+    @property
+    def video(self):
+        """StreamPackets of the first video stream."""
+        for stream in self:
+            if stream.codec_type == 'video':
+                return stream
+
+        return None
+
+    def previous_keyframe(self, t):
+        """Last keyframe at or before t in the first
+        video stream, in seconds."""
+        return self.video.previous_keyframe(t)
+
+    def next_keyframe(self, t):
+        """First keyframe at or after t in the first
+        video stream, in seconds."""
+        return self.video.next_keyframe(t)
+
+    def close(self):
+        """Unmaps the sidecar, the columns can not be
+        read afterwards."""
+        if self._mmap is not None:
+            for stream in self.streams.values():
+                for name in ('pts', 'dts', 'size', 'pos', 'flags',
+                             'key_pts', 'key_index'):
+                    getattr(stream, name).release()
+            self._mmap.close()
+            self._mmap = None
+
+    def save(self, path):
+        """Writes the index to the sidecar path, aside
+        and renamed so readers never see half of it."""
+        header = {'format': INDEX_FORMAT, 'byteorder': sys.byteorder,
+                  'identity': list(self.identity or ()), 'streams': []}
+        chunks = []
+        offset = 0
+        for stream in self:
+            layout = {}
+            named = [(name, typecode, getattr(stream, name))
+                     for name, typecode in COLUMNS]
+            named += [('key_pts', 'q', stream.key_pts),
+                      ('key_index', 'q', stream.key_index)]
+            for name, typecode, column in named:
+                data = memoryview(column).cast('B').tobytes()
+                layout[name] = [offset, typecode, len(column)]
+                padding = -len(data) % 8
+                chunks.append(data + b'\0' * padding)
+                offset += len(data) + padding
+            header['streams'].append({
+                'index': stream.index, 'codec_type': stream.codec_type,
+                'time_base': [stream.time_base.numerator,
+                              stream.time_base.denominator],
+                'columns': layout})
+        header_data = json.dumps(header).encode('utf-8')
+        header_data += b' ' * (-len(header_data) % 8)
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(_header_struct.pack(MAGIC, len(header_data)))
+                f.write(header_data)
+                for chunk in chunks:
+                    f.write(chunk)
+            replace = getattr(os, 'replace', os.rename)  # python 2
+            replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path, identity=None):
+        """Maps the sidecar path; returns None when it is
+        missing, broken, of another format or of a file
+        whose identity is not identity."""
+        try:
+            with open(path, 'rb') as f:
+                mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (IOError, OSError, ValueError):  # missing or empty
+            return None
+        try:
+            magic, length = _header_struct.unpack_from(mapped, 0)
+            start = _header_struct.size
+            header = json.loads(mapped[start:start + length].decode('utf-8'))
+        except (struct.error, ValueError):
+            mapped.close()
+            return None
+        if (magic != MAGIC or header.get('format') != INDEX_FORMAT or
+                header.get('byteorder') != sys.byteorder or
+                (identity is not None and
+                 header.get('identity') != list(identity))):
+            mapped.close()
+            return None
+        data = memoryview(mapped)
+        base = start + length
+        streams = {}
+        for stream in header['streams']:
+            columns = {}
+            for name, (offset, typecode, count) in \
+                    stream['columns'].items():
+                size = count * array(typecode).itemsize
+                columns[name] = data[base + offset:
+                                     base + offset + size].cast(typecode)
+            streams[stream['index']] = StreamPackets(
+                stream['index'], stream['codec_type'],
+                Fraction(*stream['time_base']), columns,
+                columns.pop('key_pts'), columns.pop('key_index'))
+        data.release()
+        index = cls(streams, tuple(header['identity']) or None)
+        index._mmap = mapped
+
+        return index
+
+
+class PacketIndexBuilder(object):
+    """Builds the columns of the streams from the lines
+    of ffprobe -show_entries packet=stream_index,pts,dts,
+    size,pos,flags -of csv=p=0, fed as bytes in chunks."""
+
+    def __init__(self, streams):
+        # stream index -> (codec_type, time_base) of the
+        # streams of the file, given by the probe
+        self.stream_info = streams
+        self._columns = {}  # stream index -> [arrays]
+        self._tail = b''  # unfinished line of the last chunk
+
+    def feed(self, chunk):
+        lines = (self._tail + chunk).split(b'\n')
+        self._tail = lines.pop()
+        for line in lines:
+            self._add(line)
+
+    def _add(self, line):
+        # e.g. 0,2048,-512,632,3580,K__ ; packets with side
+        # data end with a comma and an empty line
+        fields = line.rstrip(b'\r,').split(b',')
+        if len(fields) < 6:
+            return
+        stream_index, pts, dts, size, pos, flags = fields[:6]
+        stream_index = int(stream_index)
+        columns = self._columns.get(stream_index)
+        if columns is None:
+            columns = [array(typecode) for _, typecode in COLUMNS]
+            self._columns[stream_index] = columns
+        columns[0].append(int(pts) if pts != b'N/A' else NOPTS)
+        columns[1].append(int(dts) if dts != b'N/A' else NOPTS)
+        columns[2].append(int(size))
+        columns[3].append(int(pos) if pos != b'N/A' else NOPTS)
+        columns[4].append((PACKET_KEY if flags[:1] == b'K' else 0) |
+                          (PACKET_DISCARD if flags[1:2] == b'D' else 0) |
+                          (PACKET_CORRUPT if flags[2:3] == b'C' else 0))
+
+    def build(self, identity=None):
+        """Returns the PacketIndex of the lines fed."""
+        if self._tail:
+            self._add(self._tail)
+            self._tail = b''
+        streams = {}
+        for stream_index, columns in self._columns.items():
+            codec_type, time_base = self.stream_info.get(
+                stream_index, (None, Fraction(1, 1)))
+            pts, flags = columns[0], columns[4]
+            keys = sorted((pts[i], i) for i in range(len(flags))
+                          if flags[i] & PACKET_KEY and pts[i] != NOPTS)
+            streams[stream_index] = StreamPackets(
+                stream_index, codec_type, time_base,
+                dict(zip([name for name, _ in COLUMNS], columns)),
+                array('q', [key[0] for key in keys]),
+                array('q', [key[1] for key in keys]))
+
+        return PacketIndex(streams, identity)
@@ -0,0 +1,110 @@
+"""Parsing of the machine readable progress
+which ffmpeg writes with the -progress option"""
+import re
+import time
+
+
+# a line of the -progress output, e.g. out_time_us=1000000;
+# normal ffmpeg log lines never look like key=value
+_progress_regex = re.compile(r'^([a-z][a-z0-9_]*)=(\S*)\s*$')
+
+
+# ffmpeg writes N/A for the values it does not know yet
+def _to_int(value):
+    try:
+        return int(value)
+    except ValueError:
+        return None
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+# raised inside a progress callback to stop the parser,
+# e.g. when the caller of an iterator stops reading
+class ProgressStopped(Exception):
+    pass
+
+
+class Progress(object):
+    """One progress record of a running ffmpeg;
+    built from a block of key=value lines which
+    ends with progress=continue or progress=end."""
+
+    def __init__(self, values):
+        self.frame = _to_int(values.get('frame', 'N/A'))
+        self.fps = _to_float(values.get('fps', 'N/A'))
+        # bitrate comes as 1452.7kbits/s, keep kbits/s
+        self.bitrate = _to_float(values.get('bitrate', 'N/A')
+                                 .replace('kbits/s', ''))
+        self.total_size = _to_int(values.get('total_size', 'N/A'))
+        # out_time_ms is in microseconds as well, it is
+        # the only key old builds of ffmpeg write
+        self.out_time_us = _to_int(values.get('out_time_us') or
+                                   values.get('out_time_ms', 'N/A'))
+        self.out_time = values.get('out_time')  # e.g. 00:00:01.000000
+        self.dup_frames = _to_int(values.get('dup_frames', 'N/A'))
+        self.drop_frames = _to_int(values.get('drop_frames', 'N/A'))
+        self.speed = _to_float(values.get('speed', 'N/A').rstrip('x'))
+        self.progress = values.get('progress')  # continue or end
+        self.values = values  # every key of the block
+
+    def __repr__(self):
+        return '%s(frame=%s, out_time=%s, speed=%s, progress=%s)' % (
+            self.__class__.__name__, self.frame, self.out_time,
+            self.speed, self.progress)
+
+    @property
+    def finished(self):
+        """True for the last record of the process."""
+        return self.progress == 'end'
+
+    @property
+    def seconds(self):
+        """Position of the output in seconds."""
+        if self.out_time_us is None:
+            return None
+        return self.out_time_us / 1000000.0
+
+
+class ProgressParser(object):
+    """Collects the key=value lines of the
+    -progress output into Progress records;
+    records closer than interval seconds to
+    the previous one are dropped, the last
+    record (progress=end) is always kept."""
+
+    def __init__(self, interval=0.0):
+        self.interval = interval  # seconds between records
+        self._values = {}  # values of the current block
+        self._record = None  # finished record not taken yet
+        self._last_time = None  # time of the last record
+
+    def feed(self, line):
+        """Returns True if line belongs to the
+        progress output, False for other lines."""
+        match_obj = _progress_regex.match(line)
+        if match_obj is None:
+            return False
+        key, value = match_obj.groups()
+        self._values[key] = value
+        if key == 'progress':  # end of the block
+            values, self._values = self._values, {}
+            now = time.time()
+            if (value == 'end' or self._last_time is None or
+                    now - self._last_time >= self.interval):
+                self._last_time = now
+                self._record = Progress(values)
+
+        return True
+
+    def take(self):
+        """Returns the finished record, if any,
+        and forgets it."""
+        record, self._record = self._record, None
+
+        return record
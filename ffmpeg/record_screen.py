@@ -1,6 +1,6 @@
 """Module to record screen in
 Mac OS X, Windows and Linux"""
-from base import BaseFFMpeg
+from .base import BaseFFMpeg
 
 
 class FFMpegScreenRecorder(object):
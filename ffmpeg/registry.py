@@ -0,0 +1,300 @@
+"""Registry of what a build of ffmpeg supports, e.g.
+its codecs and filters; each listing is parsed once
+per build and kept on disk for the next processes"""
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from contextlib import contextmanager
+from .utils import file_identity
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+
+# format of the files on disk, files written with
+# another format are ignored and written again; 2 reads
+# the muxers of ffmpeg 7 which format 1 stored empty
+REGISTRY_FORMAT = 2
+
+
+def default_cache_dir():
+    cache_home = (os.environ.get('XDG_CACHE_HOME') or
+                  os.path.join(os.path.expanduser('~'), '.cache'))
+
+    return os.path.join(cache_home, 'pyffmpeg')
+
+
+# a line of the listings with a column of features, e.g.
+#  D.V.L. 4xm                  4X Movie
+#   E 3g2             3GP2 (3GPP2 file format)
+#   Ed alsa            ALSA audio output
+# the legend above the listing looks alike but it
+# has = in place of the name
+def _feature_regex(width):
+    return re.compile(r'^ (?P<features>[A-Za-z.| ]{%d}) '
+                      r'(?P<name>[^\s=]\S*)\s+(?P<desc>.*?)\s*$' % width)
+
+
+# a line of the legend, one per feature:  D.. = Demuxing
+# supported; the width of its flags is the one of the column
+_legend_regex = re.compile(r'^ ([A-Za-z.]+) = ')
+
+
+#  ..C acompressor       A->A       Audio compressor.
+_filter_regex = re.compile(r'^ (?P<features>[A-Z.|]{2,3}) (?P<name>\S+)\s+'
+                           r'(?P<inputs>\S*)->(?P<outputs>\S*)\s+'
+                           r'(?P<desc>.*?)\s*$')
+
+_version_regex = re.compile(r'^\S+ version (.*?)\s*$')
+
+# AliceBlue                        #f0f8ff, the header
+# of the listing is name #RRGGBB
+_color_regex = re.compile(r'^(\S+)\s+(#[0-9a-fA-F]{6})\s*$')
+
+
+# the parsers turn the output of a listing into rows of
+# strings, which go to json as they are; base.Base builds
+# the Codec, Filter, ... objects from the rows
+def parse_features(text, width=None):
+    # width of the column of features, read from the legend
+    # when it is None; it changes between builds, the muxers
+    # of ffmpeg 7 have D.. in place of D.
+    regex = None if width is None else _feature_regex(width)
+    rows = []
+    for line in text.splitlines():
+        if regex is None:
+            match_obj = _legend_regex.match(line)
+            if match_obj is not None:
+                regex = _feature_regex(len(match_obj.group(1)))
+            continue
+        match_obj = regex.match(line)
+        if match_obj is not None:
+            rows.append(list(match_obj.groups()))
+
+    return rows
+
+
+def parse_filters(text):
+    rows = []
+    for line in text.splitlines():
+        match_obj = _filter_regex.match(line)
+        if match_obj is not None:
+            rows.append(list(match_obj.groups()))
+
+    return rows
+
+
+def parse_layouts(text):
+    # two tables, the channels with their description
+    # and the layouts with the channels they are made of
+    channels = {}
+    rows = []
+    table = None
+    for line in text.splitlines():
+        if line.startswith('Individual channels'):
+            table = channels
+            continue
+        if line.startswith('Standard channel layouts'):
+            table = rows
+            continue
+        if table is None or line.startswith('NAME') or not line.strip():
+            continue
+        name, value = (line.split(None, 1) + [''])[:2]
+        if table is channels:
+            channels[name] = value.strip()
+        else:
+            names = value.strip().split('+')
+            rows.append([name, names, [channels.get(channel, '')
+                                       for channel in names]])
+
+    return rows
+
+
+def parse_colors(text):
+    rows = []
+    for line in text.splitlines():
+        match_obj = _color_regex.match(line)
+        if match_obj is not None:
+            rows.append(list(match_obj.groups()))
+
+    return rows
+
+
+def parse_version(text):
+    for line in text.splitlines():
+        match_obj = _version_regex.match(line)
+        if match_obj is not None:
+            return match_obj.group(1)
+
+    return None
+
+
+# name -> (arguments of the listing, parser of its output)
+LISTINGS = {
+    'version': (['-version'], parse_version),
+    'codecs': (['-hide_banner', '-codecs'], parse_features),
+    'encoders': (['-hide_banner', '-encoders'], parse_features),
+    'decoders': (['-hide_banner', '-decoders'], parse_features),
+    'muxers': (['-hide_banner', '-muxers'], parse_features),
+    'devices': (['-hide_banner', '-devices'], parse_features),
+    'filters': (['-hide_banner', '-filters'], parse_filters),
+    'layouts': (['-hide_banner', '-layouts'], parse_layouts),
+    'colors': (['-hide_banner', '-colors'], parse_colors),
+}
+
+
+class CapabilityRegistry(object):
+    """Keeps the parsed listings of each build of
+    ffmpeg, in memory and in one json file per build
+    under cache_dir, by default the pyffmpeg directory
+    of XDG_CACHE_HOME or ~/.cache at the time the files
+    are used; persist=False keeps them in memory only.
+
+    A build is told by the stat of its executable
+    (realpath, size, mtime, inode), so a process finds
+    the listings of a known build without spawning it,
+    the version is one of the listings. Threads asking
+    for a listing which is not known yet wait for the
+    first one to read it, processes wait on a lock file,
+    so a listing is read once."""
+
+    def __init__(self, cache_dir=None, persist=True):
+        self.cache_dir = cache_dir  # None for default_cache_dir()
+        self.persist = persist
+        self.spawns = 0  # listings read from a child process
+        self.disk_loads = 0  # files read from disk
+        self._builds = {}  # identity -> {listing: rows}
+        self._pending = {}  # (identity, listing) -> threading.Event
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.cache_dir)
+
+    def get(self, executable, listing, run):
+        """Returns the rows of listing, e.g. 'codecs', for
+        executable; run(cmds) is called to spawn executable
+        with cmds and returns what it wrote to stdout, only
+        when the listing is not known yet."""
+        cmds, parse = LISTINGS[listing]
+        identity = file_identity(executable)
+        if identity is None:  # nothing to tell builds apart
+            return parse(run(cmds))
+        while True:
+            with self._lock:
+                build = self._builds.get(identity)
+                if build is None:
+                    build = self._load(identity)
+                    if build is not None:
+                        self.disk_loads += 1
+                    else:
+                        build = {}
+                    self._builds[identity] = build
+                if listing in build:
+                    return build[listing]
+                event = self._pending.get((identity, listing))
+                first = event is None
+                if first:
+                    event = threading.Event()
+                    self._pending[(identity, listing)] = event
+            if not first:
+                # another thread reads the listing, look again
+                # once it is done; when it failed, this thread
+                # becomes the first one
+                event.wait()
+                continue
+            try:
+                rows = self._read(identity, listing, run)
+                with self._lock:
+                    build[listing] = rows
+                return rows
+            finally:
+                with self._lock:
+                    del self._pending[(identity, listing)]
+                event.set()
+
+    def clear(self):
+        """Forgets the listings in memory, the
+        files on disk are kept."""
+        with self._lock:
+            self._builds.clear()
+
+    def _read(self, identity, listing, run):
+        cmds, parse = LISTINGS[listing]
+        with self._file_lock(identity):
+            # another process may have read it meanwhile
+            stored = self._load(identity) or {}
+            if listing in stored:
+                self.disk_loads += 1
+                return stored[listing]
+            rows = parse(run(cmds))
+            self.spawns += 1
+            stored[listing] = rows
+            self._store(identity, stored)
+
+        return rows
+
+    def _directory(self):
+        if self.cache_dir is None:
+            return default_cache_dir()
+
+        return self.cache_dir
+
+    def _path(self, identity):
+        name = hashlib.sha1(json.dumps(identity).encode('utf-8'))
+        return os.path.join(self._directory(), name.hexdigest() + '.json')
+
+    def _load(self, identity):
+        if not self.persist:
+            return None
+        try:
+            with open(self._path(identity)) as f:
+                data = json.load(f)
+        except (IOError, OSError, ValueError):  # missing or broken
+            return None
+        if (data.get('format') != REGISTRY_FORMAT or
+                data.get('identity') != list(identity)):
+            return None
+
+        return data.get('listings')
+
+    def _store(self, identity, listings):
+        if not self.persist:
+            return
+        data = {'format': REGISTRY_FORMAT, 'identity': list(identity),
+                'listings': listings}
+        directory = self._directory()
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            # written aside and renamed, readers never see
+            # a file which is half written
+            fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(data, f)
+            replace = getattr(os, 'replace', os.rename)  # python 2
+            replace(tmp_path, self._path(identity))
+        except (IOError, OSError):  # e.g. read-only home, keep in memory
+            pass
+
+    @contextmanager
+    def _file_lock(self, identity):
+        if not self.persist or fcntl is None:
+            yield
+            return
+        directory = self._directory()
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            f = open(self._path(identity) + '.lock', 'a')
+        except (IOError, OSError):
+            yield
+            return
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            yield
+        finally:
+            f.close()  # releases the lock
@@ -0,0 +1,85 @@
+"""Finds the executables of ffmpeg, e.g. ffmpeg, ffprobe
+and ffplay, once per process instead of once per wrapper"""
+import os
+import threading
+
+
+def _candidates(directory, name):
+    # windows executables end with .exe, which
+    # the names given by the wrappers do not have
+    f_path = os.path.join(directory, name)
+    if os.name == 'nt' and not name.lower().endswith('.exe'):
+        return [f_path + '.exe', f_path]
+
+    return [f_path]
+
+
+def _is_executable(f_path):
+    return os.path.isfile(f_path) and os.access(f_path, os.X_OK)
+
+
+class ExecutableResolver(object):
+    """Resolves the name of an executable, e.g. ffprobe,
+    to its path; the directories of PATH are searched
+    once per name and the result is kept until PATH
+    changes. A pinned install directory is the only
+    place searched, so ffmpeg, ffprobe and ffplay all
+    come from the same build."""
+
+    def __init__(self, install_dir=None):
+        self.install_dir = install_dir
+        self.scans = 0  # directories searched for a name
+        self._paths = {}  # name -> path or None
+        self._path_env = None  # PATH the paths were found in
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return '%s(%r)' % (self.__class__.__name__, self.install_dir)
+
+    def pin(self, install_dir):
+        """Takes the executables from install_dir only,
+        e.g. /opt/ffmpeg/bin; None goes back to PATH."""
+        with self._lock:
+            self.install_dir = install_dir
+            self._paths.clear()
+
+    def clear(self):
+        """Forgets the paths found so far."""
+        with self._lock:
+            self._paths.clear()
+
+    def resolve(self, name):
+        """Returns the path of the executable name
+        or None when it is nowhere to be found."""
+        path_env = os.getenv('PATH', os.defpath)
+        with self._lock:
+            if path_env != self._path_env:
+                # PATH changed, what was found in the
+                # old one may be shadowed or gone
+                self._paths.clear()
+                self._path_env = path_env
+            if name in self._paths:
+                return self._paths[name]
+            if self.install_dir is not None:
+                directories = [self.install_dir]
+            else:
+                directories = path_env.split(os.pathsep)
+            f_path = self._search(directories, name)
+            self._paths[name] = f_path
+
+        return f_path
+
+    def forget(self, name):
+        """Forgets the path of name, e.g. when the
+        executable found there was removed."""
+        with self._lock:
+            self._paths.pop(name, None)
+
+    def _search(self, directories, name):
+        for directory in directories:
+            self.scans += 1
+            for f_path in _candidates(directory, name):
+                if _is_executable(f_path):
+                    return f_path
+
+        return None
@@ -0,0 +1,195 @@
+"""Runs many ffmpeg operations on a pool of workers
+sized to the cores of the machine"""
+import copy
+import heapq
+import itertools
+import os
+import threading
+import time
+from concurrent.futures import Future
+
+
+# cores this process may run on; sched_getaffinity honours
+# taskset and the cpusets of containers, cpu_count does not
+def available_cpus():
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not linux
+        return os.cpu_count() or 1
+
+
+class JobFuture(Future):
+    """concurrent.futures.Future of a job which
+    also tells its status and how long it waited
+    and ran; times come from time.time()."""
+
+    def __init__(self, job_id, priority):
+        super(JobFuture, self).__init__()
+        self.job_id = job_id
+        self.priority = priority
+        self.threads = None  # -threads budget of the job
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+
+    def __repr__(self):
+        return '%s(job_id=%d, priority=%d, status=%s)' % (
+            self.__class__.__name__, self.job_id, self.priority,
+            self.status)
+
+    @property
+    def status(self):
+        """pending, running, cancelled, failed or finished"""
+        if self.cancelled():
+            return 'cancelled'
+        if self.running():
+            return 'running'
+        if not self.done():
+            return 'pending'
+        if self.exception() is not None:
+            return 'failed'
+        return 'finished'
+
+    @property
+    def queue_time(self):
+        """Seconds the job waited for a worker."""
+        if self.started is None:
+            return None
+        return self.started - self.submitted
+
+    @property
+    def run_time(self):
+        """Seconds the job ran."""
+        if self.started is None or self.finished is None:
+            return None
+        return self.finished - self.started
+
+
+class JobScheduler(object):
+    """Runs operations of the wrappers, e.g.
+    VideoFFMpeg.convert_video, on max_workers threads:
+
+        with JobScheduler() as scheduler:
+            v = VideoFFMpeg(verbose=False)
+            future = scheduler.submit(v.convert_video,
+                                      'in.mp4', 'out.avi',
+                                      priority=10)
+        print(future.status, future.run_time)
+
+    N ffmpeg processes started at once each start about one
+    thread per core and fight over the machine; the scheduler
+    runs max_workers of them and gives each a budget of
+    threads_per_job threads, so together they use the cores
+    once. By default there is one worker for every two cores,
+    at least one, and the cores are split among the workers.
+    Jobs with a higher priority run first, jobs with the same
+    priority in the order they are submitted."""
+
+    def __init__(self, max_workers=None, threads_per_job=None,
+                 cpus=None):
+        self.cpus = cpus or available_cpus()
+        if max_workers is None:
+            max_workers = max(1, self.cpus // 2)
+        if threads_per_job is None:
+            threads_per_job = max(1, self.cpus // max_workers)
+        self.max_workers = max_workers
+        self.threads_per_job = threads_per_job
+        self._queue = []  # heap of (-priority, job_id, future, call)
+        self._ids = itertools.count()
+        self._condition = threading.Condition()
+        self._workers = []
+        self._idle = 0  # workers waiting for a job
+        self._shutdown = False
+
+    def __repr__(self):
+        return '%s(max_workers=%d, threads_per_job=%d)' % (
+            self.__class__.__name__, self.max_workers,
+            self.threads_per_job)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.shutdown(wait=True)
+
+    def submit(self, method, *args, **kwargs):
+        """Schedules method(*args, **kwargs) and returns
+        its JobFuture; method is a method of a wrapper
+        object, e.g. v.convert_video. The method runs on
+        a copy of the wrapper with the thread budget set,
+        the wrapper of the caller is not changed.
+        :param priority: keyword argument, higher runs first
+        :param_type: int, 0 by default
+        """
+        priority = kwargs.pop('priority', 0)
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError('cannot schedule new jobs '
+                                   'after shutdown')
+            job_id = next(self._ids)
+            future = JobFuture(job_id, priority)
+            future.threads = self.threads_per_job
+            heapq.heappush(self._queue, (-priority, job_id, future,
+                                         (method, args, kwargs)))
+            # a new worker when the waiting jobs outnumber
+            # the idle workers, up to max_workers
+            if (len(self._workers) < self.max_workers and
+                    len(self._queue) > self._idle):
+                self._start_worker()
+            self._condition.notify()
+
+        return future
+
+    def _start_worker(self):
+        worker = threading.Thread(target=self._work)
+        worker.daemon = True
+        self._workers.append(worker)
+        worker.start()
+
+    def _work(self):
+        while True:
+            with self._condition:
+                self._idle += 1
+                while not self._queue and not self._shutdown:
+                    self._condition.wait()
+                self._idle -= 1
+                if not self._queue:  # shut down and nothing left
+                    return
+                _, _, future, call = heapq.heappop(self._queue)
+            if not future.set_running_or_notify_cancel():
+                continue  # cancelled while it was waiting
+            future.started = time.time()
+            try:
+                result = self._call(future, *call)
+            except BaseException as e:
+                future.finished = time.time()
+                future.set_exception(e)
+            else:
+                future.finished = time.time()
+                future.set_result(result)
+
+    def _call(self, future, method, args, kwargs):
+        wrapper = getattr(method, '__self__', None)
+        if wrapper is None or not hasattr(wrapper, 'threads'):
+            return method(*args, **kwargs)  # not a wrapper method
+        # a copy, the same wrapper can be used by many jobs
+        wrapper = copy.copy(wrapper)
+        wrapper.threads = future.threads
+        wrapper.filter_threads = future.threads
+
+        return getattr(wrapper, method.__name__)(*args, **kwargs)
+
+    def shutdown(self, wait=True, cancel_pending=False):
+        """Stops accepting jobs; the jobs in the queue
+        still run unless cancel_pending is True. With
+        wait=True returns once the workers are done."""
+        with self._condition:
+            self._shutdown = True
+            if cancel_pending:
+                for item in self._queue:
+                    item[2].cancel()
+                del self._queue[:]
+            self._condition.notify_all()
+        if wait:
+            for worker in self._workers:
+                worker.join()
@@ -1,16 +1,48 @@
+import csv
 import os
 import unittest
 import sys
+import shutil
+import tempfile
+import threading
 
-# the following line is needed for
-# going to the root of the project
-sys.path.append('../')
+# the root of the repository, which has the ffmpeg
+# package and loadvideos.py; the modules of the package
+# are imported as ffmpeg.<module> only
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', '..'))
 
-# import from the ffmpeg module after we have appended
-# ../ to the sys.path list
-from ffmpeg import FFMpeg, VideoFFMpeg, AudioAlreadyExistsError, \
-    FFMpegAlreadyExistsError
+from ffmpeg import VideoFFMpeg, FFMpegAlreadyExistsError
 from ffmpeg import BaseFFMpeg
+from ffmpeg.utils import LineSplitter, iter_lines
+from ffmpeg.progress import ProgressParser
+from ffmpeg.base import FFMpegError, ErrorMatcher, MediaInfo, Codec, \
+    CodecCatalog, Device, StreamInfo, ExecutableDoesNotExistError, \
+    FFMpegAlreadyExistsError
+from fractions import Fraction
+from ffmpeg.utils import find_codec
+from ffmpeg.errors import FATAL_ERRORS, NoSuchFileError, \
+    UnknownEncoderError, InvalidDataError
+from ffmpeg.cache import ProbeCache
+from ffmpeg.ffprobe import BasicFFProbe, ProbeFailedError
+from ffmpeg.video import VideoFFMpeg, ConversionCheckFailed, \
+    BasicVideoFFMpegEdit, Rendition
+from ffmpeg.audio import AudioFFMpeg
+from ffmpeg.aio import aiter_lines, AsyncFFProbe, AsyncVideoFFMpeg
+from ffmpeg.scheduler import JobScheduler
+from ffmpeg.registry import CapabilityRegistry, parse_features, \
+    parse_filters, parse_layouts
+from ffmpeg.resolver import ExecutableResolver
+from ffmpeg.index import PacketIndex, NOPTS
+from ffmpeg.cluster import SegmentCoordinator, SegmentWorker, \
+    SegmentFailedError, parse_address, send_message, recv_message, \
+    _Segment
+import socket
+from loadvideos import BaseExtractor, OperationCSVExtractor, \
+    OperationExecutor, Operation, parse_cut
+import time
+from io import BytesIO
+import asyncio
 from subprocess import Popen, PIPE
 
 
@@ -33,8 +65,9 @@ class BaseFFMpegTest(unittest.TestCase):
     # test methods shared by all tools, e.g
     # common methods shared by ffmpeg, ffprobe
     def test_colors(self):
-        first_el = self.bf.colors[0]['Blue']
-        self.assertEqual(first_el, '#0000ff')
+        colors = dict((color.name, color) for color in self.bf.colors)
+        self.assertEqual(colors['Blue'].value, '#0000ff')
+        self.assertEqual(colors['Blue'].rgb, (0, 0, 255))
         # self.assertEqual({}, self.bf._colors)
 
     def test_filters(self):
@@ -210,7 +243,48 @@ class VideoFFMpegTests(unittest.TestCase):
         pass
 
     def test_extract_images(self):
-        pass
+        v = VideoFFMpeg(verbose=False)
+        timestamps = [7.5, 1, 3.04]
+        # the first frame at or after each timestamp, 25 fps
+        frames = [frame.copy() for frame in v.iter_frames('test.mp4')]
+        for dense in (False, True):
+            images = v.extract_images('test.mp4', timestamps,
+                                      as_arrays=True, dense=dense)
+            self.assertEqual(images.shape, (3, 240, 320, 3))
+            for image, index in zip(images, [188, 25, 76]):
+                self.assertEqual(image.tolist(), frames[index].tolist())
+        pngs = v.extract_images('test.mp4', timestamps, size=(None, 60))
+        self.assertEqual(len(pngs), 3)
+        self.assertTrue(all(png.startswith(b'\x89PNG') for png in pngs))
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        paths = v.extract_images('test.mp4', timestamps,
+                                 os.path.join(directory, 'thumb%d.jpg'))
+        self.assertEqual([os.path.basename(path) for path in paths],
+                         ['thumb0.jpg', 'thumb1.jpg', 'thumb2.jpg'])
+        self.assertTrue(all(os.path.exists(path) for path in paths))
+
+    def test_extract_images_after_the_end(self):
+        # 30 has no frame, the images after it keep their index
+        v = VideoFFMpeg(verbose=False)
+        timestamps = [7.5, 30, 1]
+        frames = [frame.copy() for frame in v.iter_frames('test.mp4')]
+        images = v.extract_images('test.mp4', timestamps, as_arrays=True)
+        self.assertEqual(images.shape, (3, 240, 320, 3))
+        self.assertEqual(images[2].tolist(), frames[25].tolist())
+        self.assertFalse(images[1].any())
+        pngs = v.extract_images('test.mp4', timestamps)
+        self.assertEqual([png is None for png in pngs], [False, True, False])
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        paths = v.extract_images('test.mp4', timestamps,
+                                 os.path.join(directory, 'thumb%d.jpg'))
+        self.assertEqual(paths, [os.path.join(directory, 'thumb0.jpg'), None,
+                                 os.path.join(directory, 'thumb2.jpg')])
+        self.assertEqual(sorted(os.listdir(directory)),
+                         ['thumb0.jpg', 'thumb2.jpg'])
+        # the last frame, 9.96, has its image
+        self.assertIsNotNone(v.extract_images('test.mp4', [9.96])[0])
 
     def test_extract_audio(self):
         pass
@@ -287,5 +361,1467 @@ class ImageFFmpegTests(unittest.TestCase):
     pass
 
 
+class LineReaderTests(unittest.TestCase):
+
+    def test_split_line_endings(self):
+        splitter = LineSplitter()
+        lines = splitter.feed(b'first\nframe=1\rframe=2\rlast\r\n')
+        self.assertEqual(lines, ['first\n', 'frame=1\r', 'frame=2\r',
+                                 'last\r\n'])
+        self.assertEqual(splitter.flush(), [])
+
+    def test_crlf_split_across_chunks(self):
+        splitter = LineSplitter()
+        self.assertEqual(splitter.feed(b'line\r'), [])
+        self.assertEqual(splitter.feed(b'\nnext'), ['line\r\n'])
+        self.assertEqual(splitter.flush(), ['next'])
+
+    def test_multibyte_char_split_across_chunks(self):
+        splitter = LineSplitter()
+        data = u'title=caf\xe9\n'.encode('utf-8')
+        self.assertEqual(splitter.feed(data[:9]), [])
+        self.assertEqual(splitter.feed(data[9:]), [u'title=caf\xe9\n'])
+
+    def test_iter_lines_small_chunks(self):
+        data = b'ffmpeg version 3.2\r\nframe=1\rframe=2\rdone'
+        lines = list(iter_lines(BytesIO(data), chunk_size=3))
+        self.assertEqual(lines, ['ffmpeg version 3.2\r\n', 'frame=1\r',
+                                 'frame=2\r', 'done'])
+
+
+class ProgressParserTests(unittest.TestCase):
+    block = ['frame=120\n', 'fps=24.50\n', 'stream_0_0_q=28.0\n',
+             'bitrate=1452.7kbits/s\n', 'total_size=917552\n',
+             'out_time_us=5005000\n', 'out_time_ms=5005000\n',
+             'out_time=00:00:05.005000\n', 'dup_frames=0\n',
+             'drop_frames=0\n', 'speed=2.01x\n']
+
+    def feed_block(self, parser, progress='continue'):
+        for line in self.block + ['progress=%s\n' % progress]:
+            self.assertTrue(parser.feed(line))
+
+        return parser.take()
+
+    def test_progress_record(self):
+        record = self.feed_block(ProgressParser())
+        self.assertEqual(record.frame, 120)
+        self.assertEqual(record.fps, 24.5)
+        self.assertEqual(record.bitrate, 1452.7)
+        self.assertEqual(record.total_size, 917552)
+        self.assertEqual(record.out_time_us, 5005000)
+        self.assertAlmostEqual(record.seconds, 5.005)
+        self.assertEqual(record.speed, 2.01)
+        self.assertFalse(record.finished)
+
+    def test_log_lines_are_not_progress(self):
+        parser = ProgressParser()
+        self.assertFalse(parser.feed('  encoder         : Lavf57.56.100\n'))
+        self.assertFalse(parser.feed('frame=  120 fps= 24 q=28.0 size=\r'))
+
+    def test_interval_drops_records_but_not_end(self):
+        parser = ProgressParser(interval=60)
+        self.assertIsNotNone(self.feed_block(parser))
+        self.assertIsNone(self.feed_block(parser))
+        self.assertTrue(self.feed_block(parser, 'end').finished)
+
+
+class ErrorMatcherTests(unittest.TestCase):
+
+    def setUp(self):
+        self.matcher = ErrorMatcher(FATAL_ERRORS)
+
+    def test_clean_line(self):
+        line = 'frame=  120 fps= 24 q=28.0 size=  917kB speed=2.01x\r'
+        self.assertIsNone(self.matcher.search(line))
+
+    def test_named_groups(self):
+        error = self.matcher.search('missing.mp4: No such file or '
+                                    'directory\n')
+        self.assertIsInstance(error, NoSuchFileError)
+        self.assertEqual(error.path, 'missing.mp4')
+        error = self.matcher.search("Unknown encoder 'libx265'\n")
+        self.assertIsInstance(error, UnknownEncoderError)
+        self.assertEqual(error.encoder, 'libx265')
+
+    def test_damaged_packets(self):
+        # ffmpeg skips a damaged packet and goes on
+        for line in ['Error while decoding stream #0:1: Invalid data '
+                     'found when processing input\n',
+                     '[vist#0:0/h264 @ 0x5581a0] Decoding error: Invalid '
+                     'data found when processing input\n',
+                     '[h264 @ 0x310db200] Cannot allocate memory\n']:
+            self.assertIsNone(self.matcher.search(line))
+        error = self.matcher.search('garbage.mp4: Invalid data found '
+                                    'when processing input\n')
+        self.assertIsInstance(error, InvalidDataError)
+        self.assertEqual(error.path, 'garbage.mp4')
+        error = self.matcher.search('[in#0 @ 0x55d0b0] Error opening '
+                                    'input: Invalid data found when '
+                                    'processing input\n')
+        self.assertIsInstance(error, InvalidDataError)
+
+    def test_arguments_do_not_leak(self):
+        # errors built without a pattern keep their own
+        # arguments, nothing is left from a previous line
+        class LegacyError(Exception):
+            def __init__(self, *arguments):
+                self.arguments = arguments
+        matcher = ErrorMatcher([
+            FFMpegError('Failed to select codec', LegacyError,
+                        [r'h\d+', r'mp\d']),
+            FFMpegError('Failed to open', LegacyError, [r'\w+\.mp4'])])
+        error = matcher.search('Failed to select codec h264 for mp4\n')
+        self.assertEqual(error.arguments, ('Failed to select codec',
+                                           'h264', 'mp4'))
+        error = matcher.search('Failed to open test.mp4\n')
+        self.assertEqual(error.arguments, ('Failed to open', 'test.mp4'))
+
+
+class MediaInfoParseTests(unittest.TestCase):
+    text_output = ['[STREAM]', 'index=0', 'codec_name=h264',
+                   'codec_type=video', 'width=1280', 'height=720',
+                   'pix_fmt=yuv420p', 'DISPOSITION:default=1',
+                   'TAG:handler_name=Video=Handler', '[/STREAM]',
+                   '[CHAPTER]', 'id=0', 'start_time=0.000000',
+                   'end_time=5.000000', 'TAG:title=Intro', '[/CHAPTER]',
+                   '[FORMAT]', 'filename=a=b.mp4', 'nb_streams=1',
+                   'duration=293.632000', 'TAG:title=x=y', '[/FORMAT]']
+    json_output = {'streams': [{'index': 0, 'codec_name': 'h264',
+                                'codec_type': 'video', 'width': 1280,
+                                'height': 720, 'pix_fmt': 'yuv420p',
+                                'disposition': {'default': 1},
+                                'tags': {'handler_name': 'Video=Handler'}}],
+                   'chapters': [{'id': 0, 'start_time': '0.000000',
+                                 'end_time': '5.000000',
+                                 'tags': {'title': 'Intro'}}],
+                   'format': {'filename': 'a=b.mp4', 'nb_streams': 1,
+                              'duration': '293.632000',
+                              'tags': {'title': 'x=y'}}}
+
+    def check_media_info(self, info):
+        stream = info.streams[0]
+        self.assertEqual(stream.width, 1280)
+        self.assertEqual(stream.get('width'), '1280')  # raw value
+        self.assertEqual(stream.get('pix_fmt'), 'yuv420p')
+        self.assertEqual(stream.tags, {'handler_name': 'Video=Handler'})
+        self.assertEqual(stream.disposition, {'default': 1})
+        self.assertEqual(info.chapters[0].title, 'Intro')
+        self.assertEqual(info.chapters[0].end_time, 5.0)
+        self.assertEqual(info.format_info.filename, 'a=b.mp4')
+        self.assertEqual(info.format_info.tags, {'title': 'x=y'})
+        self.assertEqual(info.get_media_duration(), 293.632)
+
+    def test_parse_text_output(self):
+        info = MediaInfo()
+        for line in self.text_output:
+            info.parse_ffprobe(line + '\n')
+        self.check_media_info(info)
+
+    def test_parse_json_output(self):
+        info = MediaInfo()
+        info.parse_ffprobe_json(self.json_output)
+        self.check_media_info(info)
+
+
+class BasicFFProbeTests(unittest.TestCase):
+
+    def test_probe_many(self):
+        paths = ['test.mp4', 'nonexistent.mp4'] * 4
+        results = list(BasicFFProbe().probe_many(paths, max_workers=2,
+                                                 ordered=True))
+        self.assertEqual([path for path, _ in results], paths)
+        for path, result in results:
+            if path == 'test.mp4':
+                self.assertIsInstance(result, MediaInfo)
+            else:
+                self.assertIsInstance(result, ProbeFailedError)
+
+    def test_probe_failed(self):
+        # the wrappers which need the probe of their input
+        # raise the error of ffprobe, not one of None
+        directory = tempfile.mkdtemp()
+        try:
+            path = os.path.join(directory, 'text.mp4')
+            with open(path, 'w') as f:
+                f.write('not a video\n')
+            v = VideoFFMpeg(verbose=False)
+            self.assertIsNone(BasicFFProbe().probe(path))
+            self.assertRaises(ProbeFailedError, v.extract_audio, path)
+            self.assertRaises(ProbeFailedError, v.extract_video, path)
+            self.assertRaises(ProbeFailedError, v.cut_video, path,
+                              os.path.join(directory, 'cut.mp4'), '0')
+        finally:
+            shutil.rmtree(directory)
+
+    def test_probe_many_unordered(self):
+        paths = ['test.mp4'] * 10
+        results = list(BasicFFProbe().probe_many(iter(paths),
+                                                 max_workers=3,
+                                                 chunk_size=4))
+        self.assertEqual(len(results), 10)
+
+
+class ProbeCacheTests(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp_dir = tempfile.mkdtemp()
+        self.media = os.path.join(self.tmp_dir, 'media.mp4')
+        with open(self.media, 'wb') as f:
+            f.write(b'media')
+        self.info = MediaInfo()
+        self.info.parse_ffprobe_json(MediaInfoParseTests.json_output)
+
+    def tearDown(self):
+        for name in os.listdir(self.tmp_dir):
+            os.unlink(os.path.join(self.tmp_dir, name))
+        os.rmdir(self.tmp_dir)
+
+    def test_hits_and_misses(self):
+        cache = ProbeCache()
+        key = cache.key(self.media, sys.executable)
+        self.assertIsNone(cache.get(key))
+        cache.set(key, self.info)
+        self.assertIs(cache.get(key), self.info)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_key_changes_with_file(self):
+        cache = ProbeCache()
+        key = cache.key(self.media, sys.executable)
+        with open(self.media, 'ab') as f:
+            f.write(b'more data')
+        self.assertNotEqual(key, cache.key(self.media, sys.executable))
+        self.assertIsNone(cache.key('http://example.com/a.mp4',
+                                    sys.executable))
+
+    def test_lru_eviction(self):
+        cache = ProbeCache(maxsize=1)
+        cache.set('first', self.info)
+        cache.set('second', self.info)
+        self.assertIsNone(cache.get('first'))
+        self.assertEqual(cache.evictions, 1)
+
+    def test_disk_layer(self):
+        path = os.path.join(self.tmp_dir, 'probe.db')
+        cache = ProbeCache(path=path)
+        key = cache.key(self.media, sys.executable)
+        cache.set(key, self.info)
+        cache.close()
+        cache = ProbeCache(path=path)  # e.g. another process
+        info = cache.get(key)
+        cache.close()
+        self.assertEqual(cache.disk_hits, 1)
+        self.assertEqual(info.streams[0].width, 1280)
+        self.assertEqual(info.format_info.tags, {'title': 'x=y'})
+
+    def test_max_age(self):
+        cache = ProbeCache(max_age=0)
+        cache.set('key', self.info)
+        self.assertIsNone(cache.get('key'))
+
+
+class AsyncTests(unittest.TestCase):
+
+    def test_aiter_lines(self):
+        async def read():
+            stream = asyncio.StreamReader()
+            stream.feed_data(b'frame=1\r\nframe=2\rlast')
+            stream.feed_eof()
+            return [line async for line in aiter_lines(stream, 4)]
+
+        self.assertEqual(asyncio.run(read()),
+                         ['frame=1\r\n', 'frame=2\r', 'last'])
+
+    def test_probe(self):
+        probe = AsyncFFProbe(verbose=False)
+        info = asyncio.run(probe.probe('test.mp4'))
+        self.assertIsInstance(info, MediaInfo)
+        self.assertIsNone(asyncio.run(probe.probe('nonexistent.mp4')))
+
+    def test_probe_many(self):
+        probe = AsyncFFProbe(verbose=False)
+
+        async def probe_all():
+            return [(path, result) async for path, result in
+                    probe.probe_many(['test.mp4', 'nonexistent.mp4'],
+                                     ordered=True)]
+
+        results = asyncio.run(probe_all())
+        self.assertEqual([path for path, _ in results],
+                         ['test.mp4', 'nonexistent.mp4'])
+        self.assertIsInstance(results[0][1], MediaInfo)
+        self.assertIsInstance(results[1][1], ProbeFailedError)
+
+    def test_build_index(self):
+        directory = tempfile.mkdtemp()
+        try:
+            index_path = os.path.join(directory, 'test.pktidx')
+            index = asyncio.run(AsyncFFProbe(verbose=False).build_index(
+                'test.mp4', index_path))
+            self.assertEqual(len(index.video), 250)
+            self.assertTrue(os.path.exists(index_path))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_cancel_terminates_ffmpeg(self):
+        v = AsyncVideoFFMpeg(verbose=False)
+        processes = []
+
+        async def run():
+            spawn = v._aspawn
+
+            async def _aspawn(cmds=[]):
+                processes.append(await spawn(cmds))
+                return processes[-1]
+            v._aspawn = _aspawn
+            task = asyncio.ensure_future(v._arun(
+                ['-re', '-f', 'lavfi', '-i', 'testsrc', '-f', 'null', '-']))
+            await asyncio.sleep(1)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+
+        asyncio.run(run())
+        self.assertIsNotNone(processes[0].returncode)
+
+    def test_error_is_raised(self):
+        v = AsyncVideoFFMpeg(verbose=False)
+        with self.assertRaises(NoSuchFileError):
+            asyncio.run(v.convert_video('nonexistent.mp4', 'output.avi'))
+
+
+class JobSchedulerTests(unittest.TestCase):
+
+    def test_thread_cmds(self):
+        bf = BaseFFMpeg()
+        bf.threads = 2
+        self.assertEqual(bf._thread_cmds(['-i', 'in.mp4', 'out.avi']),
+                         ['-threads', '2', '-i', 'in.mp4',
+                          '-threads', '2', 'out.avi'])
+        # before every output, the values of options are no outputs
+        self.assertEqual(bf._thread_cmds(['-i', 'in.mp4', '-an', '-map',
+                                          '0:v', '-y', 'a.mp4', '-c:a',
+                                          'aac', 'b.m4a']),
+                         ['-threads', '2', '-i', 'in.mp4', '-an', '-map',
+                          '0:v', '-y', '-threads', '2', 'a.mp4', '-c:a',
+                          'aac', '-threads', '2', 'b.m4a'])
+        self.assertEqual(VideoFFMpeg()._convert_video_cmds(
+            'in.mp4', 'out.avi', vcodec='-vcodec h264', acodec='aac'),
+            ['-i', 'in.mp4', '-vcodec', 'h264', '-c:a', 'aac', 'out.avi'])
+
+    def test_priority_and_budget(self):
+        bf = BaseFFMpeg()
+        started = threading.Event()
+        release = threading.Event()
+        order = []
+
+        def block():
+            started.set()
+            release.wait()
+
+        scheduler = JobScheduler(max_workers=1, threads_per_job=3)
+        first = scheduler.submit(block)
+        started.wait()
+        futures = [scheduler.submit(lambda name=name: order.append(name),
+                                    priority=priority)
+                   for name, priority in [('low', 0), ('high', 5),
+                                          ('middle', 1)]]
+        budget = scheduler.submit(bf._thread_cmds, ['-i', 'in.mp4', 'out'])
+        self.assertEqual(futures[0].status, 'pending')
+        release.set()
+        scheduler.shutdown(wait=True)
+        self.assertEqual(order, ['high', 'middle', 'low'])
+        self.assertEqual(first.status, 'finished')
+        self.assertGreaterEqual(futures[0].queue_time, 0)
+        self.assertIn('-filter_threads', budget.result())
+        self.assertIsNone(bf.threads)  # the job ran on a copy
+
+    def test_failed_job(self):
+        with JobScheduler() as scheduler:
+            future = scheduler.submit(int, 'not a number')
+        self.assertEqual(future.status, 'failed')
+        self.assertIsInstance(future.exception(), ValueError)
+
+
+class CapabilityRegistryTests(unittest.TestCase):
+    codecs_output = (
+        'Codecs:\n'
+        ' D..... = Decoding supported\n'
+        ' .....S = Lossless compression\n'
+        ' -------\n'
+        ' D.VI.S 012v                 Uncompressed 4:2:2 10-bit\n'
+        ' DEV.LS h264                 H.264 / AVC / MPEG-4 AVC\n')
+    muxers_output = (
+        'File formats:\n'
+        ' D. = Demuxing supported\n'
+        ' --\n'
+        '  E 3g2             3GP2 (3GPP2 file format)\n'
+        ' DE matroska,webm   Matroska / WebM\n')
+    # ffmpeg 7 has a column more, for the devices
+    muxers_7_output = (
+        'Formats:\n'
+        ' D.. = Demuxing supported\n'
+        ' .E. = Muxing supported\n'
+        ' ..d = Is a device\n'
+        ' ---\n'
+        '  E  3g2             3GP2 (3GPP2 file format)\n'
+        '  Ed alsa            ALSA audio output\n'
+        '  E  matroska        Matroska\n')
+
+    def setUp(self):
+        self.cache_dir = tempfile.mkdtemp()
+        # any file tells a build apart, the listings are
+        # given by the run callable
+        self.executable = os.path.join(self.cache_dir, 'ffmpeg')
+        open(self.executable, 'w').close()
+        self.calls = []
+
+    def run_listing(self, cmds):
+        self.calls.append(cmds)
+        time.sleep(0.1)  # give the other threads time to ask
+        return self.codecs_output
+
+    def test_parse_listings(self):
+        self.assertEqual(parse_features(self.codecs_output, 6),
+                         [['D.VI.S', '012v', 'Uncompressed 4:2:2 10-bit'],
+                          ['DEV.LS', 'h264', 'H.264 / AVC / MPEG-4 AVC']])
+        self.assertEqual(parse_features(self.muxers_output, 2),
+                         [[' E', '3g2', '3GP2 (3GPP2 file format)'],
+                          ['DE', 'matroska,webm', 'Matroska / WebM']])
+        # the width of the features is read from the legend
+        self.assertEqual(parse_features(self.codecs_output),
+                         parse_features(self.codecs_output, 6))
+        self.assertEqual(parse_features(self.muxers_output),
+                         parse_features(self.muxers_output, 2))
+        self.assertEqual(parse_features(self.muxers_7_output),
+                         [[' E ', '3g2', '3GP2 (3GPP2 file format)'],
+                          [' Ed', 'alsa', 'ALSA audio output'],
+                          [' E ', 'matroska', 'Matroska']])
+        self.assertEqual(parse_filters(
+            '  T.. = Timeline support\n'
+            ' ..C amix              N->A       Audio mixing.\n'),
+            [['..C', 'amix', 'N', 'A', 'Audio mixing.']])
+        self.assertEqual(parse_layouts(
+            'Individual channels:\nNAME           DESCRIPTION\n'
+            'FL             front left\nFR             front right\n\n'
+            'Standard channel layouts:\nNAME           DECOMPOSITION\n'
+            'stereo         FL+FR\n'),
+            [['stereo', ['FL', 'FR'], ['front left', 'front right']]])
+
+    def test_single_flight(self):
+        registry = CapabilityRegistry(self.cache_dir)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(
+            registry.get(self.executable, 'codecs', self.run_listing)))
+            for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(len(results), 5)
+        self.assertEqual(results[0][1][1], 'h264')
+
+    def test_default_cache_dir(self):
+        # XDG_CACHE_HOME is read when the listings are
+        # stored, not when the registry is made
+        registry = CapabilityRegistry()
+        cache_home = os.environ.get('XDG_CACHE_HOME')
+        os.environ['XDG_CACHE_HOME'] = self.cache_dir
+        try:
+            registry.get(self.executable, 'codecs', self.run_listing)
+        finally:
+            if cache_home is None:
+                del os.environ['XDG_CACHE_HOME']
+            else:
+                os.environ['XDG_CACHE_HOME'] = cache_home
+        self.assertEqual(len(os.listdir(os.path.join(self.cache_dir,
+                                                     'pyffmpeg'))), 2)
+        registry = CapabilityRegistry(self.cache_dir, persist=False)
+        registry.get(self.executable, 'codecs', self.run_listing)
+        self.assertEqual(len(self.calls), 2)
+
+    def test_loaded_from_disk(self):
+        CapabilityRegistry(self.cache_dir).get(
+            self.executable, 'codecs', self.run_listing)
+        registry = CapabilityRegistry(self.cache_dir)
+        rows = registry.get(self.executable, 'codecs', self.run_listing)
+        self.assertEqual(len(self.calls), 1)
+        self.assertEqual(registry.disk_loads, 1)
+        self.assertEqual(len(rows), 2)
+        # a new build of the executable is read again
+        os.utime(self.executable, (0, 0))
+        registry.get(self.executable, 'codecs', self.run_listing)
+        self.assertEqual(len(self.calls), 2)
+
+
+class CodecCatalogTests(unittest.TestCase):
+    rows = [['DEV.LS', 'h264', 'H.264 / AVC / MPEG-4 AVC'],
+            ['DEV..S', 'png', 'PNG (Portable Network Graphics) image'],
+            ['DEAI.S', 'flac', 'FLAC (Free Lossless Audio Codec)'],
+            ['DEA.L.', 'aac', 'AAC (Advanced Audio Coding)'],
+            ['..S...', 'ass', 'ASS (Advanced SSA) subtitle']]
+
+    def setUp(self):
+        codecs = []
+        for features, name, desc in self.rows:
+            codec = Codec()
+            codec.parse_codec(features, name, desc)
+            codecs.append(codec)
+        self.catalog = CodecCatalog(codecs)
+
+    def names(self, codecs):
+        return [codec.codec_name for codec in codecs]
+
+    def test_lookup(self):
+        self.assertEqual(self.catalog['h264'].codec_name, 'h264')
+        self.assertIsNone(self.catalog.get('vp9'))
+        self.assertIs(find_codec('flac', self.catalog), self.catalog['flac'])
+        self.assertIs(find_codec('flac', list(self.catalog)),
+                      self.catalog['flac'])
+
+    def test_select(self):
+        self.assertEqual(self.names(self.catalog.select(
+            'video', 'encoding', 'lossless')), ['h264', 'png'])
+        self.assertEqual(self.names(self.catalog.select('audio', 'lossy')),
+                         ['aac'])
+        self.assertEqual(self.names(self.catalog.select('intraframe_only')),
+                         ['flac'])
+        self.assertEqual(len(self.catalog.select()), 5)
+        self.assertRaises(KeyError, self.catalog.select, 'stereo')
+
+    def test_stream_codec(self):
+        catalog = self.catalog
+
+        class Source(object):
+            codec_catalog = catalog
+
+        info = MediaInfo()
+        for line in ['[STREAM]', 'index=0', 'codec_name=h264',
+                     'codec_type=video', '[/STREAM]']:
+            info.parse_ffprobe(line)
+        stream = info.streams[0]
+        self.assertIsNone(stream.codec)  # no catalog_source
+        stream.catalog_source = Source()
+        self.assertIs(stream.codec, catalog['h264'])
+
+
+class CodecRecordTests(unittest.TestCase):
+
+    def test_repeated_letters(self):
+        # S is the subtitle type in the third column and
+        # lossless compression in the last one
+        codec = Codec()
+        codec.parse_codec('DES..S', 'dvd_subtitle', 'DVD subtitles')
+        self.assertEqual(codec.codec_type, 'subtitle')
+        self.assertTrue(codec.decoding_support)
+        self.assertTrue(codec.encoding_support)
+        self.assertTrue(codec.lossless)
+        self.assertFalse(codec.lossy)
+        self.assertFalse(hasattr(codec, '__dict__'))
+
+    def test_compression_type(self):
+        codec = Codec()
+        for features, compression_type in [('DES..S', 'lossless'),
+                                           ('DEV.L.', 'lossy'),
+                                           ('DEV.LS', 'both'),
+                                           ('D.D...', None)]:
+            codec.parse_codec(features, 'codec', 'a codec')
+            self.assertEqual(codec.compression_type, compression_type)
+
+    def test_data_codec(self):
+        codec = Codec()
+        codec.parse_codec('D.D...', 'bin_data', 'binary data')
+        self.assertEqual(codec.codec_type, 'data')
+        self.assertTrue(codec.decoding_support)
+
+    def test_device(self):
+        device = Device()
+        device.parse_device(' E', 'xv', 'XV (XVideo) output device')
+        self.assertTrue(device.muxing)
+        self.assertFalse(device.demuxing)
+
+
+class ProbeRecordTests(unittest.TestCase):
+
+    def parse(self, items):
+        stream = StreamInfo()
+        for key, value in items:
+            stream.parse_stream(key, value)
+        stream.seal()
+        return stream
+
+    def test_typed_fields(self):
+        stream = self.parse([('index', '0'), ('r_frame_rate', '30000/1001'),
+                             ('avg_frame_rate', '0/0'),
+                             ('time_base', '1/12800'), ('duration', 'N/A'),
+                             ('nb_frames', '250'), ('profile', 'High')])
+        self.assertEqual(stream.index, 0)
+        self.assertEqual(stream.r_frame_rate, Fraction(30000, 1001))
+        self.assertIsNone(stream.avg_frame_rate)
+        self.assertEqual(stream.time_base, Fraction(1, 12800))
+        self.assertIsNone(stream.duration)
+        self.assertIsNone(stream.width)  # not in the output
+        self.assertEqual(stream.nb_frames, 250)
+        self.assertEqual(stream['profile'], 'High')
+        self.assertFalse(hasattr(stream, '__dict__'))
+
+    def test_shared_keys(self):
+        first = self.parse([('index', '0'), ('codec_name', 'h264')])
+        second = self.parse([('index', '1'), ('codec_name', 'h264')])
+        self.assertIs(first._table, second._table)
+        self.assertEqual(dict(second.items()),
+                         {'index': '1', 'codec_name': 'h264'})
+
+    def test_json_round_trip(self):
+        info = MediaInfo()
+        info.parse_ffprobe_json(MediaInfoParseTests.json_output)
+        copy = MediaInfo()
+        copy.parse_ffprobe_json(info.to_ffprobe_json())
+        self.assertEqual(dict(copy.streams[0].items()),
+                         dict(info.streams[0].items()))
+        self.assertEqual(copy.chapters[0].title, 'Intro')
+
+
+class ExecutableResolverTests(unittest.TestCase):
+
+    def setUp(self):
+        self.old_path = os.environ.get('PATH')
+        self.first = tempfile.mkdtemp()
+        self.second = tempfile.mkdtemp()
+        for directory in (self.first, self.second):
+            self.add_executable(directory, 'ffprobe')
+        os.environ['PATH'] = os.pathsep.join([self.first, self.second])
+
+    def tearDown(self):
+        os.environ['PATH'] = self.old_path
+
+    def add_executable(self, directory, name):
+        f_path = os.path.join(directory, name)
+        open(f_path, 'w').close()
+        os.chmod(f_path, 0o755)
+        return f_path
+
+    def test_resolved_once(self):
+        resolver = ExecutableResolver()
+        f_path = os.path.join(self.first, 'ffprobe')
+        self.assertEqual(resolver.resolve('ffprobe'), f_path)
+        scans = resolver.scans
+        for _ in range(10):
+            self.assertEqual(resolver.resolve('ffprobe'), f_path)
+        self.assertEqual(resolver.scans, scans)
+        self.assertIsNone(resolver.resolve('ffplay'))
+
+    def test_path_change(self):
+        resolver = ExecutableResolver()
+        resolver.resolve('ffprobe')
+        os.environ['PATH'] = self.second
+        self.assertEqual(resolver.resolve('ffprobe'),
+                         os.path.join(self.second, 'ffprobe'))
+
+    def test_pinned_install_dir(self):
+        resolver = ExecutableResolver()
+        ffmpeg_path = self.add_executable(self.first, 'ffmpeg')
+        resolver.pin(self.second)
+        self.assertEqual(resolver.resolve('ffprobe'),
+                         os.path.join(self.second, 'ffprobe'))
+        self.assertIsNone(resolver.resolve('ffmpeg'))  # not in PATH
+        resolver.pin(None)
+        self.assertEqual(resolver.resolve('ffmpeg'), ffmpeg_path)
+
+    def test_wrappers_share_resolver(self):
+        resolver = ExecutableResolver()
+        BasicFFProbe.resolver = resolver
+        self.addCleanup(delattr, BasicFFProbe, 'resolver')
+        self.assertEqual(BasicFFProbe().executable,
+                         os.path.join(self.first, 'ffprobe'))
+        scans = resolver.scans
+        BasicFFProbe()
+        self.assertEqual(resolver.scans, scans)
+        os.remove(os.path.join(self.first, 'ffprobe'))
+        self.assertRaises(ExecutableDoesNotExistError, BasicFFProbe)
+        self.assertEqual(BasicFFProbe().executable,
+                         os.path.join(self.second, 'ffprobe'))
+
+
+class ImportTimeTests(unittest.TestCase):
+    # microseconds import ffmpeg may take, the package
+    # alone, the modules are imported on first use
+    budget = 20000
+    # modules which importing ffmpeg and using its
+    # wrappers must not import, they are slow to load
+    # or optional
+    heavy_modules = ['pdb', 'logging', 'sqlite3', 'asyncio',
+                     'concurrent.futures', 'openpyxl']
+
+    def setUp(self):
+        # the directory which has the ffmpeg package
+        package_dir = os.path.dirname(os.path.abspath(
+            sys.modules['ffmpeg.base'].__file__))
+        self.root = os.path.dirname(package_dir)
+
+    def import_times(self, code):
+        # cumulative microseconds of each module imported by
+        # code, read from the output of python -X importtime
+        p = Popen([sys.executable, '-X', 'importtime', '-c', code],
+                  stdout=PIPE, stderr=PIPE, cwd=self.root)
+        _, stderr = p.communicate()
+        self.assertEqual(p.returncode, 0, stderr)
+        times = {}
+        for line in stderr.decode('utf-8').splitlines():
+            if not line.startswith('import time:') or 'self [us]' in line:
+                continue
+            _, cumulative, name = line[len('import time:'):].split('|')
+            times[name.strip()] = int(cumulative)
+
+        return times
+
+    def test_package_import_budget(self):
+        times = self.import_times('import ffmpeg')
+        self.assertLess(times['ffmpeg'], self.budget)
+        self.assertNotIn('ffmpeg.base', times)
+
+    def test_heavy_modules_not_imported(self):
+        p = Popen([sys.executable, '-c',
+                   'import sys, ffmpeg\n'
+                   'ffmpeg.VideoFFMpeg, ffmpeg.AudioFFMpeg\n'
+                   'ffmpeg.BasicFFProbe\n'
+                   'print(" ".join(sys.modules))'],
+                  stdout=PIPE, stderr=PIPE, cwd=self.root)
+        stdout, stderr = p.communicate()
+        self.assertEqual(p.returncode, 0, stderr)
+        modules = stdout.decode('utf-8').split()
+        self.assertIn('ffmpeg.video', modules)
+        # the modules are not importable by their own names
+        for name in ('video', 'base', 'utils', 'errors', 'ffmpeg.ffmpeg'):
+            self.assertEqual(name in modules, name == 'ffmpeg.ffmpeg')
+        for name in self.heavy_modules:
+            self.assertNotIn(name, modules)
+
+
+class IterFramesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.v = VideoFFMpeg(verbose=False)
+
+    def test_frames(self):
+        frames = 0
+        buffers = set()
+        for frame in self.v.iter_frames('test.mp4', buffers=2):
+            self.assertEqual(frame.shape, (240, 320, 3))
+            buffers.add(frame.__array_interface__['data'][0])
+            frames += 1
+        self.assertEqual(frames, 250)
+        self.assertEqual(len(buffers), 2)  # no array per frame
+
+    def test_batches(self):
+        shapes = [block.shape for block in self.v.iter_frames(
+            'test.mp4', pix_fmt='gray', size=(None, 120), fps=5,
+            start=1, end=3, batch=4)]
+        self.assertEqual(shapes, [(4, 120, 160, 1), (4, 120, 160, 1),
+                                  (2, 120, 160, 1)])
+
+    def test_stop_early(self):
+        frames = self.v.iter_frames('test.mp4')
+        next(frames)
+        frames.close()  # terminates ffmpeg
+
+    def test_damaged_file(self):
+        # a few damaged runs of bytes, ffmpeg reports errors
+        # while decoding them and exits with 0
+        directory = tempfile.mkdtemp()
+        try:
+            damaged = os.path.join(directory, 'damaged.mp4')
+            with open('test.mp4', 'rb') as f:
+                data = bytearray(f.read())
+            for i in range(1, 9):
+                offset = len(data) * i // 10
+                data[offset:offset + 200] = bytes(range(7, 207))
+            with open(damaged, 'wb') as f:
+                f.write(data)
+            frames = sum(1 for _ in self.v.iter_frames(damaged))
+            self.assertEqual(frames, 250)
+            self.assertTrue(self.v.convert_video(
+                damaged, os.path.join(directory, 'damaged.mkv')))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_errors(self):
+        self.assertRaises(ValueError, list,
+                          self.v.iter_frames('test.mp4', pix_fmt='yuv420p'))
+        self.assertRaises(NoSuchFileError, list, self.v.iter_frames(
+            'nonexistent.mp4', size=(32, 32)))
+
+
+class AudioSamplesTests(unittest.TestCase):
+
+    def setUp(self):
+        self.a = AudioFFMpeg(verbose=False)
+
+    def test_iter_samples(self):
+        blocks = [block.copy() for block in self.a.iter_samples(
+            'test.mp4', sample_rate=8000, channels=2, dtype='int16',
+            block_frames=8000, start=1, end=3.5)]
+        self.assertEqual([block.shape for block in blocks],
+                         [(8000, 2), (8000, 2), (4000, 2)])
+        self.assertEqual(blocks[0].dtype.name, 'int16')
+
+    def test_read_all(self):
+        samples = self.a.read_all('test.mp4')
+        blocks = [block.copy() for block in
+                  self.a.iter_samples('test.mp4', block_frames=10000)]
+        self.assertEqual(samples.shape[1], 1)  # probed channels
+        self.assertEqual(len(samples), sum(len(b) for b in blocks))
+        self.assertEqual(samples.tolist(),
+                         [row for b in blocks for row in b.tolist()])
+
+    def test_read_all_grows(self):
+        # the probed duration is 1 s, the samples 4 s
+        self.a._sample_layout = lambda *args: (8000, 1, 1.0)
+        self.assertEqual(self.a.read_all('test.mp4', end='00:00:04').shape,
+                         (32000, 1))
+
+
+class VideoWriterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.v = VideoFFMpeg(verbose=False)
+        self.directory = tempfile.mkdtemp()
+        self.output = os.path.join(self.directory, 'written.mp4')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_write_frames(self):
+        import numpy
+        records = []
+        with self.v.writer(self.output, (64, 48), fps=10, crf=20,
+                           progress=records.append) as writer:
+            for i in range(20):
+                writer.write(numpy.full((48, 64, 3), i * 10, numpy.uint8))
+            writer.write(numpy.zeros((5, 48, 64, 3), numpy.uint8))
+            # a crop is not contiguous, it is copied
+            writer.write(numpy.zeros((48, 128, 3), numpy.uint8)[:, ::2])
+        self.assertEqual(writer.frames, 26)
+        self.assertEqual(records[-1].frame, 26)
+        frames = [frame.copy() for frame in self.v.iter_frames(self.output)]
+        self.assertEqual(len(frames), 26)
+        self.assertAlmostEqual(frames[10].mean(), 100, delta=3)
+
+    def test_wrong_frames(self):
+        import numpy
+        with self.v.writer(self.output, (64, 48)) as writer:
+            self.assertRaises(ValueError, writer.write,
+                              numpy.zeros((64, 48, 3), numpy.uint8))
+            self.assertRaises(ValueError, writer.write,
+                              numpy.zeros((48, 64, 3), numpy.float32))
+        self.assertRaises(FFMpegAlreadyExistsError, self.v.writer,
+                          self.output, (64, 48))
+
+    def test_encoder_error(self):
+        import numpy
+        frame = numpy.zeros((48, 64, 3), numpy.uint8)
+
+        def write():
+            with self.v.writer(self.output, (64, 48),
+                               vcodec='nonexistent') as writer:
+                for _ in range(1000):
+                    writer.write(frame)
+        self.assertRaises(UnknownEncoderError, write)
+
+
+class PacketIndexTests(unittest.TestCase):
+
+    def setUp(self):
+        self.probe = BasicFFProbe(verbose=False)
+        self.directory = tempfile.mkdtemp()
+        self.video = os.path.join(self.directory, 'test.mp4')
+        shutil.copy('test.mp4', self.video)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_keyframes(self):
+        index = self.probe.build_index(self.video)
+        video = index.video
+        self.assertEqual(len(video), 250)
+        self.assertEqual(video.keyframes()[:3], [0.0, 1.0, 2.0])
+        self.assertEqual(index.previous_keyframe(3.3), 3.0)
+        self.assertEqual(index.previous_keyframe(3), 3.0)
+        self.assertEqual(index.next_keyframe(3.3), 4.0)
+        self.assertEqual(index.next_keyframe(100), None)
+        self.assertEqual(video.previous_keyframe(-1), None)
+        self.assertNotEqual(video.keyframe_pos(3.3), None)
+        gops = video.gop_stats()
+        self.assertEqual(len(gops), 10)
+        self.assertEqual(gops[1].start, 1.0)
+        self.assertEqual(gops[1].duration, 1.0)
+        self.assertEqual(gops[1].size * 8, gops[1].bit_rate)
+
+    def test_sidecar(self):
+        built = self.probe.build_index(self.video)
+        self.assertTrue(os.path.exists(self.video + '.pktidx'))
+        loaded = self.probe.build_index(self.video)
+        self.assertNotEqual(loaded._mmap, None)
+        for stream in built:
+            self.assertEqual(list(loaded[stream.index].pts),
+                             list(stream.pts))
+            self.assertEqual(list(loaded[stream.index].flags),
+                             list(stream.flags))
+        self.assertEqual(loaded.previous_keyframe(7.5), 7.0)
+        loaded.close()
+        # the file changed, the sidecar is built again
+        with open(self.video, 'ab') as f:
+            f.write(b'\0' * 16)
+        self.assertEqual(self.probe.build_index(self.video)._mmap, None)
+
+    def test_broken_sidecar(self):
+        path = os.path.join(self.directory, 'index')
+        with open(path, 'wb') as f:
+            f.write(b'not an index')
+        self.assertEqual(PacketIndex.load(path), None)
+        index = self.probe.build_index(self.video, path)
+        self.assertEqual(PacketIndex.load(path).video.keyframes(),
+                         index.video.keyframes())
+        self.assertFalse(os.path.exists(self.video + '.pktidx'))
+
+
+class ParallelConvertTests(unittest.TestCase):
+
+    def setUp(self):
+        self.v = VideoFFMpeg(verbose=False)
+        # test.mp4 lasts 10 seconds, segments of 2 seconds
+        self.v.min_segment_duration = 2
+        self.directory = tempfile.mkdtemp()
+        self.video = os.path.join(self.directory, 'test.mp4')
+        shutil.copy('test.mp4', self.video)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_segments(self):
+        index = BasicFFProbe(verbose=False).build_index(self.video)
+        segments = self.v._segments(index.video, 0, 2)
+        self.assertEqual(segments[0][0], None)
+        self.assertEqual([start for start, _ in segments[1:]],
+                         [3.0, 5.0, 8.0])
+        self.assertEqual(sum(frames for _, frames in segments), 250)
+        cmds = self.v._segment_cmds(self.video, 'out.mkv', 0, 2.0, 75,
+                                    'libx264', ['-crf', '30'])
+        self.assertEqual(cmds[:2], ['-ss', '2.000000'])
+        self.assertEqual(cmds[-3:], ['-crf', '30', 'out.mkv'])
+
+    def test_scheduler_shut_down(self):
+        # the temporary directory can not be made, the
+        # scheduler made for the call is shut down all the same
+        made = []
+
+        class Scheduler(JobScheduler):
+            def __init__(self, *args, **kwargs):
+                super(Scheduler, self).__init__(*args, **kwargs)
+                made.append(self)
+
+        module = sys.modules[JobScheduler.__module__]
+        module.JobScheduler = Scheduler
+        try:
+            self.assertRaises(OSError, self.v.convert_video_parallel,
+                              self.video, os.path.join(
+                                  self.directory, 'missing', 'out.mkv'))
+        finally:
+            module.JobScheduler = JobScheduler
+        self.assertTrue(made[0]._shutdown)
+
+    def test_convert(self):
+        output = os.path.join(self.directory, 'converted.mkv')
+        self.assertTrue(self.v.convert_video_parallel(
+            self.video, output, vcodec='libx264', acodec='aac',
+            options=['-preset', 'ultrafast'], workers=2))
+        frames = list(self.v.iter_frames(output, pix_fmt='gray'))
+        self.assertEqual(len(frames), 250)
+        info = BasicFFProbe(verbose=False).probe(output)
+        self.assertEqual(sorted(stream.codec_name
+                                for stream in info.streams),
+                         ['aac', 'h264'])
+        # only the output and the index of the input are left
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['converted.mkv', 'test.mp4', 'test.mp4.pktidx'])
+        self.assertRaises(FFMpegAlreadyExistsError,
+                          self.v.convert_video_parallel, self.video, output)
+
+    def test_check(self):
+        output = os.path.join(self.directory, 'converted.mp4')
+        # a frame rate of 5 drops frames in every segment
+        self.assertRaises(ConversionCheckFailed,
+                          self.v.convert_video_parallel, self.video, output,
+                          options=['-r', '5', '-vsync', 'cfr'], workers=2)
+
+
+class ClusterProtocolTests(unittest.TestCase):
+    # the addresses and the messages, no video nor
+    # ffmpeg is needed
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.sock, peer = socket.socketpair()
+        self.stream = peer.makefile('rb')
+        peer.close()
+
+    def tearDown(self):
+        self.stream.close()
+        self.sock.close()
+        shutil.rmtree(self.directory)
+
+    def test_parse_address(self):
+        self.assertEqual(parse_address('10.0.0.2:7300'), ('10.0.0.2', 7300))
+        self.assertEqual(parse_address(':7300'), ('127.0.0.1', 7300))
+        self.assertEqual(parse_address('/run/pyffmpeg.sock'),
+                         '/run/pyffmpeg.sock')
+
+    def test_file(self):
+        path = os.path.join(self.directory, 'sent')
+        with open(path, 'wb') as f:
+            f.write(b'segment')
+        send_message(self.sock, {'type': 'done', 'segment': 1}, path)
+        message, received = recv_message(self.stream, self.directory)
+        self.assertEqual(message, {'type': 'done', 'segment': 1})
+        with open(received, 'rb') as f:
+            self.assertEqual(f.read(), b'segment')
+        self.sock.close()
+        self.assertEqual(recv_message(self.stream, self.directory),
+                         (None, None))
+
+    def test_path_of_the_peer(self):
+        # a path in the header is dropped, it is not trusted
+        send_message(self.sock, {'type': 'done', 'path': '/etc/passwd'})
+        self.assertEqual(recv_message(self.stream, self.directory),
+                         ({'type': 'done'}, None))
+        # and no file is accepted where none is expected
+        send_message(self.sock, {'type': 'hello', 'size': 3})
+        self.assertRaises(ValueError, recv_message, self.stream, None)
+
+
+class ClusterTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.video = os.path.join(self.directory, 'test.mp4')
+        shutil.copy('test.mp4', self.video)
+        self.output = os.path.join(self.directory, 'converted.mkv')
+        self.coordinator = SegmentCoordinator().start()
+        # test.mp4 lasts 10 seconds, segments of 2 seconds
+        self.coordinator.wrapper.min_segment_duration = 2
+        self.threads = []
+
+    def tearDown(self):
+        self.coordinator.close()
+        for thread in self.threads:
+            thread.join()
+        shutil.rmtree(self.directory)
+
+    def start_worker(self, name):
+        worker = SegmentWorker(self.coordinator.address, name)
+        worker.heartbeat_interval = 0.2
+        thread = threading.Thread(target=worker.run)
+        thread.start()
+        self.threads.append(thread)
+
+        return worker
+
+    def convert(self, **kwargs):
+        self.assertTrue(self.coordinator.convert_video(
+            self.video, self.output, vcodec='libx264', acodec='aac',
+            options=['-preset', 'ultrafast'], **kwargs))
+        frames = list(VideoFFMpeg(verbose=False).iter_frames(
+            self.output, pix_fmt='gray'))
+        self.assertEqual(len(frames), 250)
+
+    def test_no_retry_after_failure(self):
+        # a segment which comes back after the conversion
+        # failed is not queued again for the next one
+        coordinator = self.coordinator
+        segment = _Segment(0, None, 25, 'segment00000.mkv')
+        coordinator._segments = [segment]
+        coordinator._error = SegmentFailedError('failed', 1)
+        coordinator._retry(segment, 'worker lost')
+        self.assertEqual(list(coordinator._jobs), [])
+        coordinator._error = None
+        coordinator._retry(segment, 'worker lost')
+        self.assertEqual(list(coordinator._jobs), [segment])
+
+    def test_transfer(self):
+        workers = [self.start_worker('w%d' % i) for i in range(2)]
+        self.coordinator.wait_for_workers(2)
+        self.convert()
+        self.assertEqual(sum(worker.segments for worker in workers), 4)
+
+    def test_shared(self):
+        worker = self.start_worker('shared')
+        self.coordinator.wait_for_workers(1)
+        self.convert(shared=True)
+        self.assertEqual(worker.segments, 2)
+
+    def test_lost_worker(self):
+        # takes a segment and is not heard from anymore
+        self.coordinator.heartbeat_timeout = 0.5
+        sock = socket.create_connection(self.coordinator.address)
+        send_message(sock, {'type': 'hello', 'worker': 'silent'})
+        self.coordinator.wait_for_workers(1)
+        jobs = []
+
+        def receive():
+            job, path = recv_message(sock.makefile('rb'), self.directory)
+            jobs.append(job)
+            os.remove(path)
+            self.start_worker('late')
+        receiver = threading.Thread(target=receive)
+        receiver.start()
+        self.convert()
+        receiver.join()
+        sock.close()
+        self.assertEqual(jobs[0]['type'], 'segment')
+
+    def test_failed_source(self):
+        # the coordinator fails to cut the segment, the
+        # worker is not dropped for it
+        def source(segment, settings):
+            raise OSError('disk full')
+        self.coordinator._source = source
+        self.start_worker('w')
+        self.coordinator.wait_for_workers(1)
+        self.assertRaises(SegmentFailedError, self.coordinator.convert_video,
+                          self.video, self.output)
+        self.assertEqual(len(self.coordinator.workers), 1)
+
+    def test_failed_segment(self):
+        self.start_worker('w')
+        self.coordinator.wait_for_workers(1)
+        self.assertRaises(SegmentFailedError, self.coordinator.convert_video,
+                          self.video, self.output, vcodec='nonexistent')
+
+
+class VideoEditTests(unittest.TestCase):
+
+    def setUp(self):
+        self.v = BasicVideoFFMpegEdit(verbose=False)
+        self.directory = tempfile.mkdtemp()
+        self.output = os.path.join(self.directory, 'edited.mp4')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_no_op(self):
+        # test.mp4 is 320x240 at 25 frames per second
+        edit = self.v.edit('test.mp4').scale(320, 240).crop(320, 240) \
+            .rotate(180).rotate(-180).set_fps(25).blur(0).pad(320, 240)
+        self.assertEqual(edit.steps, [])
+        self.assertEqual(edit.graph(), None)
+        self.assertEqual(edit._cmds('out.mp4')[-3:],
+                         ['-c', 'copy', 'out.mp4'])
+
+    def test_merge(self):
+        edit = self.v.edit('test.mp4').scale(640, 480).scale(-2, 120) \
+            .crop(100, 80).crop(50, 40, 10, 10).rotate(90).rotate(90)
+        self.assertEqual(edit.graph(), (
+            '[0:v:0]scale=160:120,crop=50:40:40:30,hflip,vflip[v]', '[v]'))
+        self.assertEqual(edit.size, (50, 40))
+        # a scale back to the size before is no scale at all
+        edit = self.v.edit('test.mp4').scale(640, 480).scale(320, 240)
+        self.assertEqual(edit.steps, [])
+        self.assertRaises(ValueError, edit.crop, 400, 100)
+        self.assertRaises(ValueError, edit.pad, 300, 300)
+
+    def test_run(self):
+        with open(os.path.join(self.directory, 'logo.ppm'), 'wb') as f:
+            f.write(b'P6 8 8 255\n' + b'\xff\0\0' * 64)
+        self.assertTrue(self.v.edit('test.mp4').crop(160, 120, 0, 0)
+                        .rotate(90).pad(160, 160)
+                        .overlay(os.path.join(self.directory, 'logo.ppm'),
+                                 4, 4, size=(16, 16))
+                        .set_fps(5).run(self.output, vcodec='libx264'))
+        frames = list(VideoFFMpeg(verbose=False).iter_frames(self.output))
+        self.assertEqual(len(frames), 50)
+        self.assertEqual(frames[0].shape, (160, 160, 3))
+        self.assertTrue(frames[0][10, 10, 0] > 200)  # the red logo
+        self.assertTrue(frames[0][80, 5].max() < 30)  # the black pad
+        info = BasicFFProbe(verbose=False).probe(self.output)
+        self.assertEqual(len(info.streams), 2)  # the audio copied
+        self.assertRaises(FFMpegAlreadyExistsError, self.v.scale_video,
+                          'test.mp4', self.output, 160)
+        self.assertTrue(self.v.scale_video('test.mp4', self.output, 160,
+                                           overwrite=True))
+
+    def test_display_rotation(self):
+        # the frames of test.mp4, shown turned by 90 degrees;
+        # the edits work on the 320x240 frames as stored
+        rotated = os.path.join(self.directory, 'rotated.mp4')
+        self.v._run(['-display_rotation', '90', '-i', 'test.mp4',
+                     '-c', 'copy', rotated])
+        edit = self.v.edit(rotated).crop(300, 200)
+        self.assertTrue(edit.run(self.output, vcodec='libx264'))
+        frames = VideoFFMpeg(verbose=False).iter_frames(self.output)
+        self.assertEqual(next(frames).shape, (200, 300, 3))
+        frames.close()
+        self.assertRaises(ProbeFailedError, self.v.edit,
+                          os.path.join(self.directory, 'nonexistent.mp4'))
+
+
+class LadderTests(unittest.TestCase):
+
+    def setUp(self):
+        self.v = VideoFFMpeg(verbose=False)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def rendition(self, name, *args, **kwargs):
+        kwargs.setdefault('options', ['-preset', 'ultrafast'])
+        return Rendition(os.path.join(self.directory, name), *args, **kwargs)
+
+    def test_cmds(self):
+        cmds = self.v._ladder_cmds('in.mp4', [
+            Rendition('720.mp4', 720, '3M'), Rendition('480.mp4', 480, '1M'),
+            Rendition('audio.m4a', video=False, audio_bitrate='128k')])
+        self.assertEqual(cmds[:4], [
+            '-i', 'in.mp4', '-filter_complex',
+            '[0:v:0]split=2[vs0][vs1];[vs0]scale=-2:720[v0];'
+            '[vs1]scale=-2:480[v1];[0:a:0]asplit=3[as0][as1][as2]'])
+        self.assertEqual(cmds[-7:], ['-map', '[as2]', '-c:a', 'aac',
+                                     '-b:a', '128k', 'audio.m4a'])
+        # one output needs no filter at all
+        self.assertEqual(self.v._ladder_cmds('in.mp4', [Rendition('a.mp4')]),
+                         ['-i', 'in.mp4', '-map', '0:v:0', '-c:v', 'libx264',
+                          '-map', '0:a:0', '-c:a', 'aac', 'a.mp4'])
+
+    def test_ladder(self):
+        renditions = [self.rendition('240.mp4', None, '300k'),
+                      self.rendition('120.mp4', 120, '100k'),
+                      self.rendition('audio.m4a', video=False,
+                                     audio_bitrate='64k')]
+        records = []
+        results = self.v.encode_ladder('test.mp4', renditions,
+                                       progress=records.append)
+        self.assertEqual([result.ok for result in results], [True] * 3)
+        heights = []
+        for rendition in renditions[:2]:
+            info = BasicFFProbe(verbose=False).probe(rendition.output)
+            heights.append(info.streams[0].height)
+        self.assertEqual(heights, [240, 120])
+        finished = [record for record in records if record.finished]
+        self.assertEqual([record.rendition for record in finished],
+                         renditions)
+        self.assertEqual(finished[0].size,
+                         os.path.getsize(renditions[0].output))
+        self.assertEqual(finished[2].q, None)  # no video
+
+    def test_failed_rendition(self):
+        renditions = [self.rendition('120.mp4', 120),
+                      self.rendition('bad.mp4', 60, vcodec='nonexistent')]
+        results = self.v.encode_ladder('test.mp4', renditions)
+        self.assertTrue(results[0].ok)
+        self.assertFalse(results[1].ok)
+        self.assertTrue(isinstance(results[1].error, UnknownEncoderError))
+        self.assertEqual(results[1].error.encoder, 'nonexistent')
+
+    def test_no_audio(self):
+        silent = os.path.join(self.directory, 'silent.mp4')
+        self.v._run(['-i', 'test.mp4', '-an', '-c', 'copy', silent])
+        renditions = [self.rendition('120.mp4', 120),
+                      self.rendition('audio.m4a', video=False)]
+        results = self.v.encode_ladder(silent, renditions)
+        self.assertTrue(results[0].ok)
+        self.assertFalse(results[1].ok)
+        self.assertEqual(results[1].error.path, renditions[1].output)
+        # the commands map the video alone
+        self.assertNotIn('0:a:0', self.v._ladder_cmds(
+            silent, renditions[:1], kinds=('video',)))
+
+
+class OperationExtractorTests(unittest.TestCase):
+    # the sheets alone, no video is needed
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.sheet = os.path.join(self.directory, 'ops.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_parse_cut(self):
+        self.assertEqual(parse_cut('00:01:30.5-00:02:00'), (90.5, 120.0))
+        self.assertEqual(parse_cut('1:30'), (90.0, None))
+        self.assertEqual(parse_cut(''), None)
+        self.assertRaises(ValueError, parse_cut, '20-10')
+        self.assertRaises(ValueError, parse_cut, '1:x')
+
+    def test_groups(self):
+        with open(self.sheet, 'w') as f:
+            f.write('video_id,cut,convert\n'
+                    'a,,avi\nb,,avi\na,,mkv\nc,,avi\nc,,mkv\na,,mp4\n')
+        executor = OperationExecutor(
+            OperationCSVExtractor(self.sheet, load=False), self.directory)
+        executor.window = 2
+        self.assertEqual([(video_id, [operation.row for operation in rows])
+                          for video_id, rows in executor.groups()],
+                         [('b', [2]), ('a', [1, 3]), ('c', [4, 5]),
+                          ('a', [6])])
+
+    def test_records(self):
+        with open(self.sheet, 'w') as f:
+            f.write('Convert,notes,Video_ID,cut\n'
+                    'avi,x,a.mp4,00:01-00:02.5\n'
+                    ',,,\n'
+                    '.mkv,,b.mp4,\n'
+                    ',,c.mp4,20-10\n'
+                    'mkv,,,5\n')
+        extractor = OperationCSVExtractor(self.sheet, load=False)
+        self.assertEqual(list(extractor.iter_records()), [
+            Operation(1, 'a.mp4', (1.0, 2.5), 'avi', None),
+            Operation(3, 'b.mp4', None, 'mkv', None),
+            Operation(4, 'c.mp4', None, None,
+                      "cut '20-10' ends before it starts"),
+            Operation(5, None, (5.0, None), 'mkv', 'no video_id')])
+        # resumed from the row 4
+        extractor = OperationCSVExtractor(self.sheet, load=False,
+                                          start_row=4)
+        self.assertEqual([r.row for r in extractor.iter_records()], [4, 5])
+        extractor = OperationCSVExtractor(self.sheet, load=False,
+                                          columns={'video_id': 'notes'})
+        # the rows with nothing in the mapped columns are empty
+        self.assertEqual([r.video_id for r in extractor.iter_records()],
+                         ['x'])
+        extractor = OperationCSVExtractor(self.sheet, load=False,
+                                          columns={'video_id': 'missing'})
+        self.assertRaises(ValueError, list, extractor.iter_records())
+
+    def test_quoted_new_lines(self):
+        # a quoted cell keeps its new lines as they are
+        with open(self.sheet, 'w', newline='') as f:
+            f.write('video_id,cut,convert\r\n'
+                    '"a\r\nb.mp4",,avi\r\n'
+                    'c.mp4,,\r\n')
+        extractor = OperationCSVExtractor(self.sheet, load=False)
+        self.assertEqual([(r.row, r.video_id)
+                          for r in extractor.iter_records()],
+                         [(1, 'a\r\nb.mp4'), (2, 'c.mp4')])
+
+    def test_records_without_header(self):
+        with open(self.sheet, 'w') as f:
+            f.write('a.mp4,10,avi\nb.mp4,,\n')
+        extractor = OperationCSVExtractor(self.sheet, load=False)
+        self.assertEqual(list(extractor.iter_records()), [
+            Operation(0, 'a.mp4', (10.0, None), 'avi', None),
+            Operation(1, 'b.mp4', None, None, None)])
+        extractor = OperationCSVExtractor(
+            self.sheet, load=False, columns={'video_id': 2, 'cut': 1})
+        self.assertEqual([(r.video_id, r.convert)
+                          for r in extractor.iter_records()],
+                         [('avi', None)])
+
+    def test_base_extractor(self):
+        # iter_rows of a subclass may return a list as well
+        self.assertEqual(list(BaseExtractor('ops.csv', load=False)
+                              .iter_records()), [])
+
+        class ListExtractor(BaseExtractor):
+            def iter_rows(self, start=0):
+                return [['video_id', 'cut'], ['a.mp4', '1-2']][start:]
+
+        self.assertEqual(list(ListExtractor('ops', load=False)
+                              .iter_records()),
+                         [Operation(1, 'a.mp4', (1.0, 2.0), None, None)])
+
+
+class OperationExecutorTests(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.video = os.path.join(self.directory, 'test.mp4')
+        shutil.copy('test.mp4', self.video)
+        self.output_dir = os.path.join(self.directory, 'out')
+        os.mkdir(self.output_dir)
+        self.sheet = os.path.join(self.directory, 'ops.csv')
+        self.ledger = os.path.join(self.directory, 'ledger.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def executor(self, rows, window=10000):
+        with open(self.sheet, 'w') as f:
+            f.write('video_id,cut,convert\n')
+            for row in rows:
+                f.write(','.join(row) + '\n')
+        executor = OperationExecutor(
+            OperationCSVExtractor(self.sheet, load=False), self.output_dir,
+            source_dir=self.directory, ledger_path=self.ledger)
+        executor.window = window
+
+        return executor
+
+    def ledger_rows(self):
+        with open(self.ledger, newline='') as f:
+            return sorted(csv.DictReader(f), key=lambda r: int(r['row']))
+
+    def test_run(self):
+        executor = self.executor([
+            ('test.mp4', '00:00:01-00:00:03', ''),
+            ('test.mp4', '4-6', 'mkv'),
+            ('test.mp4', '1-3', ''),  # the first row again
+            ('test.mp4', '20-30', ''),
+            ('missing.mp4', '1-2', '')])
+        self.assertEqual(executor.run(),
+                         {'done': 2, 'duplicate': 1, 'failed': 2})
+        rows = self.ledger_rows()
+        self.assertEqual([row['status'] for row in rows],
+                         ['done', 'done', 'duplicate', 'failed', 'failed'])
+        self.assertEqual(os.path.basename(rows[1]['output']), 'test_4-6.mkv')
+        info = BasicFFProbe(verbose=False).probe(rows[1]['output'])
+        self.assertAlmostEqual(info.get_media_duration(), 2, delta=0.1)
+        # made already, with overwrite=False; the ledger of
+        # the first run is kept, with a header
+        self.assertEqual(self.executor([('test.mp4', '4-6', 'mkv')]).run(),
+                         {'exists': 1})
+        rows = self.ledger_rows()
+        self.assertEqual(len(rows), 6)
+        self.assertEqual([row['status'] for row in rows if
+                          row['row'] == '1'], ['done', 'exists'])
+
+    def test_same_name(self):
+        # clip.mp4 of two directories are two outputs
+        for name in ('a', 'b'):
+            os.mkdir(os.path.join(self.directory, name))
+            shutil.copy(self.video, os.path.join(self.directory, name))
+        executor = self.executor([('a/test.mp4', '1-2', 'mkv'),
+                                  ('b/test.mp4', '1-2', 'mkv')])
+        self.assertEqual(executor.run(), {'done': 2})
+        self.assertEqual([os.path.relpath(row['output'], self.output_dir)
+                          for row in self.ledger_rows()],
+                         [os.path.join('a', 'test_1-2.mkv'),
+                          os.path.join('b', 'test_1-2.mkv')])
+
+    def test_failed_output(self):
+        # the group fails as a whole, then each row is made alone
+        executor = self.executor([('test.mp4', '1-2', 'nosuchformat'),
+                                  ('test.mp4', '1-2', 'mkv')])
+        self.assertEqual(executor.run(), {'done': 1, 'failed': 1})
+        self.assertEqual([row['status'] for row in self.ledger_rows()],
+                         ['failed', 'done'])
+
+    def test_failed_over_old_output(self):
+        # an old output is not taken for the one which failed,
+        # and the error of ffmpeg goes to the ledger
+        old = os.path.join(self.output_dir, 'test_1-2.nosuchformat')
+        with open(old, 'w') as f:
+            f.write('old')
+        executor = self.executor([('test.mp4', '1-2', 'nosuchformat')])
+        executor.overwrite = True
+        self.assertEqual(executor.run(), {'failed': 1})
+        error = self.ledger_rows()[0]['error']
+        self.assertNotEqual(error, 'ffmpeg made no output')
+        with open(old) as f:
+            self.assertEqual(f.read(), 'old')
+        self.assertEqual(os.listdir(self.output_dir),
+                         ['test_1-2.nosuchformat'])
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -1,8 +1,21 @@
 """Holds important utils which
 will be used for the ffmpeg package"""
+import os
+import re
 import time
 
 
+# size of the chunks which are read at once from
+# the pipes of the child processes; ffmpeg and ffprobe
+# can produce megabytes of output, so read a lot at once
+READ_CHUNK_SIZE = 64 * 1024
+
+# regular expression which finds complete lines in the
+# decoded output; ffmpeg ends progress lines with \r and
+# the other lines with \n, windows builds use \r\n
+_line_regex = re.compile(r'[^\r\n]*(?:\r\n|\r|\n)')
+
+
 # codec objects in a list
 
 # util to convert time to '%H:%M:%S'
@@ -20,9 +33,103 @@ def sec_to_time_format(seconds):
 def find_codec(codec_name, codecs=[]):
     # codecs = [] is the list with codecs
     # which is built by list_codecs method
-    # of the Base of the entire project
+    # of the Base of the entire project;
+    # a base.CodecCatalog is looked up by name
+    lookup = getattr(codecs, 'get', None)
+    if lookup is not None:
+        return lookup(codec_name)
     for codec in codecs:
         if codec_name == codec.codec_name:
             return codec
 
     return None
+
+
+# numpy is optional, it is imported by the methods
+# which return arrays the first time they are used;
+# feature names the method in the error
+def import_numpy(feature):
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('numpy is needed for %s' % feature)
+
+    return numpy
+
+
+# identity of a file as seen by stat; any change of
+# the file changes its size, mtime or inode
+def file_identity(path):
+    try:
+        st = os.stat(path)
+    except (OSError, TypeError):  # e.g. urls, pipes
+        return None
+    mtime_ns = getattr(st, 'st_mtime_ns', None)
+    if mtime_ns is None:  # python 2
+        mtime_ns = int(st.st_mtime * 1e9)
+
+    return (os.path.realpath(path), st.st_size, mtime_ns, st.st_ino)
+
+
+class LineSplitter(object):
+    """Splits raw bytes read from a child process
+    into lines ended by \\n, \\r or \\r\\n. Data is fed
+    chunk by chunk; complete lines are decoded once
+    and returned with their line ending."""
+
+    def __init__(self, encoding='utf-8'):
+        self.encoding = encoding
+        self._buffer = bytearray()  # bytes of the unfinished line
+
+    def feed(self, data):
+        """Adds a chunk of bytes, returns a list
+        with the lines completed by the chunk."""
+        buf = self._buffer
+        buf += data
+        # find the end of the last complete line; a \r
+        # at the very end of the buffer can be the first
+        # half of a \r\n split across two chunks, so we
+        # keep it until the next chunk arrives
+        end = max(buf.rfind(b'\n'), buf.rfind(b'\r', 0, len(buf) - 1))
+        if end < 0:
+            return []
+        end += 1
+        text = buf[:end].decode(self.encoding, 'replace')
+        del buf[:end]
+
+        return _line_regex.findall(text)
+
+    def flush(self):
+        """Returns the lines which are left in the
+        buffer once the end of the stream is reached."""
+        if not self._buffer:
+            return []
+        text = self._buffer.decode(self.encoding, 'replace')
+        del self._buffer[:]
+        lines = _line_regex.findall(text)
+        rest = _line_regex.sub('', text)  # last line without line ending
+        if rest:
+            lines.append(rest)
+
+        return lines
+
+
+# reads lines from a pipe of a child process; the data
+# is read in big chunks into one reusable bytearray instead
+# of byte by byte, the generator stops at the end of file
+def iter_lines(stream, chunk_size=READ_CHUNK_SIZE, encoding='utf-8'):
+    splitter = LineSplitter(encoding)
+    chunk = bytearray(chunk_size)
+    view = memoryview(chunk)
+    # readinto1 returns whatever is available after at most
+    # one read on the pipe, so live output is not delayed
+    # until a whole chunk is filled by the child process
+    readinto = getattr(stream, 'readinto1', None) or stream.readinto
+    while True:
+        n = readinto(view)
+        if not n:  # empty read, end of file
+            break
+        for line in splitter.feed(view[:n]):
+            yield line
+    for line in splitter.flush():
+        yield line
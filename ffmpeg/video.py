@@ -1,10 +1,18 @@
-import logging
-import sys
 import os
-import pdb
-from ffmpeg import BaseFFMpeg, BasicFFMpegParser
-from ffprobe import BasicFFProbe
-from base import FFMpegAlreadyExistsError, FFMpegError
+import bisect
+import itertools
+import math
+import shutil
+import struct
+import tempfile
+from collections import namedtuple
+from fractions import Fraction
+from .ffmpeg import BaseFFMpeg, BasicFFMpegParser
+from .ffprobe import BasicFFProbe
+from .base import FFMpegAlreadyExistsError, FFMpegError
+from .errors import FATAL_ERRORS, FFMpegFatalError
+from .utils import import_numpy
+from .index import NOPTS
 # from base import ConversionFailedError, FFMpegAlreadyExistsError, \
 #    DamagedVideoError, EncodingFailedError, CompressionFailedError
 
@@ -46,6 +54,43 @@ class VideoCutFailed(Exception):
     pass
 
 
+# raised by convert_video_parallel when the stitched output
+# does not have the frames or the duration of the input
+class ConversionCheckFailed(Exception):
+
+    def __init__(self, msg, video_output, expected, found):
+        super(ConversionCheckFailed, self).__init__(msg)
+        self.msg = msg
+        self.video_output = video_output
+        self.expected = expected
+        self.found = found
+
+    def __repr__(self):
+        return '%s in %s: %s expected, %s found' % (
+            self.msg, self.video_output, self.expected, self.found)
+
+    def __str__(self):
+        return self.__repr__()
+
+
+# pixel formats of the frames returned by iter_frames,
+# packed formats only, each pixel is a run of channels;
+# pix_fmt -> (channels, numpy dtype of a channel)
+RAW_PIX_FMTS = {
+    'gray': (1, 'uint8'),
+    'rgb24': (3, 'uint8'),
+    'bgr24': (3, 'uint8'),
+    'rgba': (4, 'uint8'),
+    'bgra': (4, 'uint8'),
+    'argb': (4, 'uint8'),
+    'abgr': (4, 'uint8'),
+    'gray16le': (1, '<u2'),
+    'rgb48le': (3, '<u2'),
+    'rgba64le': (4, '<u2'),
+    'grayf32le': (1, '<f4'),
+}
+
+
 # should we have specific base parsers?
 class VideoFFMpegParser(BasicFFMpegParser):
     # list of errors which are specific
@@ -54,12 +99,16 @@ class VideoFFMpegParser(BasicFFMpegParser):
     # to be passed in the __init__ of the error class
     errors = [FFMpegError('Automatic encoder selection failed',
                           EncoderSelectionFailed,
-                          [r'(codec)\s([\w]+)', r'(format)\s([\w]+)']
+                          pattern=r'^Automatic encoder selection failed'
+                                  r'(?:.*?format (?P<media_format>\w+) '
+                                  r'\(codec (?P<encoder>\w+)\))?'
                           ),
-              FFMpegError('InvalidDurationSpecification', InvalidDurationSpecification,
-                          [r'\d\d:\d\d:\d\d:\d\d'])
+              FFMpegError('Invalid duration specification',
+                          InvalidDurationSpecification,
+                          pattern=r'Invalid duration specification '
+                                  r'for \w+: (?P<duration>\S+)')
 
-              ]
+              ] + FATAL_ERRORS
     #errors = [{'name': 'Automatic encoder selection failed',
     #           'error_class': EncoderSelectionFailed,
     #           'arguments': [r'(codec)\s([\w]+)', r'(format)\s([\w]+)']},
@@ -69,6 +118,98 @@ class VideoFFMpegParser(BasicFFMpegParser):
     #          ]
 
 
+# splits the output of -f image2pipe -c:v png into the
+# png files it is made of; a png is the signature and
+# chunks of length, type, data and crc up to IEND
+def split_png(data):
+    images = []
+    start = 0
+    while start < len(data):
+        pos = start + 8  # the signature
+        end = None
+        while pos + 8 <= len(data):
+            length, kind = struct.unpack('>I4s', data[pos:pos + 8])
+            pos += 12 + length
+            if kind == b'IEND':
+                end = pos
+                break
+        if end is None:  # ffmpeg stopped half way
+            break
+        images.append(data[start:end])
+        start = end
+
+    return images
+
+
+class Rendition(object):
+    """One output of VideoFFMpeg.encode_ladder: the video
+    scaled to height, width keeps the aspect ratio with an
+    even number by default, and encoded with vcodec at
+    video_bitrate, the audio with acodec at audio_bitrate;
+    video=False makes an audio only output, audio=False a
+    video only one. options are more output options, e.g.
+    ['-preset', 'fast', '-g', '48']."""
+
+    def __init__(self, output, height=None, video_bitrate=None,
+                 vcodec='libx264', audio_bitrate=None, acodec='aac',
+                 video=True, audio=True, width=-2, options=None):
+        self.output = output
+        self.height = height  # None keeps the size of the input
+        self.width = width
+        self.video_bitrate = video_bitrate  # e.g. '5M', '800k'
+        self.vcodec = vcodec
+        self.audio_bitrate = audio_bitrate
+        self.acodec = acodec
+        self.video = video
+        self.audio = audio
+        self.options = options or []
+
+    def __repr__(self):
+        return '%s(%r, height=%s, video_bitrate=%s)' % (
+            self.__class__.__name__, self.output, self.height,
+            self.video_bitrate)
+
+
+# what came of a rendition, error is None when it was written
+RenditionResult = namedtuple('RenditionResult', 'rendition ok error')
+
+
+class RenditionProgress(object):
+    """Progress of one output of encode_ladder, made from
+    the progress.Progress record of the process; the outputs
+    are encoded from the same decoded frames, they share
+    the position, the quantizer and the size are theirs."""
+
+    def __init__(self, rendition, record, output_index):
+        self.rendition = rendition
+        self.record = record
+        self.frame = record.frame
+        self.seconds = record.seconds
+        self.speed = record.speed
+        # quantizer of the video stream of the output
+        self.q = None
+        if rendition.video:
+            try:
+                self.q = float(record.values.get(
+                    'stream_%d_0_q' % output_index))
+            except (TypeError, ValueError):
+                pass
+        # bytes written to the output so far
+        try:
+            self.size = os.path.getsize(rendition.output)
+        except OSError:
+            self.size = 0
+
+    def __repr__(self):
+        return '%s(%r, seconds=%s, q=%s, size=%s)' % (
+            self.__class__.__name__, self.rendition.output, self.seconds,
+            self.q, self.size)
+
+    @property
+    def finished(self):
+        return self.record.finished
+
+
 class VideoFFMpeg(BaseFFMpeg):
     # global class variables which
     # help to list codecs and libraries
@@ -77,11 +218,22 @@ class VideoFFMpeg(BaseFFMpeg):
     parser = VideoFFMpegParser  # specific parser to use
     codec_type = 'video'
     lib_type = 'video'
+    # seconds between the timestamps of extract_images under
+    # which one decoder reads from the first to the last of
+    # them, instead of a seek to each of them; a seek decodes
+    # from the keyframe before, about a second of video
+    dense_interval = 1.0
+    # convert_video_parallel makes about two segments for
+    # each worker, none shorter than min_segment_duration
+    # seconds; the output may differ from the input by
+    # duration_tolerance seconds
+    min_segment_duration = 10.0
+    duration_tolerance = 0.1
 
     # TODO
     def convert_video(self, video_input, video_output,
                       overwrite=False, vcodec=None,
-                      acodec=None):
+                      acodec=None, progress=None):
         """
         Method which can be used to convert a video
         from one format to another, keeps the original
@@ -96,8 +248,21 @@ class VideoFFMpeg(BaseFFMpeg):
         :param_type: str, .e.g. -vcodec h264
         :param acodec: the audio codec to use
         :param_type: str, .e.g. -acodec aac
+        :param progress: gets the progress records
+        :param_type: callable, e.g. lambda record: print(record.frame)
         :return: ?
         """
+        _cmds = self._convert_video_cmds(video_input, video_output,
+                                         overwrite, vcodec, acodec)
+        # spawns the child process, parses each line
+        # and returns the status of the process
+        return self._run(_cmds, progress=progress)
+
+    # the commands of each operation are built apart from
+    # running them, so aio.AsyncVideoFFMpeg builds the
+    # same commands and runs them on an event loop
+    def _convert_video_cmds(self, video_input, video_output,
+                            overwrite=False, vcodec=None, acodec=None):
         # check if video_output already exists or not, if it exists
         # then raise FFMpegAlreadyExistsError to inform the user
         if os.path.exists(video_output):
@@ -108,22 +273,364 @@ class VideoFFMpeg(BaseFFMpeg):
 
         # what are we going to return in here?
         # define commands for the ffmpeg operation
-        _cmds = ['-i', video_input, video_output]
+        _cmds = ['-i', video_input]
 
+        # the codecs are options of the output, they come
+        # before it; '-vcodec h264' or just 'h264'
         if vcodec is not None:
-            _cmds.append(vcodec)
+            _cmds.extend(vcodec.split() if vcodec.startswith('-')
+                         else ['-c:v', vcodec])
 
         if acodec is not None:
-            _cmds.append(acodec)
+            _cmds.extend(acodec.split() if acodec.startswith('-')
+                         else ['-c:a', acodec])
 
-        p = self._spawn(_cmds)  # spawn child process
-        # pdb.set_trace()
-        _parser = self.parser(p)  # p goes in __init__
-        _parser.parse_output()  # parses each line
+        _cmds.append(video_output)
+
+        return _cmds
+
+    def convert_video_parallel(self, video_input, video_output,
+                               overwrite=False, vcodec=None, acodec=None,
+                               options=None, workers=None, scheduler=None,
+                               check=True):
+        """
+        Converts a video like convert_video, with many ffmpeg
+        processes at once: the first video stream is split at
+        keyframes into segments which are encoded at the same
+        time, the audio streams are encoded whole by one more
+        process, so the joins have no gaps, and the segments
+        and the audio are put together with the concat demuxer
+        without encoding them again. Other streams are dropped.
+        :param vcodec: the video encoder, the one of the
+        format of video_output by default
+        :param_type: str, e.g. 'libx264'
+        :param acodec: the audio encoder, likewise
+        :param_type: str, e.g. 'aac'
+        :param options: output options of the video encoder
+        :param_type: list, e.g. ['-crf', '23', '-preset', 'fast']
+        :param workers: segments encoded at once, the default
+        of scheduler.JobScheduler when it is None
+        :param_type: int
+        :param scheduler: runs the processes, one is made
+        with workers when it is None
+        :param_type: scheduler.JobScheduler
+        :param check: compare the frames and the duration of
+        video_output with the ones of video_input and raise
+        ConversionCheckFailed when they differ
+        :param_type: Bool
+        :return: the status of the concat process
+        """
+        # imported here, like the pools of the other modules,
+        # so importing video stays light
+        from .scheduler import JobScheduler
+
+        if os.path.exists(video_output) and not overwrite:
+            raise FFMpegAlreadyExistsError(video_output)
+        probe = BasicFFProbe(verbose=self.verbose)
+        info = probe._probe(video_input)
+        video = probe.build_index(video_input).video
+        if video is None or not len(video):
+            raise ValueError('no video frames in %s' % video_input)
+        has_audio = any(stream.codec_type == 'audio'
+                        for stream in info.streams)
+        own_scheduler = scheduler is None
+        directory = None
+        try:
+            if own_scheduler:
+                scheduler = JobScheduler(max_workers=workers)
+            segments = self._segments(video, info.format_info.start_time,
+                                      scheduler.max_workers)
+
+            extension = os.path.splitext(video_output)[1]
+            # next to the output, the segments are as big as it
+            directory = tempfile.mkdtemp(
+                dir=os.path.dirname(os.path.abspath(video_output)))
+            futures = []
+            paths = []
+            for i, (start, frames) in enumerate(segments):
+                path = os.path.join(directory, 'segment%05d%s' %
+                                    (i, extension))
+                paths.append(path)
+                futures.append(scheduler.submit(
+                    self._run, self._segment_cmds(
+                        video_input, path, video.index, start, frames,
+                        vcodec, options)))
+            audio_path = None
+            if has_audio:
+                audio_path = os.path.join(directory, 'audio.mka')
+                # first, the longest job starts before the segments
+                futures.append(scheduler.submit(
+                    self._run, self._audio_cmds(video_input, audio_path,
+                                                acodec), priority=1))
+            try:
+                for future in futures:
+                    future.result()  # raises the error of the job
+            except BaseException:
+                for future in futures:
+                    future.cancel()
+                raise
+            finally:
+                if own_scheduler:  # its threads are not needed anymore
+                    scheduler.shutdown(wait=True, cancel_pending=True)
+
+            list_path = os.path.join(directory, 'segments.txt')
+            with open(list_path, 'w') as f:
+                for path in paths:
+                    f.write("file '%s'\n" % os.path.basename(path))
+            status = self._run(self._concat_cmds(list_path, audio_path,
+                                                 video_output))
+            if check:
+                self._check_conversion(
+                    probe, video_output, directory,
+                    sum(frames for _, frames in segments),
+                    info.get_media_duration())
+        finally:
+            # again when the segments were not reached, shutdown
+            # can be called twice
+            if own_scheduler and scheduler is not None:
+                scheduler.shutdown(wait=True, cancel_pending=True)
+            if directory is not None:
+                shutil.rmtree(directory)
+
+        return status
+
+    def _segments(self, video, start_time, workers):
+        # (start, frames) of each segment; start is the time
+        # of its first keyframe from the start of the file,
+        # None for the first segment, frames is the number of
+        # frames up to the next one, counted in the index
+        pts = sorted(t for t in video.pts if t != NOPTS)
+        keys = list(video.key_pts)
+        duration = float((pts[-1] - pts[0]) * video.time_base)
+        count = max(1, min(2 * workers,
+                           int(duration // self.min_segment_duration)))
+        bounds = []
+        for i in range(1, count):
+            ideal = pts[0] + (pts[-1] - pts[0]) * i // count
+            k = bisect.bisect_left(keys, ideal)
+            # keyframes after the first frame only, once each
+            if k < len(keys) and keys[k] > pts[0] and \
+                    (not bounds or keys[k] > bounds[-1]):
+                bounds.append(keys[k])
+        segments = []
+        first = 0
+        for bound in bounds + [None]:
+            end = bisect.bisect_left(pts, bound) if bound is not None \
+                else len(pts)
+            if first:
+                # -ss counts from the start of the file, rounded
+                # down to a microsecond to keep the keyframe
+                seconds = float(pts[first] * video.time_base) - \
+                    (start_time or 0)
+                start = math.floor(seconds * 1e6) / 1e6
+            else:
+                start = None
+            segments.append((start, end - first))
+            first = end
+
+        return segments
+
+    def _segment_cmds(self, video_input, video_output, stream_index,
+                      start, frames, vcodec=None, options=None):
+        # -ss in front of -i seeks to the keyframe, -frames:v
+        # stops before the next segment; passthrough keeps the
+        # frames as they are, without duplicates for a rate
+        _cmds = []
+        if start is not None:
+            _cmds.extend(['-ss', '%.6f' % start])
+        _cmds.extend(['-i', video_input, '-map', '0:%d' % stream_index,
+                      '-frames:v', str(frames), '-vsync', 'passthrough'])
+        if vcodec is not None:
+            _cmds.extend(['-c:v', vcodec])
+        _cmds.extend(options or [])
+        _cmds.append(video_output)
 
-        return _parser.status_finished  # status of process
+        return _cmds
 
-    def extract_audio(self, video_input):
+    def _audio_cmds(self, video_input, audio_output, acodec=None):
+        # matroska takes the audio of any encoder
+        _cmds = ['-i', video_input, '-map', '0:a', '-vn', '-sn', '-dn']
+        if acodec is not None:
+            _cmds.extend(['-c:a', acodec])
+        _cmds.append(audio_output)
+
+        return _cmds
+
+    def _concat_cmds(self, list_path, audio_input, video_output):
+        # -safe 0 takes the absolute path of the list, the
+        # names in it are next to it
+        _cmds = ['-y', '-f', 'concat', '-safe', '0', '-i', list_path]
+        if audio_input is not None:
+            _cmds.extend(['-i', audio_input, '-map', '0:v', '-map', '1:a'])
+        _cmds.extend(['-c', 'copy', video_output])
+
+        return _cmds
+
+    def _check_conversion(self, probe, video_output, directory,
+                          frames, duration):
+        # the index of the output is thrown away with the
+        # segments, it is not kept next to video_output
+        index = probe.build_index(
+            video_output, os.path.join(directory, 'output.pktidx'))
+        found = len(index.video) if index.video is not None else 0
+        if found != frames:
+            raise ConversionCheckFailed('Frames lost at the joins',
+                                        video_output, frames, found)
+        found = probe._probe(video_output).get_media_duration()
+        if duration is not None and (
+                found is None or
+                abs(found - duration) > self.duration_tolerance):
+            raise ConversionCheckFailed('Duration changed', video_output,
+                                        duration, found)
+
+    def encode_ladder(self, video_input, renditions, overwrite=False,
+                      progress=None):
+        """
+        Encodes the renditions of an adaptive bitrate ladder,
+        e.g. 1080p, 720p, 480p and audio only, with one ffmpeg:
+        the input is decoded once, split and asplit give the
+        frames and the samples to a scale and an encoder for
+        each output.
+        :param renditions: the outputs
+        :param_type: list of Rendition
+        :param progress: gets a RenditionProgress for each
+        rendition at each progress record
+        :param_type: callable, e.g. lambda p: print(p.rendition, p.size)
+        :return: a RenditionResult for each rendition, in order
+
+        ffmpeg stops every output when one of them fails; the
+        renditions the error names, by their encoder, output
+        stream or path, fail with it and the others are run
+        again, an error which names none fails all of them.
+        The input is probed once: without audio, the renditions
+        are video only, and one which gets no stream fails.
+        """
+        for rendition in renditions:
+            if os.path.exists(rendition.output) and not overwrite:
+                raise FFMpegAlreadyExistsError(rendition.output)
+        info = BasicFFProbe(verbose=self.verbose).probe(video_input)
+        # when the probe fails, ffmpeg gives the error
+        kinds = ('video', 'audio') if info is None else \
+            set(stream.codec_type for stream in info.streams)
+        errors = {}  # rendition -> error
+        running = []
+        for rendition in renditions:
+            if (rendition.video and 'video' in kinds) or \
+                    (rendition.audio and 'audio' in kinds):
+                running.append(rendition)
+            else:
+                errors[rendition] = FFMpegFatalError(
+                    'No stream of %s for %s' % (video_input,
+                                                rendition.output),
+                    path=rendition.output)
+        while running:
+            callback = None
+            if progress is not None:
+                def callback(record, running=running):
+                    for i, rendition in enumerate(running):
+                        progress(RenditionProgress(rendition, record, i))
+            try:
+                self._run(self._ladder_cmds(video_input, running,
+                                            overwrite=True, kinds=kinds),
+                          progress=callback)
+            except FFMpegFatalError as e:
+                failed = self._failed_renditions(running, e)
+                for rendition in failed:
+                    errors[rendition] = e
+                running = [rendition for rendition in running
+                           if rendition not in failed]
+                continue
+            for rendition in running:
+                if not os.path.exists(rendition.output) or \
+                        not os.path.getsize(rendition.output):
+                    errors[rendition] = FFMpegFatalError(
+                        'Nothing written to %s' % rendition.output,
+                        path=rendition.output)
+            break
+
+        return [RenditionResult(rendition, rendition not in errors,
+                                errors.get(rendition))
+                for rendition in renditions]
+
+    def _ladder_cmds(self, video_input, renditions, overwrite=False,
+                     kinds=('video', 'audio')):
+        # one graph: split gives the decoded frames to a scale
+        # for each video output, asplit the samples to each
+        # audio one; an output which needs no filter maps the
+        # stream of the input. kinds are the streams the input
+        # has, the renditions get the others of them only
+        video = [rendition for rendition in renditions
+                 if rendition.video and 'video' in kinds]
+        audio = [rendition for rendition in renditions
+                 if rendition.audio and 'audio' in kinds]
+        chains = []
+        labels = {}  # (rendition, kind) -> what -map takes
+        if len(video) > 1:
+            chains.append('[0:v:0]split=%d%s' % (len(video), ''.join(
+                '[vs%d]' % i for i in range(len(video)))))
+        for i, rendition in enumerate(video):
+            source = '[vs%d]' % i if len(video) > 1 else '[0:v:0]'
+            if rendition.height is not None:
+                chains.append('%sscale=%d:%d[v%d]' % (
+                    source, rendition.width, rendition.height, i))
+                labels[rendition, 'v'] = '[v%d]' % i
+            else:
+                labels[rendition, 'v'] = source if len(video) > 1 \
+                    else '0:v:0'
+        if len(audio) > 1:
+            chains.append('[0:a:0]asplit=%d%s' % (len(audio), ''.join(
+                '[as%d]' % i for i in range(len(audio)))))
+        for i, rendition in enumerate(audio):
+            labels[rendition, 'a'] = '[as%d]' % i if len(audio) > 1 \
+                else '0:a:0'
+        _cmds = ['-i', video_input]
+        if chains:
+            _cmds.extend(['-filter_complex', ';'.join(chains)])
+        # the video stream is the first of each output, the
+        # progress has the quantizer of stream_<output>_0_q
+        for rendition in renditions:
+            if (rendition, 'v') in labels:
+                _cmds.extend(['-map', labels[rendition, 'v'],
+                              '-c:v', rendition.vcodec])
+                if rendition.video_bitrate is not None:
+                    _cmds.extend(['-b:v', str(rendition.video_bitrate)])
+            if (rendition, 'a') in labels:
+                _cmds.extend(['-map', labels[rendition, 'a'],
+                              '-c:a', rendition.acodec])
+                if rendition.audio_bitrate is not None:
+                    _cmds.extend(['-b:a', str(rendition.audio_bitrate)])
+            _cmds.extend(rendition.options)
+            if overwrite:
+                _cmds.append('-y')
+            _cmds.append(rendition.output)
+
+        return _cmds
+
+    @staticmethod
+    def _failed_renditions(renditions, error):
+        # the renditions error names: output streams are
+        # #output:stream and outputs are counted from 0
+        # in the order of the renditions
+        details = getattr(error, 'details', {})
+        output = details.get('output')
+        if output is None and details.get('stream'):
+            output = details['stream'].split(':')[0]
+        if output is not None and int(output) < len(renditions):
+            return [renditions[int(output)]]
+        encoder = details.get('encoder')
+        if encoder is not None:
+            failed = [rendition for rendition in renditions
+                      if (rendition.video and rendition.vcodec == encoder) or
+                      (rendition.audio and rendition.acodec == encoder)]
+            if failed:
+                return failed
+        path = details.get('path')
+        failed = [rendition for rendition in renditions
+                  if path is not None and rendition.output == path]
+
+        return failed or list(renditions)
+
+    def extract_audio(self, video_input, progress=None):
         """Method to extract the audio stream
         from a video file, copies the audio stream
         without re-encoding it.
@@ -137,14 +644,19 @@ class VideoFFMpeg(BaseFFMpeg):
             print('Make sure video exists')
             return None
 
+        info = BasicFFProbe()._probe(video_input)  # probe the video
+        _cmds = self._extract_audio_cmds(video_input, info)
+        # spawn the child process and parse its output
+        return self._run(_cmds, progress=progress)
+
+    def _extract_audio_cmds(self, video_input, info):
         # FIXME we need a way to generate the extension of the
         # audio stream, so we can copy without re-encoding it
         # so we need to determine the extension of the audio
         # stream with the help of the ?
-        info = BasicFFProbe().probe(video_input)  # probe the video
         for stream in info.streams:
-            if stream._codec_info['codec_type'] == 'audio':
-                extension = stream._codec_info['codec_name']
+            if stream.codec_type == 'audio':
+                extension = stream.codec_name
 
         output_audio = '.'.join(['external_audio', extension])
 
@@ -153,13 +665,10 @@ class VideoFFMpeg(BaseFFMpeg):
 
         _cmds = ['-i', video_input, '-vn', '-acodec', 'copy',
                  output_audio]
-        p = self._spawn(_cmds)  # spawns a child process
-        _parser = self.parser(p)  # child process is passed to the __init__
-        _parser.parse_output()  # method to parse output in the parser
 
-        return _parser.status_finished  # return the status of the parser
+        return _cmds
 
-    def extract_video(self, video_input):
+    def extract_video(self, video_input, progress=None):
         """Method to extract the video stream
         from a video file, copies without re-encoding
         it.
@@ -177,18 +686,20 @@ class VideoFFMpeg(BaseFFMpeg):
         # the ffmpeg.base.MediaInfo.format_info by using the
         # probe utility being found in the BasicFFProbe class
 
-        info = BasicFFProbe().probe(video_input)  # ffmpeg.base.MediaInfo object
-        extension = info.format_info['format_name']  # get the extension
+        info = BasicFFProbe()._probe(video_input)  # ffmpeg.base.MediaInfo object
+        _cmds = self._extract_video_cmds(video_input, info)
+
+        return self._run(_cmds, progress=progress)  # return status
+
+    def _extract_video_cmds(self, video_input, info):
+        extension = info.format_info.format_name  # get the extension
         if ',' in extension:  # matroska, webm;
             extension = extension.split(',')[1]
         # pdb.set_trace()
         output_video = '.'.join(['video_stream', extension])  # video file to output
         _cmds = ['-i', video_input, '-an', '-vcodec', 'copy', output_video]  # ffmpeg commands to execute
-        p = self._spawn(_cmds)  # spawn the child process
-        _parser = self.parser(p)  # activate the parser
-        _parser.parse_output()  # parse the output
 
-        return _parser.status_finished  # return status
+        return _cmds
 
     def remove_audio(self):
         """Method to remove the
@@ -211,7 +722,7 @@ class VideoFFMpeg(BaseFFMpeg):
         return _parser.status_finished
 
     def cut_video(self, video_input, video_output,
-                  start_cut, end_cut=None):
+                  start_cut, end_cut=None, progress=None):
         """Method to cut a delta from
         a video.
         param video_input: the video to cut from
@@ -239,33 +750,335 @@ class VideoFFMpeg(BaseFFMpeg):
         # video with the following if conditional
         if end_cut is None:
             # setup end_cut to the end length of the video
-            info = BasicFFProbe().probe('test.mp4')
+            info = BasicFFProbe()._probe(video_input)
             end_cut = str(info.get_media_duration())
 
+        _cmds = self._cut_video_cmds(video_input, video_output,
+                                     start_cut, end_cut)
+
+        return self._run(_cmds, progress=progress)  # return the status
+
+    def _cut_video_cmds(self, video_input, video_output,
+                        start_cut, end_cut):
         # build the commands for cutting the video
         _cmds = ['-i', video_input, '-ss', start_cut, '-to',
                  end_cut, '-c', 'copy', video_output]
-        p = self._spawn(_cmds)  # spawn the child process
-        _parser = self.parser(p)  # activate the parser
-        _parser.parse_output()  # parse the output
 
-        return _parser.status_finished  # return the status
+        return _cmds
 
     def extract_image(self, video_input, start_point,
-                      extract_all=False):
+                      extract_all=False, progress=None):
         """Method to extract image or
         images from a video file"""
-        _cmds = ['-i', video_input, '-ss', start_point,
+        _cmds = self._extract_image_cmds(video_input, start_point,
+                                         extract_all)
+
+        return self._run(_cmds, progress=progress)  # return the status
+
+    def _extract_image_cmds(self, video_input, start_point,
+                            extract_all=False):
+        # -ss in front of -i seeks in the input, ffmpeg decodes
+        # from the keyframe before start_point and not from the
+        # start of the file
+        _cmds = ['-ss', start_point, '-i', video_input,
                  '-vframes', '1', 'output.png']  # list of ffmpeg commands
-        p = self._spawn(_cmds)  # spawn the child process
-        _parser = self.parser(p)  # activate the parser
-        _parser.parse_output()  # parse the output
 
-        return _parser.status_finished  # return the status
+        return _cmds
+
+    def extract_images(self, video_input, timestamps, output_pattern=None,
+                       as_arrays=False, size=None, pix_fmt='rgb24',
+                       dense=None, overwrite=False):
+        """Extracts the frames at timestamps, seconds from the
+        start of the video, with one ffmpeg process; an image
+        is the first frame at or after its timestamp.
+
+        Timestamps far apart are each seeked to in the input,
+        ffmpeg decodes a few frames from the keyframe before
+        each of them; timestamps close to each other are read
+        by one decoder which runs from the first to the last
+        of them, see dense_interval. dense=True or False
+        chooses one of the two.
+
+        :param output_pattern: e.g. 'thumb_%03d.jpg', the
+        images are written to files named by the index of
+        their timestamp, the paths are returned
+        :param as_arrays: returns a numpy array of shape
+        (len(timestamps), height, width, channels)
+        :param size: (width, height) to scale to, one of
+        them None keeps the aspect ratio
+        :param pix_fmt: packed format of the arrays
+        :return: the paths, the array, or else a list
+        with the png data of each image, in the order of
+        timestamps; a timestamp after the last frame of the
+        video has no image, None in the lists and a row of
+        zeros in the array
+        """
+        timestamps = [float(t) for t in timestamps]
+        if not timestamps:
+            return []
+        if min(timestamps) < 0:
+            raise ValueError('timestamps are seconds from the start')
+        if output_pattern is not None:
+            paths = [output_pattern % i for i in range(len(timestamps))]
+            for path in paths:
+                if os.path.exists(path) and not overwrite:
+                    raise FFMpegAlreadyExistsError(path)
+        # the graph only gets the timestamps which have a frame,
+        # one without would shift the images after it
+        last = self._last_frame_time(video_input)
+        kept = [i for i, t in enumerate(timestamps)
+                if last is None or t <= last + 1e-3]
+        times = [timestamps[i] for i in kept]
+        if dense is None and times:
+            span = max(times) - min(times)
+            dense = span <= self.dense_interval * (len(times) - 1)
+
+        frame_size = None
+        if as_arrays or size is not None:
+            frame_size = self._frame_size(video_input, size)
+        if times:
+            _cmds = self._extract_images_cmds(
+                video_input, times, frame_size if size else None, dense,
+                autorotate=not as_arrays)
+        if output_pattern is not None:
+            return self._write_images(_cmds if times else None,
+                                      output_pattern, paths, kept)
+        if as_arrays:
+            numpy = import_numpy('extract_images')
+            channels, dtype = RAW_PIX_FMTS[pix_fmt]
+            width, height = frame_size
+            images = numpy.zeros((len(timestamps), height, width,
+                                  channels), dtype)
+            if not times:
+                return images
+            found = numpy.empty((len(times), height, width, channels),
+                                dtype)
+            _cmds += ['-f', 'rawvideo', '-pix_fmt', pix_fmt, 'pipe:1']
+            rows = 0
+            for _, rows in self._iter_raw(_cmds, [found]):
+                pass
+            images[kept[:rows]] = found[:rows]
+            return images
+        images = [None] * len(timestamps)
+        if not times:
+            return images
+        _cmds += ['-f', 'image2pipe', '-c:v', 'png', 'pipe:1']
+        p = self._spawn(self._thread_cmds(_cmds))
+        worker, errors = self._parse_in_background(p)
+        data = p.stdout.read()
+        worker.join()
+        p.wait()
+        if errors:
+            raise errors[0]
+        for i, png in zip(kept, split_png(data)):
+            images[i] = png
+
+        return images
+
+    def _write_images(self, _cmds, output_pattern, paths, kept):
+        # the images are written with the numbers 0, 1, 2, ...
+        # to a directory next to the paths, then renamed to
+        # the path of their timestamp; None for the missing
+        found = [None] * len(paths)
+        if _cmds is None:
+            return found
+        directory = tempfile.mkdtemp(
+            dir=os.path.dirname(os.path.abspath(paths[0])))
+        try:
+            pattern = os.path.join(
+                directory, '%06d' + os.path.splitext(output_pattern)[1])
+            self._run(_cmds + ['-f', 'image2', '-start_number', '0',
+                               pattern])
+            for j, i in enumerate(kept):
+                if os.path.exists(pattern % j):
+                    os.replace(pattern % j, paths[i])
+                    found[i] = paths[i]
+        finally:
+            shutil.rmtree(directory)
+
+        return found
+
+    def _last_frame_time(self, path):
+        # seconds of the last frame of the video stream, its
+        # duration less one frame; None when it is not known
+        info = BasicFFProbe(verbose=self.verbose).probe(path)
+        if info is None:
+            return None
+        for stream in info.streams:
+            if stream.codec_type == 'video':
+                break
+        else:
+            return None
+        duration = stream.duration or info.get_media_duration()
+        if not duration:
+            return None
+        rate = stream.avg_frame_rate or stream.r_frame_rate
+        if rate:
+            duration -= 1.0 / float(rate)
+
+        return duration
+
+    def _extract_images_cmds(self, video_input, timestamps, size=None,
+                             dense=False, autorotate=True):
+        # one filtergraph picks the first frame at or after each
+        # timestamp, trim=end_frame=1 ends a branch after it, and
+        # concat puts the branches in the order of timestamps
+        _cmds = []
+        branches = []
+        if dense:
+            # one decoder from the first timestamp; -ss in the
+            # input makes the frame at start the time 0
+            start = min(timestamps)
+            if not autorotate:
+                _cmds.append('-noautorotate')
+            _cmds.extend(['-ss', '%.6f' % start, '-i', video_input])
+            graph = '[0:v:0]split=%d%s' % (
+                len(timestamps),
+                ''.join('[s%d]' % i for i in range(len(timestamps))))
+            branches.append(graph)
+            for i, t in enumerate(timestamps):
+                branches.append('[s%d]trim=start=%.6f,trim=end_frame=1[v%d]'
+                                % (i, t - start, i))
+        else:
+            # an input per timestamp, each seeks on its own
+            for i, t in enumerate(timestamps):
+                if not autorotate:
+                    _cmds.append('-noautorotate')
+                _cmds.extend(['-ss', '%.6f' % t, '-i', video_input])
+                branches.append('[%d:v:0]trim=end_frame=1[v%d]' % (i, i))
+        # the images get the times 0, 1, 2, ... seconds, the
+        # ones of the video can repeat, which encoders reject
+        concat = '%sconcat=n=%d:v=1:a=0,setpts=N/TB' % (
+            ''.join('[v%d]' % i for i in range(len(timestamps))),
+            len(timestamps))
+        if size is not None:
+            concat += ',scale=%d:%d' % size
+        branches.append(concat + '[images]')
+        # -vsync 0 passes the frames as they are, without
+        # dropping or duplicating them for a frame rate
+        _cmds.extend(['-filter_complex', ';'.join(branches),
+                      '-map', '[images]', '-vsync', '0'])
+
+        return _cmds
+
+    def iter_frames(self, path, pix_fmt='rgb24', size=None, fps=None,
+                    start=None, end=None, batch=None, buffers=3):
+        """Decodes the first video stream of path and yields
+        its frames as numpy arrays of shape (height, width,
+        channels), or blocks of shape (batch, height, width,
+        channels) when batch is given; the last block has
+        the frames which are left.
+
+        ffmpeg writes the raw frames to a pipe and they are
+        read into a ring of buffers arrays allocated once,
+        the arrays yielded are views of the ring: a frame is
+        overwritten buffers frames later, copy it to keep it.
+
+        :param pix_fmt: packed pixel format, see RAW_PIX_FMTS
+        :param size: (width, height) to scale to, one of them
+        None keeps the aspect ratio, e.g. (224, None)
+        :param fps: frames per second to output, e.g. 1
+        :param start: seconds or '%H:%M:%S' to start from
+        :param end: seconds or '%H:%M:%S' to stop at
+        """
+        numpy = import_numpy('iter_frames')
+        if pix_fmt not in RAW_PIX_FMTS:
+            raise ValueError('pix_fmt %s is not a packed format, one '
+                             'of %s' % (pix_fmt,
+                                        ', '.join(sorted(RAW_PIX_FMTS))))
+        channels, dtype = RAW_PIX_FMTS[pix_fmt]
+        width, height = self._frame_size(path, size)
+        per_block = batch or 1
+        ring = [numpy.empty((per_block, height, width, channels), dtype)
+                for _ in range(max(buffers, 1))]
+
+        _cmds = self._iter_frames_cmds(
+            path, pix_fmt, (width, height) if size is not None else None,
+            fps, start, end)
+        for block, frames in self._iter_raw(_cmds, itertools.cycle(ring)):
+            if batch is None:
+                yield block[0]
+            else:
+                yield block[:frames]
+
+    def _frame_size(self, path, size):
+        # width and height of the frames, the ones of the
+        # video stream unless size scales them
+        if size is not None and None not in size:
+            return int(size[0]), int(size[1])
+        info = BasicFFProbe(verbose=self.verbose).probe(path)
+        stream = None
+        if info is not None:
+            for stream in info.streams:
+                if stream.codec_type == 'video':
+                    break
+            else:
+                stream = None
+        if stream is None or not stream.width or not stream.height:
+            raise ValueError('%s has no video stream' % path)
+        if size is None:
+            return stream.width, stream.height
+        width, height = size
+        # ffmpeg gets both of them, rounded to even numbers
+        # like scale=-2 does, so they are known here
+        if width is None:
+            width = 2 * int(round(height * stream.width /
+                                  (2.0 * stream.height)))
+        else:
+            height = 2 * int(round(width * stream.height /
+                                   (2.0 * stream.width)))
+
+        return int(width), int(height)
+
+    def _iter_frames_cmds(self, path, pix_fmt, size=None, fps=None,
+                          start=None, end=None):
+        # -ss and -to are options of the input, ffmpeg seeks
+        # to start and stops reading the input at end; the
+        # frames come as stored, -noautorotate keeps them in
+        # the geometry given by the probe
+        _cmds = ['-noautorotate']
+        if start is not None:
+            _cmds.extend(['-ss', str(start)])
+        if end is not None:
+            _cmds.extend(['-to', str(end)])
+        _cmds.extend(['-i', path, '-map', '0:v:0', '-an', '-sn'])
+        filters = []
+        if fps is not None:
+            filters.append('fps=%s' % fps)
+        if size is not None:
+            filters.append('scale=%d:%d' % size)
+        if filters:
+            _cmds.extend(['-vf', ','.join(filters)])
+        _cmds.extend(['-f', 'rawvideo', '-pix_fmt', pix_fmt, 'pipe:1'])
+
+        return _cmds
+
+    def writer(self, video_output, size, fps=25, pix_fmt='rgb24',
+               vcodec='libx264', crf=None, output_pix_fmt='yuv420p',
+               overwrite=False, progress=None):
+        """Returns a VideoWriter which encodes the numpy
+        frames written to it into video_output, e.g.
+
+        with v.writer('out.mp4', (640, 480), fps=30) as writer:
+            for frame in frames:  # (480, 640, 3) uint8 arrays
+                writer.write(frame)
+
+        :param size: (width, height) of the frames
+        :param pix_fmt: packed format of the frames, see
+        RAW_PIX_FMTS
+        :param vcodec: encoder, e.g. libx264, libvpx-vp9
+        :param crf: constant rate factor of the encoder,
+        e.g. 23, None leaves the default of the encoder
+        :param output_pix_fmt: pixel format of the video,
+        None leaves the choice to the encoder
+        :param progress: gets the progress records
+        """
+        return VideoWriter(self, video_output, size, fps, pix_fmt, vcodec,
+                           crf, output_pix_fmt, overwrite, progress)
 
     # FIXME does not work at all
     def add_audio(self, video_input, audio_input,
-                  video_output):
+                  video_output, progress=None):
         """Method to add audio stream
         to a video, it just copies the stream
         without re-encoding.
@@ -276,14 +1089,17 @@ class VideoFFMpeg(BaseFFMpeg):
         param video_output: e.g. the video to output
         param type: str, e.g. output.mp4
         """
+        _cmds = self._add_audio_cmds(video_input, audio_input,
+                                     video_output)
+
+        return self._run(_cmds, progress=progress)  # return the status
+
+    def _add_audio_cmds(self, video_input, audio_input, video_output):
         # define the ffmpeg commands to add audio stream
         _cmds = ['-i', video_input, '-i', audio_input, '-c',
                  'copy', '-map', '0:v' '-map' '1:a', video_output]
-        p = self._spawn(_cmds)  # spawn the child process
-        _parser = self.parser(p)  # activate the parser
-        _parser.parse_output()  # parse the ffmpeg output
 
-        return _parser.status_finished  # return the status
+        return _cmds
 
     def extract_subtitles(self):
         """Method to extract the subtitles
@@ -296,48 +1112,449 @@ class VideoFFMpeg(BaseFFMpeg):
         return _parser.status_finished
 
 
-class BasicVideoFFMpegEdit(BaseFFMpeg):
-    """Subclass which deals with basic
-    editing of the video"""
-
-    def crop_video(self):
-        """Method which is used to
-        crop a video"""
-        _cmds = []
-        p = self._spawn(_cmds)
-        _parser = self.parser(p)
-
-        return _parser.parse_output()
-
-    def rotate_video(self):
-        """Method which is used to
-        rotate video"""
-        _cmds = []
-        p = self._spawn(_cmds)
-        _parser = self.parser(p)
+class VideoWriter(object):
+    """Encodes numpy frames with ffmpeg, the frames are
+    written to its stdin as rawvideo; see
+    VideoFFMpeg.writer. A write waits while ffmpeg is
+    behind, so the frames in flight are the ones held by
+    the pipe. The log and the progress of ffmpeg are read
+    on a thread of their own."""
+
+    def __init__(self, wrapper, video_output, size, fps=25,
+                 pix_fmt='rgb24', vcodec='libx264', crf=None,
+                 output_pix_fmt='yuv420p', overwrite=False,
+                 progress=None):
+        if pix_fmt not in RAW_PIX_FMTS:
+            raise ValueError('pix_fmt %s is not a packed format, one '
+                             'of %s' % (pix_fmt,
+                                        ', '.join(sorted(RAW_PIX_FMTS))))
+        if os.path.exists(video_output) and not overwrite:
+            raise FFMpegAlreadyExistsError(video_output)
+        self.wrapper = wrapper  # VideoFFMpeg which runs ffmpeg
+        self.video_output = video_output
+        self.width, self.height = size
+        self.fps = fps
+        self.pix_fmt = pix_fmt
+        self.vcodec = vcodec
+        self.crf = crf
+        self.output_pix_fmt = output_pix_fmt
+        self.overwrite = overwrite
+        self.progress = progress
+        self.frames = 0  # frames written so far
+        channels, dtype = RAW_PIX_FMTS[pix_fmt]
+        self._frame_shape = (self.height, self.width, channels)
+        self._dtype = dtype
+        self._p = None  # ffmpeg, spawned by open
+        self._worker = None  # thread which parses the log
+        self._errors = []
 
-        return _parser.parse_output()
+    def __repr__(self):
+        return '%s(%r, %d frames)' % (self.__class__.__name__,
+                                      self.video_output, self.frames)
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:  # the frames stopped half way, do not finish the file
+            self.abort()
+
+    def open(self):
+        """Spawns ffmpeg, done by the with statement."""
+        _cmds = self._cmds()
+        if self.progress is not None:
+            _cmds = self.wrapper._progress_cmds() + _cmds
+        self._p = self.wrapper._spawn(_cmds)
+        self._worker, self._errors = \
+            self.wrapper._parse_in_background(self._p, self.progress)
+
+        return self
+
+    def _cmds(self):
+        # the frames come from pipe:0 as rawvideo, which has
+        # no header, so their geometry and rate are given
+        _cmds = ['-f', 'rawvideo', '-pix_fmt', self.pix_fmt,
+                 '-video_size', '%dx%d' % (self.width, self.height),
+                 '-framerate', str(self.fps), '-i', 'pipe:0', '-an',
+                 '-c:v', self.vcodec]
+        if self.crf is not None:
+            _cmds.extend(['-crf', str(self.crf)])
+        if self.output_pix_fmt is not None:
+            _cmds.extend(['-pix_fmt', self.output_pix_fmt])
+        if self.overwrite:
+            _cmds.append('-y')
+        _cmds.append(self.video_output)
+
+        return self.wrapper._thread_cmds(_cmds)
+
+    def write(self, frames):
+        """Writes a frame, an array of shape (height, width,
+        channels), or a block of them of shape (n, height,
+        width, channels); C contiguous arrays are written
+        as they are, without a copy."""
+        if self._p is None:
+            self.open()
+        if frames.shape == self._frame_shape:
+            count = 1
+        elif frames.shape[1:] == self._frame_shape:
+            count = len(frames)
+        else:
+            raise ValueError('frames of shape %s, not %s' % (
+                frames.shape, self._frame_shape))
+        if frames.dtype != self._dtype:
+            raise ValueError('frames of dtype %s, not %s' % (
+                frames.dtype, self._dtype))
+        if not frames.flags.c_contiguous:
+            frames = frames.copy()  # e.g. a crop of a bigger frame
+        try:
+            self._p.stdin.write(memoryview(frames.reshape(-1).view('uint8')))
+        except (IOError, OSError):  # e.g. ffmpeg failed and exited
+            self._finish()
+            raise
+        self.frames += count
+
+    def close(self):
+        """Ends the input of ffmpeg and waits until it has
+        encoded the frames; returns True like the other
+        operations, raises the errors of the log."""
+        if self._p is None:
+            self.open()
+        try:
+            self._p.stdin.close()
+        except (IOError, OSError):  # the last frames did not fit
+            pass
+        self._finish()
+
+        return True
+
+    def abort(self):
+        """Stops ffmpeg without waiting for it to encode
+        the frames written."""
+        if self._p is not None and self._p.poll() is None:
+            self._p.terminate()
+        try:
+            self.close()
+        except Exception:
+            pass
+
+    def _finish(self):
+        self._worker.join()
+        self._p.wait()
+        if self._errors:
+            raise self._errors[0]
+
+
+# transpose filters of the rotations by quarter turns,
+# clockwise; the size of the video is swapped by 90 and 270
+_QUARTER_TURNS = {90: 'transpose=clock', 180: 'hflip,vflip',
+                  270: 'transpose=cclock'}
+
+
+class VideoEdit(object):
+    """Edits of a video put in one filtergraph, the video
+    is decoded and encoded once by run; each edit returns
+    the VideoEdit, so they are chained:
+
+        v = BasicVideoFFMpegEdit(verbose=False)
+        v.edit('in.mp4').crop(1280, 720).scale(640, 360) \\
+            .overlay('logo.png', 10, 10).run('out.mp4')
+
+    The size and the frame rate of the video are followed
+    from the probe through the edits; edits which change
+    nothing, e.g. a scale to the size the video has, are
+    dropped, and a scale, a crop, a rotation by quarter
+    turns or an fps right after one of its own kind is
+    merged with it. When no edit is left, run copies.
+
+    The edits work on the frames as they are stored, in
+    the size given by the probe; a rotation of the display,
+    e.g. of a phone video, is not applied, rotate does it."""
+
+    def __init__(self, wrapper, video_input):
+        self.wrapper = wrapper
+        self.video_input = video_input
+        info = BasicFFProbe(verbose=wrapper.verbose)._probe(video_input)
+        video = [stream for stream in info.streams
+                 if stream.codec_type == 'video']
+        if not video:
+            raise ValueError('no video stream in %s' % video_input)
+        self.size = (video[0].width, video[0].height)
+        self.fps = video[0].avg_frame_rate or None
+        self.duration = info.get_media_duration()
+        # (name, params, size and fps before the step)
+        self.steps = []
+        self.overlays = []  # inputs 1, 2, ... of the graph
 
-    def blur_video(self):
-        _cmds = []
-        p = self._spawn(_cmds)
-        _parser = self.parser(p)
+    def __repr__(self):
+        return '%s(%r, %s)' % (self.__class__.__name__, self.video_input,
+                               [step[0] for step in self.steps])
+
+    def _last(self, name):
+        # the last step when it is a name step, else None
+        if self.steps and self.steps[-1][0] == name:
+            return self.steps[-1]
+        return None
+
+    def _add(self, name, params, size=None, fps=None):
+        # size and fps are the ones after the step
+        self.steps.append((name, params, self.size, self.fps))
+        self.size = size or self.size
+        self.fps = fps or self.fps
+
+    def _undo(self):
+        # removes the last step, for merging it with the next
+        _, params, self.size, self.fps = self.steps.pop()
+        return params
+
+    def crop(self, width, height, x=None, y=None):
+        """Keeps width x height pixels from x, y, the
+        centre of the video by default."""
+        last = self._last('crop')
+        if x is None:
+            x = (self.size[0] - width) // 2
+        if y is None:
+            y = (self.size[1] - height) // 2
+        if (x < 0 or y < 0 or x + width > self.size[0] or
+                y + height > self.size[1]):
+            raise ValueError('crop %dx%d at %d,%d out of %dx%d' % (
+                width, height, x, y, self.size[0], self.size[1]))
+        if last is not None:
+            # a crop of a crop is one crop of the first input
+            x += last[1]['x']
+            y += last[1]['y']
+            self._undo()
+        if (width, height) != self.size:
+            self._add('crop', {'width': width, 'height': height,
+                               'x': x, 'y': y}, (width, height))
+
+        return self
+
+    def scale(self, width=-1, height=-1):
+        """Scales to width x height; -1 for one of them keeps
+        the aspect ratio, -2 keeps it with an even number."""
+        width, height = self._scaled_size(width, height)
+        if self._last('scale') is not None:
+            self._undo()  # only the last of scales is needed
+        if (width, height) != self.size:
+            self._add('scale', {'width': width, 'height': height},
+                      (width, height))
+
+        return self
+
+    def resize(self, factor):
+        """Scales both sides by factor, to even numbers."""
+        return self.scale(int(round(self.size[0] * factor / 2.0)) * 2,
+                          int(round(self.size[1] * factor / 2.0)) * 2)
+
+    def _scaled_size(self, width, height):
+        # the size the scale filter computes for -1 and -2,
+        # the other side rescaled, rounded to a multiple of n
+        in_width, in_height = self.size
+        if width < 0 and height < 0:
+            return self.size
+        if width < 0:
+            n = -width
+            width = int(round(float(height) * in_width /
+                              (in_height * n))) * n
+        elif height < 0:
+            n = -height
+            height = int(round(float(width) * in_height /
+                               (in_width * n))) * n
+
+        return width, height
+
+    def rotate(self, angle):
+        """Rotates clockwise by angle degrees; quarter turns
+        transpose the video, other angles keep its size and
+        fill the corners with black."""
+        angle = angle % 360
+        last = self._last('rotate')
+        if angle % 90 == 0 and last is not None and \
+                last[1]['angle'] % 90 == 0:
+            angle = (angle + self._undo()['angle']) % 360
+        if angle:
+            size = self.size
+            if angle in (90, 270):
+                size = (size[1], size[0])
+            self._add('rotate', {'angle': angle}, size)
+
+        return self
+
+    def blur(self, radius=5):
+        """Box blur of radius pixels."""
+        if radius:
+            self._add('blur', {'radius': radius})
+
+        return self
+
+    def pad(self, width, height, x=None, y=None, color='black'):
+        """Puts the video on a width x height area of color,
+        at x, y, the centre by default."""
+        if x is None:
+            x = (width - self.size[0]) // 2
+        if y is None:
+            y = (height - self.size[1]) // 2
+        if (x < 0 or y < 0 or x + self.size[0] > width or
+                y + self.size[1] > height):
+            raise ValueError('pad %dx%d at %d,%d smaller than %dx%d' % (
+                width, height, x, y, self.size[0], self.size[1]))
+        if (width, height) != self.size:
+            self._add('pad', {'width': width, 'height': height,
+                              'x': x, 'y': y, 'color': color},
+                      (width, height))
+
+        return self
+
+    def set_fps(self, fps):
+        """Drops or repeats frames to fps frames per second,
+        e.g. 30, '30000/1001'."""
+        if self._last('fps') is not None:
+            self._undo()
+        fps = Fraction(str(fps))
+        if fps != self.fps:
+            self._add('fps', {'fps': fps}, fps=fps)
+
+        return self
+
+    def overlay(self, overlay_input, x=0, y=0, size=None):
+        """Puts the image or video overlay_input over the
+        video at x, y, numbers or expressions of the overlay
+        filter, e.g. 'main_w-overlay_w-10'; size scales it."""
+        self.overlays.append(overlay_input)
+        self._add('overlay', {'input': len(self.overlays), 'x': x,
+                              'y': y, 'size': size})
+
+        return self
+
+    def _filter(self, name, params):
+        # the filters of a step which is not an overlay
+        if name == 'crop':
+            return 'crop=%(width)d:%(height)d:%(x)d:%(y)d' % params
+        if name == 'scale':
+            return 'scale=%(width)d:%(height)d' % params
+        if name == 'rotate':
+            if params['angle'] in _QUARTER_TURNS:
+                return _QUARTER_TURNS[params['angle']]
+            return 'rotate=%s*PI/180' % params['angle']
+        if name == 'blur':
+            return 'boxblur=%s:1' % params['radius']
+        if name == 'pad':
+            return 'pad=%(width)d:%(height)d:%(x)d:%(y)d:%(color)s' % params
+        if name == 'fps':
+            return 'fps=%s' % params['fps']
+
+    def graph(self):
+        """The filtergraph of the edits and the label of its
+        output, None when there is no edit."""
+        if not self.steps:
+            return None
+        chains = []
+        label = '[0:v:0]'
+        filters = []
+        for i, (name, params, _, _) in enumerate(self.steps):
+            if name != 'overlay':
+                filters.append(self._filter(name, params))
+                continue
+            # the filters before the overlay end in a label
+            if filters:
+                chains.append('%s%s[v%d]' % (label, ','.join(filters), i))
+                label = '[v%d]' % i
+                filters = []
+            overlay = '[%d:v:0]' % params['input']
+            if params['size'] is not None:
+                chains.append('%sscale=%d:%d[o%d]' % (
+                    (overlay,) + tuple(params['size']) + (i,)))
+                overlay = '[o%d]' % i
+            chains.append('%s%soverlay=x=%s:y=%s[o%dv]' % (
+                label, overlay, params['x'], params['y'], i))
+            label = '[o%dv]' % i
+        if filters:
+            chains.append('%s%s[v]' % (label, ','.join(filters)))
+            label = '[v]'
+
+        return ';'.join(chains), label
+
+    def _cmds(self, video_output, vcodec=None, options=None,
+              overwrite=False):
+        if os.path.exists(video_output) and not overwrite:
+            raise FFMpegAlreadyExistsError(video_output)
+        _cmds = ['-y'] if overwrite else []
+        # -noautorotate keeps the frames in the size of the
+        # probe, the one the edits were checked against
+        _cmds.extend(['-noautorotate', '-i', self.video_input])
+        for overlay_input in self.overlays:
+            # a longer overlay would make the output longer
+            if self.duration is not None:
+                _cmds.extend(['-t', '%.6f' % self.duration])
+            _cmds.extend(['-i', overlay_input])
+        graph = self.graph()
+        if graph is None:  # nothing to do, no encoding
+            _cmds.extend(['-map', '0:v:0', '-map', '0:a?', '-c', 'copy'])
+        else:
+            _cmds.extend(['-filter_complex', graph[0], '-map', graph[1],
+                          '-map', '0:a?', '-c:a', 'copy'])
+            if vcodec is not None:
+                _cmds.extend(['-c:v', vcodec])
+            _cmds.extend(options or [])
+        _cmds.append(video_output)
+
+        return _cmds
+
+    def run(self, video_output, vcodec=None, options=None,
+            overwrite=False, progress=None):
+        """Runs the edits in one ffmpeg; the audio is copied.
+        :param vcodec: the video encoder, the one of the
+        format of video_output by default
+        :param_type: str, e.g. 'libx264'
+        :param options: output options of the encoder
+        :param_type: list, e.g. ['-crf', '23']
+        :return: the status of the process
+        """
+        return self.wrapper._run(self._cmds(video_output, vcodec,
+                                            options, overwrite),
+                                 progress=progress)
 
-        return _parser.parse_output()
 
-    def resize_video(self):
-        _cmds = []
-        p = self._spawn(_cmds)
-        _parser = self.parser(p)
+class BasicVideoFFMpegEdit(BaseFFMpeg):
+    """Subclass which deals with basic
+    editing of the video; each method is one
+    edit, edit() chains many of them in one
+    ffmpeg process"""
 
-        return _parser.parse_output()
+    def edit(self, video_input):
+        """Returns a VideoEdit of video_input."""
+        return VideoEdit(self, video_input)
 
-    def scale_video(self):
-        _cmds = []
-        p = self._spawn(_cmds)
-        _parser = self.parser(p)
+    def crop_video(self, video_input, video_output, width, height,
+                   x=None, y=None, overwrite=False, progress=None):
+        """Method which is used to
+        crop a video, see VideoEdit.crop"""
+        return self.edit(video_input).crop(width, height, x, y).run(
+            video_output, overwrite=overwrite, progress=progress)
 
-        return _parser.parse_output()
+    def rotate_video(self, video_input, video_output, angle,
+                     overwrite=False, progress=None):
+        """Method which is used to
+        rotate video, see VideoEdit.rotate"""
+        return self.edit(video_input).rotate(angle).run(
+            video_output, overwrite=overwrite, progress=progress)
+
+    def blur_video(self, video_input, video_output, radius=5,
+                   overwrite=False, progress=None):
+        return self.edit(video_input).blur(radius).run(
+            video_output, overwrite=overwrite, progress=progress)
+
+    def resize_video(self, video_input, video_output, factor,
+                     overwrite=False, progress=None):
+        return self.edit(video_input).resize(factor).run(
+            video_output, overwrite=overwrite, progress=progress)
+
+    def scale_video(self, video_input, video_output, width=-1, height=-1,
+                    overwrite=False, progress=None):
+        return self.edit(video_input).scale(width, height).run(
+            video_output, overwrite=overwrite, progress=progress)
 
 
 class BasicVideoEncoder(BaseFFMpeg):
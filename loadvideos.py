@@ -1,9 +1,13 @@
 #  module to deal with loading videos
 #  from csv, excel, pdf files
 
-import pdb
 import csv
-from openpyxl import load_workbook
+import os
+import re
+import threading
+from sys import intern
+from collections import OrderedDict, deque, namedtuple
+from itertools import islice
 
 
 class BaseExtractor(object):
@@ -12,11 +16,22 @@ class BaseExtractor(object):
     #  excel, csv or pdf file
     headers = ['video_id', 'cut', 'convert']
 
-    def __init__(self, base_file):
+    def __init__(self, base_file, load=True, columns=None, start_row=0):
         self.base_file = base_file
-        op_data = self.load_data_from_base_file()
-        # pdb.set_trace()
-        self.data = self.generate_operations_list(op_data)
+        # field -> column index, or name in the header row;
+        # by default the header row maps the columns when
+        # the sheet has one, else they are in headers order
+        self.columns = columns
+        # rows before it are skipped; a ledger of
+        # OperationExecutor does not tell where to resume,
+        # its rows are in the order the groups finish
+        self.start_row = start_row
+        self.data = None
+        # load=False reads nothing now, iter_operations and
+        # iter_records read the rows while they are used
+        if load:
+            self.data = self.generate_operations_list(
+                self.iter_rows(start_row))
 
     def generate_operation_dict(self, row):
         operation_dict = {}
@@ -35,13 +50,122 @@ class BaseExtractor(object):
 
         return operations_list
 
+    def iter_operations(self):
+        """
+        yields the operation dict of each row,
+        one row at a time, from the file
+        """
+        for row in self.iter_rows(self.start_row):
+            yield self.generate_operation_dict(row)
+
+    def iter_records(self):
+        """
+        yields an Operation for each row from start_row
+        on, one row at a time; the header and the empty
+        rows are skipped
+        """
+        header = self.read_header()
+        mapping = self.column_mapping(header)
+        start = max(self.start_row, 0 if header is None else 1)
+        for number, row in enumerate(self.iter_rows(start), start):
+            record = self.make_record(number, row, mapping)
+            if record is not None:
+                yield record
+
+    def read_header(self):
+        """
+        returns the first row when it is a header,
+        one with a video_id column, else None
+        """
+        rows = iter(self.iter_rows())
+        try:
+            row = next(rows, None)
+        finally:
+            # a generator closes its file now, a subclass
+            # may return a list or another iterator
+            if hasattr(rows, 'close'):
+                rows.close()
+        if row is None:
+            return None
+        header = [_cell(value) for value in row]
+
+        return header if 'video_id' in [(name or '').lower()
+                                        for name in header] else None
+
+    def column_mapping(self, header):
+        """
+        returns field -> column index from columns,
+        the header row or the order of headers
+        """
+        names = [(name or '').lower() for name in header or []]
+        columns = self.columns
+        if columns is None:
+            columns = dict((field, field) for field in self.headers) \
+                if header is not None else \
+                dict((field, idx) for idx, field in enumerate(self.headers))
+        mapping = {}
+        for field, column in columns.items():
+            if field not in self.headers:
+                raise ValueError('unknown field %r' % field)
+            if not isinstance(column, int):
+                if str(column).lower() not in names:
+                    if field == 'video_id' or self.columns is not None:
+                        raise ValueError('no column %r in the header of %s'
+                                         % (column, self.base_file))
+                    continue  # the column is optional
+                column = names.index(str(column).lower())
+            mapping[field] = column
+        if 'video_id' not in mapping:
+            raise ValueError('no video_id column for %s' % self.base_file)
+
+        return mapping
+
+    def make_record(self, number, row, mapping):
+        """
+        returns the Operation of a row, with its cut
+        parsed and checked, None for an empty row
+        """
+        video_id, cut, convert = [
+            _cell(row[column]) if column is not None and column < len(row)
+            else None for column in (mapping.get('video_id'),
+                                     mapping.get('cut'),
+                                     mapping.get('convert'))]
+        if video_id is None and cut is None and convert is None:
+            return None
+        error = None
+        try:
+            cut = parse_cut(cut)
+        except ValueError as e:
+            cut, error = None, str(e)
+        if convert is not None:
+            if not _convert_regex.match(convert.lstrip('.')):
+                convert, error = None, error or \
+                    'invalid convert %r' % convert
+            else:
+                # a few formats and videos are repeated on
+                # many rows, they share one string each
+                convert = intern(convert.lstrip('.'))
+        if video_id is None:
+            error = error or 'no video_id'
+        else:
+            video_id = intern(video_id)
+
+        return Operation(number, video_id, cut, convert, error)
+
     def load_data_from_base_file(self):
         """
-        opens and reads data from a file,
-        to be overriden in a subclass
-        :return:
+        opens and reads data from a file
+        :return: list of rows
         """
-        pass
+        return list(self.iter_rows())
+
+    def iter_rows(self, start=0):
+        """
+        yields the rows of the file one by one from
+        the row start, to be overriden in a subclass
+        """
+        for row in ():
+            yield row
 
 
 class OperationXLSXExtractor(BaseExtractor):
@@ -49,29 +173,399 @@ class OperationXLSXExtractor(BaseExtractor):
     #  .xlsx files and stores them in a
     #  a list
 
-    def load_data_from_base_file(self):
-        all_rows = []
-        #  load workbook and get first sheet
+    def __init__(self, base_file, load=True, columns=None, start_row=0,
+                 sheet=None):
+        # sheet name or index, by default Sheet1,
+        # or the active sheet without a Sheet1
+        self.sheet = sheet
+        super(OperationXLSXExtractor, self).__init__(
+            base_file, load=load, columns=columns, start_row=start_row)
+
+    def iter_rows(self, start=0):
+        # openpyxl is only needed for .xlsx files, csv
+        # only runs do not pay for importing it
+        from openpyxl import load_workbook
+        #  load workbook and get the sheet
         wb = load_workbook(filename=self.base_file,
                            read_only=True)
-        ws = wb['Sheet1']
-        for row in ws.rows:
-            all_rows.append([cell.value for cell in row])
-
-        return all_rows
+        try:
+            if isinstance(self.sheet, int):
+                ws = wb.worksheets[self.sheet]
+            elif self.sheet is not None:
+                ws = wb[self.sheet]
+            elif 'Sheet1' in wb.sheetnames:
+                ws = wb['Sheet1']
+            else:
+                ws = wb.active
+            # the rows before start are not read at all
+            for row in ws.iter_rows(min_row=start + 1, values_only=True):
+                yield list(row)
+        finally:
+            wb.close()
 
 
 class OperationCSVExtractor(BaseExtractor):
     #  gets operations from csv files
     #  and stores them in a list
-    def load_data_from_base_file(self):
-        all_rows = []
-        with open(self.base_file, 'r') as csv_file:
+    def iter_rows(self, start=0):
+        # newline='' leaves the new lines of quoted
+        # cells to the csv module
+        with open(self.base_file, 'r', newline='') as csv_file:
             csv_reader = csv.reader(csv_file)
-            for row in csv_reader:
-                all_rows.append(row)
-        # pdb.set_trace()
-        return all_rows
+            # quoted cells can hold new lines, the rows
+            # before start are parsed to be counted
+            for row in islice(csv_reader, start, None):
+                yield row
+
+
+# an operation of a row of a sheet: row is its number in
+# the file, the header is 0, cut is None or (start, end)
+# in seconds, end None up to the end, convert is None or
+# a format like avi; error says why the row is invalid
+Operation = namedtuple('Operation', 'row video_id cut convert error')
+
+_convert_regex = re.compile(r'^\w+$')
+
+
+def _cell(value):
+    # the text of a cell, None when empty; xlsx cells
+    # can be numbers or times as well
+    if value is None:
+        return None
+
+    return str(value).strip() or None
+
+
+# a cut is start-end or start, each a timecode like
+# 00:01:30.5, 01:30 or seconds like 90.5
+_timecode_regex = re.compile(r'^(?:(?:(\d+):)?(\d+):)?(\d+(?:\.\d*)?)$')
+
+
+def parse_timecode(text):
+    """'01:02:03.5' -> 3723.5 seconds"""
+    match_obj = _timecode_regex.match(text.strip())
+    if match_obj is None:
+        raise ValueError('invalid timecode %r' % text)
+    hours, minutes, seconds = match_obj.groups()
+
+    return int(hours or 0) * 3600 + int(minutes or 0) * 60 + float(seconds)
+
+
+def parse_cut(text):
+    """'00:10-00:20' -> (10.0, 20.0), 'start' alone
+    -> (start, None), empty -> None"""
+    text = '' if text is None else str(text).strip()
+    if not text:
+        return None
+    start, _, end = text.partition('-')
+    start = parse_timecode(start)
+    end = parse_timecode(end) if end.strip() else None
+    if end is not None and end <= start:
+        raise ValueError('cut %r ends before it starts' % text)
+
+    return start, end
+
+
+def format_cut(cut):
+    """(10.0, 20.0) -> '10-20', (10.0, None) -> '10-',
+    None -> ''"""
+    if cut is None:
+        return ''
+
+    return '%g-%s' % (cut[0], '' if cut[1] is None else '%g' % cut[1])
+
+
+# a row of the ledger of OperationExecutor; status is done,
+# failed, duplicate (the same operation is made by another
+# row) or exists (the output was there, overwrite=False)
+OperationResult = namedtuple('OperationResult',
+                             'row video_id cut convert output status error')
+
+
+class OperationExecutor(object):
+    """Runs the operations of an extractor: each row cuts
+    the video video_id (cut, e.g. 00:01:00-00:02:00) and/or
+    converts it to another format (convert, e.g. avi).
+
+        executor = OperationExecutor(
+            OperationCSVExtractor('ops.csv', load=False),
+            'out', ledger_path='ledger.csv')
+        counts = executor.run()
+
+    The rows are read one at a time and grouped by video_id:
+    the rows of a video within window rows of each other are
+    one group, probed once and made by one ffmpeg with an
+    output for each operation, which decodes the video once.
+    Identical operations of a group are made once, the
+    groups run on max_workers threads and the result of each
+    row is written to the ledger, a csv file, as its group
+    finishes. At most window rows and the groups of the
+    workers are in memory, whatever the size of the file.
+    The rows are Operation records of iter_records, their
+    cuts are parsed once; an invalid row fails with its
+    error. To resume a run, run the sheet again with
+    overwrite=False: the outputs made already are not made
+    again, their rows are exists, and the results are
+    appended to the ledger. A group holds rows up to window
+    rows apart and the ledger is in the order the groups
+    finish, so the rows after the last one of the ledger
+    are not the only ones left."""
+    window = 10000  # rows
+    # columns of the ledger
+    ledger_headers = list(OperationResult._fields)
+
+    def __init__(self, extractor, output_dir, source_dir=None,
+                 ledger_path=None, max_workers=2, overwrite=False,
+                 verbose=False):
+        self.extractor = extractor
+        self.output_dir = output_dir
+        self.source_dir = source_dir  # video_id is relative to it
+        self.ledger_path = ledger_path
+        self.max_workers = max_workers
+        self.overwrite = overwrite
+        self.verbose = verbose
+        # outputs of the groups running -> their video_id
+        self._running_outputs = {}
+        self._lock = threading.Lock()  # of _running_outputs
+
+    def __repr__(self):
+        return '%s(%r, %r)' % (self.__class__.__name__,
+                               self.extractor.base_file, self.output_dir)
+
+    def groups(self):
+        """Yields (video_id, [Operation]); a group is yielded
+        once window rows passed without a row of its video,
+        or more than window rows wait. A row without a
+        video_id is a group of its own, with video_id None."""
+        waiting = OrderedDict()  # video_id -> rows, oldest first
+        last_row = {}  # video_id -> row of its last operation
+        count = 0
+        for operation in self.extractor.iter_records():
+            video_id, row = operation.video_id, operation.row
+            if video_id is None:
+                yield None, [operation]
+                continue
+            if video_id in waiting:
+                waiting.move_to_end(video_id)
+            else:
+                waiting[video_id] = []
+            waiting[video_id].append(operation)
+            last_row[video_id] = row
+            count += 1
+            while waiting:
+                oldest = next(iter(waiting))
+                if count <= self.window and \
+                        last_row[oldest] >= row - self.window:
+                    break
+                rows = waiting.pop(oldest)
+                del last_row[oldest]
+                count -= len(rows)
+                yield oldest, rows
+        for video_id, rows in waiting.items():
+            yield video_id, rows
+
+    def run(self):
+        """Runs every operation, returns the number of
+        rows of each status."""
+        # imported here like in BasicFFProbe.probe_many,
+        # reading the sheets does not need them
+        from concurrent.futures import ThreadPoolExecutor, wait, \
+            FIRST_COMPLETED
+        counts = {}
+        ledger = None
+        if self.ledger_path is not None:
+            # appended to, a resumed run keeps the results
+            # of the runs before it
+            ledger = open(self.ledger_path, 'a', newline='')
+            writer = csv.writer(ledger)
+            if ledger.tell() == 0:
+                writer.writerow(self.ledger_headers)
+        pending = deque()
+        try:
+            with ThreadPoolExecutor(max_workers=self.max_workers) as pool:
+                groups = self.groups()
+                while True:
+                    # at most two groups wait for each worker
+                    for video_id, rows in groups:
+                        pending.append(pool.submit(self._execute,
+                                                   video_id, rows))
+                        if len(pending) >= 2 * self.max_workers:
+                            break
+                    if not pending:
+                        break
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        pending.remove(future)
+                        for result in future.result():
+                            counts[result.status] = \
+                                counts.get(result.status, 0) + 1
+                            if ledger is not None:
+                                writer.writerow(result)
+                    if ledger is not None:
+                        ledger.flush()
+        finally:
+            if ledger is not None:
+                ledger.close()
+
+        return counts
+
+    def _output(self, video_id, cut, convert):
+        # out/a/clip_10-20.avi for the cut 10-20 of a/clip.mp4:
+        # the directories of video_id are kept, so videos of
+        # the same name in two directories do not collide; an
+        # absolute video_id, or one out of source_dir, keeps
+        # its absolute path, /v/clip.mp4 -> out/v/clip_10-20.avi
+        video_id = os.path.normpath(video_id)
+        if os.path.isabs(video_id) or \
+                video_id.split(os.sep)[0] == os.pardir:
+            video_id = os.path.splitdrive(os.path.abspath(os.path.join(
+                self.source_dir or '', video_id)))[1].lstrip(os.sep)
+        directory, name = os.path.split(video_id)
+        name, extension = os.path.splitext(name)
+        if cut is not None:
+            name += '_' + format_cut(cut)
+        if convert:
+            extension = '.' + convert.lstrip('.')
+
+        return os.path.join(self.output_dir, directory, name + extension)
+
+    def _execute(self, video_id, rows):
+        # one probe and one ffmpeg for the rows of a video
+        # imported here, loading the sheets does not need the
+        # wrappers
+        from ffmpeg.ffprobe import BasicFFProbe
+        from ffmpeg.video import VideoFFMpeg
+        results = []
+        jobs = OrderedDict()  # output -> (cut, convert)
+
+        def result(operation, output, status, error=None):
+            results.append(OperationResult(
+                operation.row, operation.video_id,
+                format_cut(operation.cut), operation.convert or '',
+                output, status, error))
+
+        if video_id is None:
+            for operation in rows:
+                result(operation, None, 'failed', operation.error)
+            return results
+        source = video_id if self.source_dir is None \
+            else os.path.join(self.source_dir, video_id)
+        info = BasicFFProbe(verbose=self.verbose).probe(source)
+        duration = info.get_media_duration() if info is not None else None
+        with self._lock:  # the outputs of the other groups
+            for operation in rows:
+                cut, convert = operation.cut, operation.convert
+                if operation.error is not None:
+                    result(operation, None, 'failed', operation.error)
+                    continue
+                output = self._output(video_id, cut, convert)
+                if info is None:
+                    result(operation, output, 'failed',
+                           'probe of %s failed' % source)
+                elif cut is not None and duration is not None and \
+                        cut[0] >= duration:
+                    result(operation, output, 'failed',
+                           'cut starts after the end, %gs' % duration)
+                elif output in self._running_outputs and \
+                        os.path.normpath(self._running_outputs[output]) != \
+                        os.path.normpath(video_id):
+                    result(operation, output, 'failed',
+                           'the output of %s is made for %s too' % (
+                               video_id, self._running_outputs[output]))
+                elif output in jobs or output in self._running_outputs:
+                    result(operation, output, 'duplicate')
+                elif os.path.exists(output) and not self.overwrite:
+                    result(operation, output, 'exists')
+                else:
+                    jobs[output] = (cut, convert)
+                    result(operation, output, None)
+            self._running_outputs.update((output, video_id)
+                                         for output in jobs)
+        if jobs:
+            try:
+                for directory in set(os.path.dirname(output)
+                                     for output in jobs):
+                    if not os.path.isdir(directory):
+                        os.makedirs(directory, exist_ok=True)
+                errors = self._make(VideoFFMpeg(verbose=self.verbose),
+                                    source, jobs)
+            finally:
+                with self._lock:
+                    for output in jobs:
+                        del self._running_outputs[output]
+            results = [r._replace(status='failed', error=errors[r.output])
+                       if r.status is None and r.output in errors else
+                       r._replace(status='done') if r.status is None else r
+                       for r in results]
+
+        return results
+
+    def _make(self, wrapper, source, jobs):
+        # one ffmpeg for all the jobs; when it fails each job
+        # is run on its own, so the error stays with its row.
+        # ffmpeg writes each output to a temporary name which
+        # is renamed once it succeeded, an interrupted run or
+        # an old output never passes for a new one.
+        # Returns output -> error of the jobs which failed
+        partials = OrderedDict((output, self._partial(output))
+                               for output in jobs)
+        try:
+            errors = self._run_jobs(wrapper, source, jobs, partials)
+            if len(jobs) > 1:
+                for output in list(errors):
+                    del errors[output]
+                    errors.update(self._run_jobs(
+                        wrapper, source, {output: jobs[output]},
+                        {output: partials[output]}))
+            for output, partial in partials.items():
+                if output not in errors:
+                    os.replace(partial, output)
+        finally:
+            for partial in partials.values():
+                if os.path.exists(partial):
+                    os.remove(partial)
+
+        return errors
+
+    def _run_jobs(self, wrapper, source, jobs, partials):
+        # one ffmpeg for jobs, written to partials; returns
+        # output -> error of the jobs which failed
+        for output in jobs:
+            if os.path.exists(partials[output]):
+                os.remove(partials[output])  # of an interrupted run
+        try:
+            wrapper._run(self._pass_cmds(source, OrderedDict(
+                (partials[output], job) for output, job in jobs.items())))
+        except Exception as e:
+            return dict((output, str(e)) for output in jobs)
+
+        return dict((output, 'ffmpeg made no output') for output in jobs
+                    if not os.path.exists(partials[output]) or
+                    not os.path.getsize(partials[output]))
+
+    @staticmethod
+    def _partial(output):
+        # out/.partial-clip_10-20.avi, the extension stays
+        # for ffmpeg to pick the format
+        directory, name = os.path.split(output)
+
+        return os.path.join(directory, '.partial-' + name)
+
+    def _pass_cmds(self, source, jobs):
+        # the input is decoded once, -ss and -to are options
+        # of each output; a cut which keeps the format copies
+        # the streams, like VideoFFMpeg.cut_video
+        _cmds = ['-i', source]
+        for output, (cut, convert) in jobs.items():
+            if cut is not None:
+                _cmds.extend(['-ss', '%.3f' % cut[0]])
+                if cut[1] is not None:
+                    _cmds.extend(['-to', '%.3f' % cut[1]])
+            if convert is None:
+                _cmds.extend(['-c', 'copy'])
+            _cmds.extend(['-y', output])
+
+        return _cmds
 
 
 class VideoCSVPrepare(object):